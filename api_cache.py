@@ -0,0 +1,208 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import http_engine
+import serializer
+
+# -----------------------------
+# Dexscreener 共通レスポンスキャッシュ
+# -----------------------------
+# プロセス内 LRU ＋ SQLite のディスクキャッシュ。URL をキーに JSON をそのまま保存する。
+# step0 / step1 / step1_5 / step2 / step3 のすべてからここを経由して取得する。
+
+CACHE_DB = os.getenv("API_CACHE_DB", "cache/api_cache.sqlite")
+CACHE_ENABLED = os.getenv("API_CACHE", "1") != "0"
+
+MAX_MEMORY_ENTRIES = 512
+MAX_DISK_ENTRIES = 5000
+# ディスクの掃除は put この回数ごと
+PRUNE_EVERY = 100
+
+# --- エンドポイントごとの TTL（秒）。パスの前方一致で決める ---
+DEFAULT_TTL = 60
+ENDPOINT_TTL = {
+    "/latest/dex/tokens/": 60,
+    "/latest/dex/pairs/": 60,
+    "/latest/dex/search": 300,
+}
+
+_lock = threading.Lock()
+_memory = OrderedDict()    # url -> (expires_at, data)
+_conn = None
+_puts = 0
+
+# stats は複数のスレッドから更新されるので、_lock を持っている間だけ加算する
+stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "evictions": 0,
+}
+
+
+def ttl_for(url):
+    path = urlparse(url).path
+    for prefix, ttl in ENDPOINT_TTL.items():
+        if path.startswith(prefix):
+            return ttl
+    return DEFAULT_TTL
+
+
+def _db():
+    global _conn
+    if _conn is None:
+        d = os.path.dirname(CACHE_DB)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        _conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " body TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        _conn.commit()
+    return _conn
+
+
+def _remember(url, expires_at, data):
+    _memory[url] = (expires_at, data)
+    _memory.move_to_end(url)
+    while len(_memory) > MAX_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+        stats["evictions"] += 1
+
+
+def get(url):
+    # ヒットすれば JSON、なければ None
+    if not CACHE_ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        hit = _memory.get(url)
+        if hit:
+            if hit[0] > now:
+                _memory.move_to_end(url)
+                stats["memory_hits"] += 1
+                return hit[1]
+            del _memory[url]
+
+        try:
+            conn = _db()
+            row = conn.execute(
+                "SELECT body, expires_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row and row[1] > now:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+                conn.commit()
+                data = serializer.loads(row[0])
+                _remember(url, row[1], data)
+                stats["disk_hits"] += 1
+                return data
+        except sqlite3.Error as e:
+            print("[CACHE] 読み込みエラー:", e)
+
+        stats["misses"] += 1
+        return None
+
+
+def put(url, data, ttl=None):
+    global _puts
+    if not CACHE_ENABLED:
+        return
+    now = time.time()
+    expires_at = now + (ttl_for(url) if ttl is None else ttl)
+    with _lock:
+        _remember(url, expires_at, data)
+        stats["stores"] += 1
+        try:
+            conn = _db()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (url, serializer.dumps(data), expires_at, now),
+            )
+            conn.commit()
+            _puts += 1
+            if _puts % PRUNE_EVERY == 0:
+                _prune(conn, now)
+        except sqlite3.Error as e:
+            print("[CACHE] 書き込みエラー:", e)
+
+
+def _prune(conn, now):
+    # 期限切れを消し、上限を超えた分は最終アクセスが古い順に消す
+    cur = conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+    removed = cur.rowcount
+    cur = conn.execute(
+        "DELETE FROM responses WHERE url IN ("
+        " SELECT url FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+        (MAX_DISK_ENTRIES,),
+    )
+    removed += cur.rowcount
+    conn.commit()
+    stats["evictions"] += max(removed, 0)
+
+
+def get_json(url, timeout=10, ttl=None, refresh=False):
+    # requests.get(url).json() の代わり。HTTP エラーは raise_for_status() と同じく例外になる
+    # refresh=True はキャッシュを読まずに取り直す（結果は保存する）。毎サイクルの LP のように
+    # 前回のサイクルの値を使うと判定が狂うもの用（デーモンの間隔は TTL より短いことがある）
+    data = None if refresh else get(url)
+    if data is not None:
+        return data
+
+    data = http_engine.get_json(url, timeout=timeout)
+    put(url, data, ttl)
+    return data
+
+
+def get_json_many(urls, timeout=10, ttl=None, refresh=False):
+    # キャッシュに無い URL だけを並行取得する。失敗した位置には例外オブジェクトが入る
+    urls = list(urls)
+    results = [None if refresh else get(u) for u in urls]
+    missing = [i for i, data in enumerate(results) if data is None]
+    fetched = http_engine.get_json_many([urls[i] for i in missing], timeout=timeout)
+    for i, data in zip(missing, fetched):
+        results[i] = data
+        if not isinstance(data, Exception):
+            put(urls[i], data, ttl)
+    return results
+
+
+def get_json_each(urls, on_result, timeout=10, ttl=None):
+    # キャッシュヒット分はすぐに、残りは取得が終わった順に on_result(index, data) を呼ぶ
+    urls = list(urls)
+    missing = []
+    for i, u in enumerate(urls):
+        data = get(u)
+        if data is None:
+            missing.append(i)
+        else:
+            on_result(i, data)
+
+    def done(j, data):
+        i = missing[j]
+        if not isinstance(data, Exception):
+            put(urls[i], data, ttl)
+        on_result(i, data)
+
+    http_engine.fetch_json_each([urls[i] for i in missing], done, timeout=timeout)
+
+
+def summary():
+    with _lock:
+        stats_now = dict(stats)
+    hits = stats_now["memory_hits"] + stats_now["disk_hits"]
+    total = hits + stats_now["misses"]
+    rate = hits / total * 100 if total else 0.0
+    return (
+        f"[CACHE] hit={hits} (mem={stats_now['memory_hits']}, disk={stats_now['disk_hits']}) "
+        f"miss={stats_now['misses']} hit率={rate:.0f}% evict={stats_now['evictions']}"
+    )
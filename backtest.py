@@ -0,0 +1,506 @@
+import os
+import sys
+import json
+import bisect
+import argparse
+import functools
+import itertools
+import statistics
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import api_cache
+import serializer
+import mint_alerts
+import snapshot_diff
+import check_scheduler
+import step2_lp_growth as step2
+from step3_price_tracker import TRACK_HOURS_LIMIT, TEN_X
+from rules import Rules, read_config
+
+# -----------------------------
+# バックテスト
+# -----------------------------
+# 時刻付きの Raydium / Dexscreener スナップショットに step2 の判定ロジックをそのまま流し、
+# 通知件数・10倍到達率・10倍までの時間（step3 と同じ計算）を集計する。
+# スリープもネットワークも使わないので実時間よりずっと速い。
+#
+# スナップショットのディレクトリ（record で作れる。.gz / .zst / .msgpack でも可。serializer.py 参照）:
+#   raydium_20260101T000000.json      Raydium /pairs のペア配列
+#   dexscreener_20260101T000000.json  Dexscreener のペア配列（{"pairs": [...]} でも可）
+# Raydium の各時刻には、その時刻以前で最新の Dexscreener スナップショットを対応させる。
+#
+#   python backtest.py record snapshots/
+#   python backtest.py run snapshots/ --param WATCH_LP_GROWTH=10,20,30 --param MIN_TXNS5M=1,2,5
+#
+# run_cycle と同じく、前回判定時から動いたペア（SNAPSHOT_EPSILON）と保留中のペアだけを判定し、
+# 二次判定は DEX_REQUEST_BUDGET に入る分だけ確認する（残りと Dexscreener に無い mint は次の時刻へ繰り越し）。
+# 10倍の追跡は step3 と同じく、検知時に価格を見た Dexscreener のペアの価格で行う。
+# 再現しないもの: Raydium の取得失敗時の前回値（last good）での判定。record は取得に失敗した時刻の
+# スナップショットを書かないので、その時刻のサイクルは無かったものとして扱われる。
+# またメールは必ず届いたものとする（届かなかった通知の再送は起きない）。
+#
+# 閾値の組み合わせはプロセスプールで並列に評価する。スナップショットは親で1回だけ読み、
+# fork で各ワーカーに引き継ぐ（fork が使えない環境ではワーカーごとに1回読む）。
+
+SNAPSHOT_DIR = "snapshots"
+RAYDIUM_PREFIX = "raydium_"
+DEX_PREFIX = "dexscreener_"
+TS_FORMAT = "%Y%m%dT%H%M%S"
+# record が書く形式（例: json.gz / msgpack.zst。msgpack / zstandard が入っていれば読み書きとも速く小さい）
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "json.gz")
+
+# Raydium スナップショットで残すフィールド（rules.json の raydium_pair が見るものは自動で追加）
+# （volume_24h_quote は snapshot_diff の指紋に使う）
+RAYDIUM_FIELDS = ("pair_id", "name", "liquidity", "volume_24h_quote", "fdv")
+
+_config = None
+_snapshots = None
+_prices = None
+
+
+# -----------------------------
+# スナップショットの読み込み
+# -----------------------------
+def _parse_ts(filename, prefix):
+    stem = filename[len(prefix):].split(".", 1)[0]
+    return datetime.strptime(stem, TS_FORMAT)
+
+
+def snapshot_files(directory):
+    # [(時刻, raydium のパス, dexscreener のパス or None)] を時刻順に返す
+    raydium, dex = [], []
+    for name in os.listdir(directory):
+        if name.endswith(".tmp"):
+            continue   # record が書き込み中
+        path = os.path.join(directory, name)
+        try:
+            if name.startswith(RAYDIUM_PREFIX):
+                raydium.append((_parse_ts(name, RAYDIUM_PREFIX), path))
+            elif name.startswith(DEX_PREFIX):
+                dex.append((_parse_ts(name, DEX_PREFIX), path))
+        except ValueError:
+            print("[BACKTEST] 時刻を読めないファイルを無視:", name)
+    raydium.sort()
+    dex.sort()
+
+    dex_times = [t for t, _ in dex]
+    files = []
+    for t, path in raydium:
+        i = bisect.bisect_right(dex_times, t) - 1
+        files.append((t, path, dex[i][1] if i >= 0 else None))
+    return files
+
+
+def rule_params(config, ruleset):
+    # ルールセットが "$NAME" で参照している params の名前
+    names = set()
+    for rule in config["rulesets"].get(ruleset, []):
+        for v in rule.values():
+            for x in (v if isinstance(v, list) else [v]):
+                if isinstance(x, str) and x.startswith("$"):
+                    names.add(x[1:])
+    return names
+
+
+def _slim_fields(config):
+    fields = set(RAYDIUM_FIELDS)
+    for rule in config["rulesets"].get("raydium_pair", []):
+        for key in ("field", "divisor"):
+            if key in rule:
+                fields.add(rule[key].split(".", 1)[0])
+    return tuple(fields)
+
+
+def _load_dex(path):
+    # (mint -> (step2 が二次判定に使う詳細, fetch_price_usd が返す価格), pairAddress -> 価格)
+    data = serializer.load_file(path)
+    pairs = (data.get("pairs") or []) if isinstance(data, dict) else data
+
+    grouped = {}
+    for p in pairs:
+        seen = set()
+        for side in ("baseToken", "quoteToken"):
+            addr = (p.get(side) or {}).get("address")
+            if addr and addr not in seen:
+                grouped.setdefault(addr, []).append(p)
+                seen.add(addr)
+
+    dex = {}
+    for mint, ps in grouped.items():
+        dex[mint] = (step2._extract_dex_details(step2._best_liquidity_pair(ps)), _price_of(ps[0]))
+    prices = {p["pairAddress"]: _price_of(p) for p in pairs if p.get("pairAddress")}
+    return dex, prices
+
+
+def _price_of(p):
+    try:
+        return float(p.get("priceUsd") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def load_snapshots(directory, config, prefilter=True):
+    # prefilter=True なら基準ルールの raydium_pair を通ったペアだけを残す
+    # （raydium_pair の閾値をスイープしないときはこれで十分で、メモリと時間が大きく減る）
+    fields = _slim_fields(config)
+    base_rules = Rules(config)["raydium_pair"]
+    dex_cache = {}
+    snapshots = []
+
+    for t, raydium_path, dex_path in snapshot_files(directory):
+        raw = serializer.load_file(raydium_path)
+        pairs = [
+            {k: p.get(k) for k in fields if k in p}
+            for p in raw
+            if not prefilter or base_rules.check(p)
+        ]
+        del raw
+
+        if dex_path and dex_path not in dex_cache:
+            dex_cache = {dex_path: _load_dex(dex_path)}
+        dex, prices = dex_cache.get(dex_path, ({}, {})) if dex_path else ({}, {})
+        snapshots.append({
+            "time": t,
+            "now_ms": int(t.timestamp() * 1000),
+            "pairs": pairs,
+            "dex": dex,
+            "prices": prices,
+        })
+    return snapshots
+
+
+def build_price_index(snapshots):
+    # pairAddress -> ([時刻], [価格])。同じ dex スナップショットが続く区間は1回だけ記録する
+    index = {}
+    last_prices = None
+    for s in snapshots:
+        if s["prices"] is last_prices:
+            continue
+        last_prices = s["prices"]
+        for pair, price in s["prices"].items():
+            times, prices = index.setdefault(pair, ([], []))
+            times.append(s["time"])
+            prices.append(price)
+    return index
+
+
+# -----------------------------
+# シミュレーション
+# -----------------------------
+def simulate(overrides, snapshots=None, config=None, details=False):
+    # step2 の run_cycle と同じ判定（差分・mint ごとの集約とクールダウン・リクエスト予算を含む）を
+    # 全スナップショットに順に適用する
+    snapshots = _snapshots if snapshots is None else snapshots
+    config = _config if config is None else config
+    rules = Rules(config, overrides)
+    pair_rules = rules["raydium_pair"]
+    secondary_rules = rules["dex_secondary"]
+    params = rules.params
+
+    state = {}
+    previous = {}
+    last_alerts = {}
+    alerts = []
+    for s in snapshots:
+        dex = s["dex"]
+        now_ts = s["time"].timestamp()
+        filtered = []
+        for p in s["pairs"]:
+            try:
+                if pair_rules.check(p):
+                    filtered.append(p)
+            except Exception:
+                continue
+        evaluate, removed, _ = snapshot_diff.diff(filtered, previous)
+
+        rows = []
+        for p in evaluate:
+            try:
+                pair_id = p.get("pair_id")
+                lp_usd = p.get("liquidity", 0)
+                mint = step2.extract_non_wsol_token(p.get("name"), pair_id)
+
+                prev_lp, last_notified_lp = step2.update_pair_state(state, pair_id, lp_usd)
+                _, growth_since_last_mail, lp_delta, decision = step2.classify_growth(
+                    lp_usd, prev_lp, last_notified_lp, params
+                )
+                rows.append({
+                    "pair_id": pair_id,
+                    "mint": mint,
+                    "lp_usd": lp_usd,
+                    "decision": decision,
+                    "growth_since_last_mail": growth_since_last_mail,
+                    "lp_delta": lp_delta,
+                    "fingerprint": snapshot_diff.fingerprint(p),
+                })
+            except Exception:
+                continue
+
+        # run_cycle と同じく、クールダウン中の mint は確認せず、予算に入らない候補と Dexscreener に
+        # 無い mint は繰り越す。二次判定を通った候補は mint ごとに1件にする
+        # （優先度の最も高いペアが代表。同じ mint の他のペアも通知済みにする）
+        mint_alerts.apply_cooldown(rows, last_alerts, now_ts)
+        selected, _ = check_scheduler.schedule(
+            [r for r in rows if not r.get("suppressed")], step2.DEX_REQUEST_BUDGET, step2.DEX_BATCH_SIZE
+        )
+        check_by_mint = {}
+        passed = []
+        for r in selected:
+            mint = r["mint"]
+            if mint not in dex:
+                continue
+            if mint not in check_by_mint:
+                dex_details, price_usd = dex[mint]
+                try:
+                    ok, _ = step2.secondary_check(dex_details, s["now_ms"], secondary_rules)
+                except Exception:
+                    ok = False
+                check_by_mint[mint] = (ok, dex_details, price_usd)
+            if check_by_mint[mint][0]:
+                passed.append(r)
+
+        for mint, group in mint_alerts.group_by_mint(passed).items():
+            _, dex_details, price_usd = check_by_mint[mint]
+            for r in group:
+                entry = state[r["pair_id"]]
+                if entry.initial_price is None:
+                    entry.initial_price = price_usd
+                entry.last_notified_lp = r["lp_usd"]
+            lead = group[0]
+            last_alerts[mint] = (lead["decision"], now_ts)
+            try:
+                base_price = float(dex_details.price) if dex_details else None
+            except (TypeError, ValueError):
+                base_price = None
+            alerts.append({
+                "time": s["time"],
+                "pair_id": lead["pair_id"],
+                "pair": (dex_details.pair_address if dex_details else None) or lead["pair_id"],
+                "mint": mint,
+                "decision": lead["decision"],
+                "growth": round(lead["growth_since_last_mail"], 1),
+                "pairs": len(group),
+                "base_price": base_price or price_usd,
+            })
+
+        # 一次判定を通ったペアは保留にして次の時刻も判定する
+        for r in rows:
+            previous[r["pair_id"]] = (*r["fingerprint"], bool(r["decision"]))
+        for pair_id in removed:
+            del previous[pair_id]
+
+    return summarize(overrides, alerts, details)
+
+
+def track(alert, prices):
+    # step3 と同じ追跡：検知時に見た Dexscreener のペアの価格（無ければ検知後最初の価格）を基準に、
+    # 72時間以内の最高値の倍率を見る
+    series = prices.get(alert["pair"])
+    if not series:
+        return None
+    times, values = series
+    detected_at = alert["time"]
+    base = max_price = alert.get("base_price") or None
+    for i in range(bisect.bisect_left(times, detected_at), len(times)):
+        hours_passed = (times[i] - detected_at).total_seconds() / 3600
+        if hours_passed > TRACK_HOURS_LIMIT:
+            break
+        price = values[i]
+        if not price:
+            continue
+        if base is None:
+            base = max_price = price
+            continue
+        max_price = max(max_price, price)
+        if max_price / base >= TEN_X:
+            return {"hit_10x": True, "max_x": round(max_price / base, 2),
+                    "time_to_10x_min": int(hours_passed * 60)}
+    if base is None:
+        return None
+    return {"hit_10x": False, "max_x": round(max_price / base, 2)}
+
+
+def summarize(overrides, alerts, details=False):
+    prices = _prices
+    results = [track(a, prices) for a in alerts] if prices is not None else []
+    tracked = [r for r in results if r is not None]
+    hits = [r for r in tracked if r["hit_10x"]]
+
+    out = {
+        "params": overrides,
+        "alerts": len(alerts),
+        "immediate": sum(1 for a in alerts if a["decision"] == "IMMEDIATE"),
+        "watch": sum(1 for a in alerts if a["decision"] == "WATCH"),
+        "mints": len({a["mint"] for a in alerts}),
+        "tracked": len(tracked),
+        "hits_10x": len(hits),
+        "hit_rate": round(len(hits) / len(tracked), 4) if tracked else 0.0,
+        "median_time_to_10x_min": statistics.median(r["time_to_10x_min"] for r in hits) if hits else None,
+        "median_max_x": statistics.median(r["max_x"] for r in tracked) if tracked else None,
+    }
+    if details:
+        out["alert_list"] = [
+            dict(a, time=a["time"].isoformat(), result=r) for a, r in zip(alerts, results)
+        ]
+    return out
+
+
+# -----------------------------
+# パラメータのスイープ
+# -----------------------------
+def parse_grid(items, params):
+    # ["WATCH_LP_GROWTH=10,20", "MIN_TXNS5M=1,2"] -> 全組み合わせの overrides のリスト
+    axes = []
+    for item in items or []:
+        key, _, values = item.partition("=")
+        key = key.strip()
+        if key not in params:
+            raise SystemExit(f"[BACKTEST] 未知のパラメータ: {key}")
+        axes.append([(key, json.loads(v)) for v in values.split(",") if v.strip()])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+
+def _init_worker(directory, config, prefilter):
+    global _config, _snapshots, _prices
+    _config = config
+    _snapshots = load_snapshots(directory, config, prefilter)
+    _prices = build_price_index(_snapshots)
+
+
+def run_grid(grid, workers, directory, details=False):
+    if workers <= 1 or len(grid) <= 1:
+        return [simulate(o, details=details) for o in grid]
+
+    chunksize = max(1, len(grid) // (workers * 4))
+    if "fork" in multiprocessing.get_all_start_methods():
+        # 読み込み済みのスナップショットをコピーオンライトでそのまま使う
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    else:
+        prefilter = not any(k in rule_params(_config, "raydium_pair") for o in grid for k in o)
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(directory, _config, prefilter))
+    with pool:
+        return list(pool.map(functools.partial(simulate, details=details), grid, chunksize=chunksize))
+
+
+def run(args):
+    global _config, _snapshots, _prices
+    _config = read_config(args.rules) if args.rules else read_config()
+    grid = parse_grid(args.param, _config.get("params", {})) or [{}]
+
+    # raydium_pair の閾値をスイープするときだけ全ペアを持つ
+    swept = {k for o in grid for k in o}
+    prefilter = not (swept & rule_params(_config, "raydium_pair"))
+
+    t0 = datetime.now()
+    _snapshots = load_snapshots(args.directory, _config, prefilter)
+    _prices = build_price_index(_snapshots)
+    if not _snapshots:
+        print("[BACKTEST] スナップショットがありません:", args.directory)
+        return 1
+    span = _snapshots[-1]["time"] - _snapshots[0]["time"]
+    print(
+        f"[BACKTEST] スナップショット: {len(_snapshots)} 件 ({span}) "
+        f"ペア: {sum(len(s['pairs']) for s in _snapshots)} 読み込み: {datetime.now() - t0}"
+    )
+
+    t1 = datetime.now()
+    results = run_grid(grid, args.workers, args.directory, details=args.details)
+    elapsed = (datetime.now() - t1).total_seconds()
+    print(f"[BACKTEST] {len(grid)} 通りを {elapsed:.1f}s で評価（workers={args.workers}）")
+
+    results.sort(key=lambda r: (r["hit_rate"], r["hits_10x"], -r["alerts"]), reverse=True)
+    for r in results[:args.top]:
+        t10 = r["median_time_to_10x_min"]
+        print(
+            f"  alerts={r['alerts']:5d} (IMM={r['immediate']}, WATCH={r['watch']}) "
+            f"10x={r['hits_10x']:4d}/{r['tracked']:<5d} rate={r['hit_rate']:.1%} "
+            f"t10x={'-' if t10 is None else f'{t10:.0f}min'}  {r['params'] or '(rules.json)'}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "directory": args.directory,
+                "snapshots": len(_snapshots),
+                "from": _snapshots[0]["time"].isoformat(),
+                "to": _snapshots[-1]["time"].isoformat(),
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"[BACKTEST] 結果: {args.out}")
+    return 0
+
+
+# -----------------------------
+# スナップショットの記録
+# -----------------------------
+def record(args):
+    # 現在の Raydium /pairs と、フィルタを通過したペアの Dexscreener データを1組保存する
+    # （step2 と同じ間隔で cron に入れておく）
+    try:
+        ext = serializer.extension(*serializer.parse_extension(args.format))
+    except RuntimeError as e:
+        print("[BACKTEST]", e)
+        return 1
+    os.makedirs(args.directory, exist_ok=True)
+    ts = datetime.utcnow().strftime(TS_FORMAT)
+    config = read_config()
+    fields = _slim_fields(config)
+
+    pairs = step2.fetch_raydium_pairs()
+    if not pairs:
+        return 1
+    slim = [{k: p.get(k) for k in fields if k in p} for p in pairs]
+
+    mints = []
+    for p in pairs:
+        if p.get("pair_id") and step2.pair_passes_filter(p):
+            try:
+                mints.append(step2.extract_non_wsol_token(p.get("name"), p["pair_id"]))
+            except Exception:
+                continue
+    mints = list(dict.fromkeys(mints))
+    del pairs
+
+    # 1レスポンスは最大30ペアなので、ペアの多い mint が混ざると一部の mint が欠けることがある
+    # （欠けた mint はバックテストでは NO_DEX 扱いになる）
+    size = step2.DEX_BATCH_SIZE
+    urls = [f"{step2.DEXSCREENER_API}{','.join(mints[i:i + size])}" for i in range(0, len(mints), size)]
+    dex_pairs = []
+    for data in api_cache.get_json_many(urls, timeout=10):
+        if isinstance(data, Exception):
+            print("[BACKTEST] Dexscreener 取得エラー:", data)
+            continue
+        dex_pairs.extend((data or {}).get("pairs") or [])
+
+    for prefix, body in ((RAYDIUM_PREFIX, slim), (DEX_PREFIX, dex_pairs)):
+        serializer.dump_file(body, os.path.join(args.directory, f"{prefix}{ts}{ext}"))
+    print(f"[BACKTEST] 記録 {ts}: Raydium {len(slim)} ペア / Dexscreener {len(dex_pairs)} ペア ({len(mints)} mint)")
+    return 0
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="step2 判定ロジックのバックテスト")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    r = sub.add_parser("run", help="スナップショットに判定を流して集計する")
+    r.add_argument("directory", nargs="?", default=SNAPSHOT_DIR)
+    r.add_argument("--param", action="append", metavar="NAME=V1,V2,..",
+                   help="スイープする params（複数指定で全組み合わせ）")
+    r.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    r.add_argument("--rules", help="rules.json 以外のルールファイル")
+    r.add_argument("--top", type=int, default=20, help="表示する上位件数")
+    r.add_argument("--out", help="全結果を書き出す JSON")
+    r.add_argument("--details", action="store_true", help="結果に通知ごとの追跡結果も含める")
+
+    rec = sub.add_parser("record", help="現在の API レスポンスをスナップショットとして保存する")
+    rec.add_argument("directory", nargs="?", default=SNAPSHOT_DIR)
+    rec.add_argument("--format", default=SNAPSHOT_FORMAT, help="保存形式（json.gz / msgpack.zst など）")
+    return ap.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(run(args) if args.command == "run" else record(args))
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# -----------------------------
+# Raydium /pairs ストリーミング vs resp.json() ベンチマーク
+# -----------------------------
+# 各モードを別プロセスで実行し、ピーク RSS と経過時間を比較する。
+#   python bench/bench_raydium_stream.py --pairs 200000
+
+
+def make_payload(path, n_pairs, seed=0):
+    rnd = random.Random(seed)
+    quotes = ["WSOL", "USDC", "USDT", "RAY"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(n_pairs):
+            if i:
+                f.write(",")
+            base = f"TKN{i}"
+            quote = rnd.choice(quotes)
+            p = {
+                "name": f"{base}/{quote}",
+                "pair_id": f"{base}mint{i:08d}-{quote}mint",
+                "lp_mint": f"lp{i:08d}",
+                "official": False,
+                "liquidity": rnd.uniform(0, 2_000_000),
+                "market": f"mkt{i:08d}",
+                "volume_24h": rnd.uniform(0, 5_000_000),
+                "volume_24h_quote": rnd.uniform(0, 5_000_000),
+                "fee_24h": rnd.uniform(0, 10_000),
+                "fee_24h_quote": rnd.uniform(0, 10_000),
+                "volume_7d": rnd.uniform(0, 20_000_000),
+                "volume_7d_quote": rnd.uniform(0, 20_000_000),
+                "fee_7d": rnd.uniform(0, 50_000),
+                "fee_7d_quote": rnd.uniform(0, 50_000),
+                "price": rnd.uniform(0, 10),
+                "lp_price": rnd.uniform(0, 10),
+                "amm_id": f"amm{i:08d}",
+                "token_amount_coin": rnd.uniform(0, 1e9),
+                "token_amount_pc": rnd.uniform(0, 1e6),
+                "token_amount_lp": rnd.uniform(0, 1e6),
+                "apy": rnd.uniform(0, 20_000),
+            }
+            f.write(json.dumps(p))
+        f.write("]")
+
+
+def iter_file_chunks(path, chunk_size):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def run_mode(mode, path, chunk_size):
+    import step2_lp_growth as step2
+    from json_stream import iter_json_array
+
+    t0 = time.perf_counter()
+    if mode == "json":
+        # 従来経路：resp.content → resp.json() → filter_pairs()
+        with open(path, "rb") as f:
+            body = f.read()
+        data = json.loads(body)
+        del body
+        survivors = step2.filter_pairs(data)
+    else:
+        survivors = [
+            p for p in iter_json_array(iter_file_chunks(path, chunk_size))
+            if step2.pair_passes_filter(p)
+        ]
+    elapsed = time.perf_counter() - t0
+
+    # Linux の ru_maxrss は KB 単位
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": mode,
+        "survivors": len(survivors),
+        "wall_s": round(elapsed, 3),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pairs", type=int, default=100_000)
+    ap.add_argument("--chunk-size", type=int, default=64 * 1024)
+    ap.add_argument("--payload", help="既存の /pairs レスポンスファイルを使う")
+    ap.add_argument("--mode", choices=["json", "stream"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.payload, args.chunk_size)
+        return
+
+    tmp = None
+    path = args.payload
+    if not path:
+        tmp = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        tmp.close()
+        path = tmp.name
+        make_payload(path, args.pairs)
+
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"[BENCH] payload: {path} ({size_mb:.1f} MB)")
+
+    try:
+        for mode in ("json", "stream"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--payload", path,
+                 "--chunk-size", str(args.chunk_size)],
+                capture_output=True, text=True, check=True, cwd=ROOT,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(
+                f"[BENCH] {result['mode']:6s} wall={result['wall_s']:.3f}s "
+                f"peak_rss={result['peak_rss_mb']:.1f}MB survivors={result['survivors']}"
+            )
+    finally:
+        if tmp:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serializer
+import stub_server
+
+# -----------------------------
+# シリアライズ形式ごとの dump / load 時間とファイルサイズ
+# -----------------------------
+#   python bench/bench_serializer.py --raydium-pairs 50000
+#
+# 対象は Raydium /pairs のペア配列（スナップショット・API レスポンス）と、
+# step2 の判定ログ（JSONL の1行ずつ）。インストールされていない形式は飛ばす。
+
+
+def make_log_records(n, seed=0):
+    rnd = random.Random(seed)
+    return [
+        {
+            "time": f"2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}",
+            "chain": "solana",
+            "pair_id": f"pair{i}",
+            "mint": f"mint{i}",
+            "name": f"TKN{i}/WSOL",
+            "lp_now": rnd.uniform(1e3, 5e5),
+            "lp_prev": rnd.uniform(1e3, 5e5),
+            "growth": rnd.uniform(-50, 200),
+            "decision": rnd.choice([None, "WATCH", "IMMEDIATE"]),
+            "notified": rnd.random() < 0.1,
+            "dex_details": None if rnd.random() < 0.5 else {"txns5m": rnd.randint(0, 50), "priceChange5m": rnd.uniform(-10, 10)},
+        }
+        for i in range(n)
+    ]
+
+
+def best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, result
+
+
+def bench_file(obj, fmt, compression, directory, repeat):
+    path = os.path.join(directory, "payload" + serializer.extension(fmt, compression))
+    t_dump, size = best_of(lambda: serializer.dump_file(obj, path), repeat)
+    t_load, loaded = best_of(lambda: serializer.load_file(path), repeat)
+    assert len(loaded) == len(obj), "読み戻した件数が一致しません"
+    return t_dump, t_load, size
+
+
+def bench_lines(records, repeat):
+    # JSONL の追記（EventLog.flush）と1行ずつの読み込み
+    stdlib = lambda: "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+    t_std, text = best_of(stdlib, repeat)
+    t_fast, _ = best_of(lambda: serializer.dumps_lines(records), repeat)
+    lines = text.splitlines()
+    t_std_load, _ = best_of(lambda: [json.loads(l) for l in lines], repeat)
+    t_fast_load, _ = best_of(lambda: [serializer.loads(l) for l in lines], repeat)
+    return t_std, t_fast, t_std_load, t_fast_load
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raydium-pairs", type=int, default=50_000)
+    ap.add_argument("--log-records", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    pairs = json.loads(stub_server.StubData(raydium_pairs=args.raydium_pairs).raydium_body())
+    records = make_log_records(args.log_records)
+
+    print(f"[BENCH] JSON バックエンド: {serializer.json_backend()}  pairs={len(pairs)} logs={len(records)}")
+    with tempfile.TemporaryDirectory() as d:
+        for fmt, compression in serializer.available():
+            t_dump, t_load, size = bench_file(pairs, fmt, compression, d, args.repeat)
+            print(
+                f"[BENCH] {serializer.extension(fmt, compression):14s}"
+                f" dump={t_dump * 1000:8.1f}ms  load={t_load * 1000:8.1f}ms  size={size / 1024:9.1f}KB"
+            )
+
+    t_std, t_fast, t_std_load, t_fast_load = bench_lines(records, args.repeat)
+    print(f"[BENCH] JSONL dump  json={t_std * 1000:8.1f}ms  {serializer.json_backend()}={t_fast * 1000:8.1f}ms  x{t_std / t_fast:.1f}")
+    print(f"[BENCH] JSONL load  json={t_std_load * 1000:8.1f}ms  {serializer.json_backend()}={t_fast_load * 1000:8.1f}ms  x{t_std_load / t_fast_load:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import step2_lp_growth as step2
+import vector_filter
+from chain_sources import RAYDIUM_RULES
+from rules import load_rules
+
+RATIO_RULES = load_rules()["step1_ratio"]
+
+# -----------------------------
+# 1行ずつの Python ループ vs NumPy 列演算 ベンチマーク
+# -----------------------------
+#   python bench/bench_vector_filter.py --pairs 50000
+
+
+def make_pairs(n, seed=0):
+    rnd = random.Random(seed)
+    pairs = []
+    for i in range(n):
+        quote = rnd.choice(["WSOL", "USDC", "USDT"])
+        pairs.append({
+            "name": f"TKN{i}/{quote}",
+            "pair_id": f"mint{i}-{quote}",
+            "liquidity": rnd.uniform(0, 1_000_000),
+            "volume_24h_quote": rnd.choice([None, rnd.uniform(0, 5_000_000)]),
+            "apy": rnd.uniform(0, 20_000),
+            "fdv": rnd.uniform(0, 5_000_000),
+        })
+    return pairs
+
+
+def make_dex_pairs(n, seed=1):
+    rnd = random.Random(seed)
+    return [
+        {"fdv": rnd.choice([None, rnd.uniform(0, 1e7)]), "liquidity": {"usd": rnd.uniform(0, 1e6)}}
+        for _ in range(n)
+    ]
+
+
+def make_state(pairs, seed=2):
+    rnd = random.Random(seed)
+    state = {}
+    for p in pairs:
+        if rnd.random() < 0.9:
+            lp = p["liquidity"] * rnd.uniform(0.5, 1.2)
+            state[p["pair_id"]] = {"lp": lp, "last_notified_lp": lp * rnd.uniform(0.7, 1.1)}
+    return state
+
+
+def row_path(pairs, state):
+    filtered = [p for p in pairs if step2.pair_passes_filter(p)]
+    out = []
+    for p in filtered:
+        lp = p.get("liquidity", 0)
+        prev = state.get(p["pair_id"], {})
+        prev_lp = prev.get("lp", lp)
+        last = prev.get("last_notified_lp", prev_lp)
+        g, gs, d, dec = step2.classify_growth(lp, prev_lp, last)
+        if dec:
+            out.append(p["pair_id"])
+    return out
+
+
+def vector_path(pairs, state):
+    np = vector_filter.np
+    mask = vector_filter.ruleset_mask(RAYDIUM_RULES, pairs)
+    filtered = [pairs[i] for i in np.flatnonzero(mask)]
+    lp = vector_filter.column(filtered, lambda p: p.get("liquidity", 0))
+    prev = [state.get(p["pair_id"], {}) for p in filtered]
+    prev_lp = np.where(
+        vector_filter.column(prev, lambda e: e.get("lp")) >= 0,
+        vector_filter.column(prev, lambda e: e.get("lp")), lp,
+    )
+    last = vector_filter.column(prev, lambda e: e.get("last_notified_lp"))
+    last = np.where(np.isnan(last), prev_lp, last)
+    _, _, _, dec = vector_filter.classify_growth(
+        lp, prev_lp, last, step2.WATCH_LP_GROWTH, step2.IMMEDIATE_LP_GROWTH, step2.MIN_LP_DELTA_USD
+    )
+    return [filtered[i]["pair_id"] for i in np.flatnonzero(dec)]
+
+
+def ratio_row_path(pairs):
+    return [p for p in pairs if RATIO_RULES.check(p)]
+
+
+def ratio_vector_path(pairs):
+    mask = vector_filter.ruleset_mask(RATIO_RULES, pairs)
+    return [pairs[i] for i in vector_filter.np.flatnonzero(mask)]
+
+
+def timeit(fn, *args, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pairs", type=int, default=50_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if vector_filter.np is None:
+        print("numpy がインストールされていません")
+        return
+
+    pairs = make_pairs(args.pairs)
+    state = make_state(pairs)
+    dex_pairs = make_dex_pairs(args.pairs)
+
+    # filter_pairs() の print を黙らせる
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        t_row, r_row = timeit(row_path, pairs, state, repeat=args.repeat)
+        t_vec, r_vec = timeit(vector_path, pairs, state, repeat=args.repeat)
+        t_rrow, rr_row = timeit(ratio_row_path, dex_pairs, repeat=args.repeat)
+        t_rvec, rr_vec = timeit(ratio_vector_path, dex_pairs, repeat=args.repeat)
+    finally:
+        sys.stdout = stdout
+
+    assert r_row == r_vec, "判定結果が一致しません"
+    assert rr_row == rr_vec, "比率フィルタの結果が一致しません"
+
+    print(f"[BENCH] pairs={args.pairs} candidates={len(r_row)}")
+    print(f"[BENCH] step2 filter+growth  row={t_row * 1000:8.1f}ms  numpy={t_vec * 1000:8.1f}ms  x{t_row / t_vec:.1f}")
+    print(f"[BENCH] fdv/lp ratio filter   row={t_rrow * 1000:8.1f}ms  numpy={t_rvec * 1000:8.1f}ms  x{t_rrow / t_rvec:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+import statistics
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_server
+
+# -----------------------------
+# オフライン ベンチマーク
+# -----------------------------
+# スタブサーバ（bench/stub_server.py）を立て、各ステップを別プロセスで実行して
+# 経過時間・リクエスト数・ピーク RSS・スループットを測る。結果は JSON で保存し、
+# --baseline で渡した過去の結果と比べて悪化していれば終了コード 1 を返す。
+#
+#   python bench/run_bench.py --raydium-pairs 50000 --latency-ms 50
+#   python bench/run_bench.py --baseline bench/results/bench-20260101T000000.json
+#
+# step2 は本番の cron と同じく1サイクル1プロセスで2回実行する（1回目で state を作り、
+# スタブの世代を進めて2回目で成長検知・通知まで通す）。サイクルの間には API キャッシュを
+# 消す（本番の実行間隔ではキャッシュの TTL が切れているため）。メールは MAIL_DRY_RUN で送らない。
+
+SCENARIOS = ["step0", "step1", "step1_5", "step2_cycle1", "step2_cycle2", "step3"]
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+DEFAULT_MAX_REGRESSION = 0.2
+
+
+# -----------------------------
+# 子プロセス側
+# -----------------------------
+def seed_detections(n, path="logs/detections.jsonl"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    now = datetime.utcnow().isoformat()
+    chains = ["solana", "solana", "solana", "bsc"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({
+                "symbol": f"TKN{i}",
+                "chain": chains[i % len(chains)],
+                "pair": f"STUB{i:08d}pa",
+                "detected_at": now,
+            }) + "\n")
+
+
+def run_child(scenario):
+    import runpy
+
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if scenario == "step0":
+            import step0_kill
+            step0_kill.main()
+        elif scenario == "step1":
+            runpy.run_path(os.path.join(ROOT, "step1_numbers.py"), run_name="__main__")
+        elif scenario == "step1_5":
+            import step1_5_sources
+            step1_5_sources.main(None)
+        elif scenario.startswith("step2"):
+            import step2_lp_growth
+            step2_lp_growth.main()
+        elif scenario == "step3":
+            import step3_price_tracker
+            step3_price_tracker.main()
+        else:
+            raise SystemExit(f"unknown scenario: {scenario}")
+    wall = time.perf_counter() - t0
+
+    # Linux の ru_maxrss は KB 単位
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"wall_s": wall, "peak_rss_mb": peak_kb / 1024}))
+
+
+# -----------------------------
+# 親プロセス側
+# -----------------------------
+def scenario_items(scenario, args, keywords):
+    # スループット計算に使う処理件数
+    if scenario.startswith("step2"):
+        return args.raydium_pairs
+    if scenario == "step3":
+        return args.detections
+    if scenario == "step1_5":
+        return len(keywords) * args.search_pairs
+    return args.search_pairs
+
+
+def child_env(server, args):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "DEXSCREENER_BASE": server.dex_base,
+        "RAYDIUM_BASE": server.raydium_base,
+        "MAIL_DRY_RUN": "1",
+    })
+    if args.no_rate_limit:
+        env["DEXSCREENER_RPS"] = "100000"
+        env["RAYDIUM_RPS"] = "100000"
+    return env
+
+
+def run_scenario(server, scenario, workdir, env, verbose=False):
+    before = server.stats()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", scenario],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    after = server.stats()
+
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise RuntimeError(f"{scenario} が終了コード {proc.returncode} で失敗しました")
+    if verbose and proc.stderr:
+        sys.stderr.write(proc.stderr)
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["requests"] = after["requests"] - before["requests"]
+    result["server_errors"] = after["errors"] - before["errors"]
+    result["bytes"] = after["bytes_sent"] - before["bytes_sent"]
+    result["by_endpoint"] = {
+        k: v - before["by_endpoint"].get(k, 0)
+        for k, v in after["by_endpoint"].items()
+        if v - before["by_endpoint"].get(k, 0)
+    }
+    return result
+
+
+def run_once(server, args, keywords):
+    # 1回分：新しい作業ディレクトリで全シナリオを順に実行する
+    server.reset()
+    workdir = tempfile.mkdtemp(prefix="meme-bench-")
+    env = child_env(server, args)
+    results = {}
+    try:
+        seed_detections(args.detections, os.path.join(workdir, "logs", "detections.jsonl"))
+        for scenario in args.scenarios:
+            if scenario == "step2_cycle2":
+                server.advance()
+                shutil.rmtree(os.path.join(workdir, "cache"), ignore_errors=True)
+            results[scenario] = run_scenario(server, scenario, workdir, env, args.verbose)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def summarize(scenario, runs, items):
+    walls = [r["wall_s"] for r in runs]
+    wall = statistics.median(walls)
+    last = runs[-1]
+    return {
+        "scenario": scenario,
+        "runs": len(runs),
+        "wall_s": round(wall, 4),
+        "wall_s_min": round(min(walls), 4),
+        "requests": last["requests"],
+        "server_errors": last["server_errors"],
+        "bytes": last["bytes"],
+        "by_endpoint": last["by_endpoint"],
+        "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+        "items": items,
+        "items_per_s": round(items / wall, 1) if wall else None,
+        "requests_per_s": round(last["requests"] / wall, 1) if wall else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, max_regression):
+    # wall_s / requests / peak_rss_mb のどれかが max_regression を超えて増えたら悪化とみなす
+    base = {r["scenario"]: r for r in baseline.get("results", [])}
+    regressions = []
+    print(f"[BENCH] baseline: {baseline.get('revision')} ({baseline.get('created_at')})")
+    for r in report["results"]:
+        b = base.get(r["scenario"])
+        if b is None:
+            continue
+        parts = []
+        for key in ("wall_s", "requests", "peak_rss_mb"):
+            old, new = b.get(key), r.get(key)
+            if not old:
+                continue
+            change = (new - old) / old
+            parts.append(f"{key} {old}→{new} ({change:+.0%})")
+            if change > max_regression:
+                regressions.append(f"{r['scenario']}.{key}")
+        print(f"  {r['scenario']:14s} " + "  ".join(parts))
+    if regressions:
+        print("[BENCH] 悪化:", ", ".join(regressions))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="オフライン ベンチマーク")
+    stub_server.add_arguments(ap)
+    ap.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    ap.add_argument("--detections", type=int, default=300, help="step3 の追跡対象件数")
+    ap.add_argument("--repeat", type=int, default=1, help="繰り返し回数（wall_s は中央値）")
+    ap.add_argument("--no-rate-limit", action="store_true",
+                    help="http_engine の流量制限を外して処理そのものの速さを測る")
+    ap.add_argument("--out", help="結果の JSON（既定: bench/results/bench-<時刻>.json）")
+    ap.add_argument("--baseline", help="比較する過去の結果 JSON")
+    ap.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    ap.add_argument("--verbose", action="store_true", help="子プロセスの stderr を表示する")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    import step1_5_sources
+    keywords = step1_5_sources.load_keywords(None)
+
+    server = stub_server.from_args(args).start()
+    print(f"[BENCH] stub raydium={server.raydium_base} dexscreener={server.dex_base}")
+
+    runs = {s: [] for s in args.scenarios}
+    try:
+        for i in range(args.repeat):
+            for scenario, r in run_once(server, args, keywords).items():
+                runs[scenario].append(r)
+    finally:
+        server.stop()
+
+    results = [summarize(s, runs[s], scenario_items(s, args, keywords)) for s in args.scenarios]
+    for r in results:
+        print(
+            f"[BENCH] {r['scenario']:14s} wall={r['wall_s']:.3f}s req={r['requests']:4d} "
+            f"err={r['server_errors']:3d} peak_rss={r['peak_rss_mb']:.1f}MB "
+            f"items/s={r['items_per_s']}"
+        )
+
+    now = datetime.now(timezone.utc)
+    report = {
+        "revision": git_revision(),
+        "created_at": now.isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {
+            "raydium_pairs": args.raydium_pairs,
+            "search_pairs": args.search_pairs,
+            "growth_ratio": args.growth_ratio,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "fixtures": args.fixtures,
+            "seed": args.seed,
+            "detections": args.detections,
+            "repeat": args.repeat,
+            "rate_limit": not args.no_rate_limit,
+        },
+        "results": results,
+    }
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{now.strftime('%Y%m%dT%H%M%S')}.json")
+    d = os.path.dirname(out)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[BENCH] 結果: {out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+# -----------------------------
+# Raydium / Dexscreener スタブサーバ
+# -----------------------------
+# ベンチマーク用に以下のエンドポイントをローカルで返す。
+#   Raydium     : /pairs
+#   Dexscreener : /latest/dex/tokens/{a,b,..} /latest/dex/pairs/{chain}/{a,b,..} /latest/dex/search?q=
+# 応答は合成データ（seed 固定）か、--fixtures で指定したディレクトリの記録済みレスポンス。
+#   fixtures/raydium_pairs.json      : /pairs のレスポンス（配列）
+#   fixtures/dexscreener_pairs.json  : Dexscreener のペア配列（tokens / pairs / search はここから引く）
+# 遅延・エラー率・ペイロードの大きさは引数で変えられる。
+# 制御用:
+#   GET  /_bench/stats    エンドポイント別のリクエスト数
+#   POST /_bench/advance  世代を1つ進める（一部ペアの LP が増え、価格が動く）
+#   POST /_bench/reset    カウンタと世代を戻す
+#
+#   python bench/stub_server.py --raydium-pairs 50000 --latency-ms 80 --error-rate 0.02
+
+DEX_RESPONSE_PAIR_CAP = 30
+QUOTES = ["WSOL", "USDC", "USDT", "RAY"]
+# search / pairs で返すペアの quote（チェーンごと）
+QUOTE_SYMBOLS = {"solana": "SOL", "bsc": "WBNB"}
+
+
+def _h(s):
+    # 文字列から決まる 0.0〜1.0 の値（合成データを mint ごとに固定するため）
+    return int(hashlib.md5(s.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+class StubData:
+    def __init__(self, raydium_pairs=20000, search_pairs=30, growth_ratio=0.05,
+                 fixtures=None, seed=0, search_chains=("solana",)):
+        self.generation = 0
+        self.growth_ratio = growth_ratio
+        self.search_pairs = search_pairs
+        self.search_chains = tuple(search_chains)
+        self.chain_of = {}      # search で返した mint -> chainId（tokens も同じチェーンで返す）
+        self.recorded_dex = None
+
+        if fixtures:
+            with open(os.path.join(fixtures, "raydium_pairs.json"), "r", encoding="utf-8") as f:
+                self.raydium = json.load(f)
+            dex_path = os.path.join(fixtures, "dexscreener_pairs.json")
+            if os.path.exists(dex_path):
+                with open(dex_path, "r", encoding="utf-8") as f:
+                    self.recorded_dex = json.load(f)
+        else:
+            self.raydium = self._make_raydium(raydium_pairs, seed)
+
+        self._raydium_body = {}
+
+    # --- Raydium ---
+    def _make_raydium(self, n, seed):
+        rnd = random.Random(seed)
+        pairs = []
+        for i in range(n):
+            quote = rnd.choice(QUOTES)
+            mint = f"STUB{i:08d}mint"
+            # 半分程度がフィルタ条件（LP 1000〜500000 など）に入るようにする
+            pairs.append({
+                "name": f"TKN{i}/{quote}",
+                "pair_id": f"{mint}-{quote}mint",
+                "lp_mint": f"lp{i:08d}",
+                "official": False,
+                "liquidity": rnd.uniform(0, 1_000_000),
+                "market": f"mkt{i:08d}",
+                "volume_24h": rnd.uniform(0, 5_000_000),
+                "volume_24h_quote": rnd.uniform(0, 5_000_000),
+                "fee_24h": rnd.uniform(0, 10_000),
+                "price": rnd.uniform(0, 10),
+                "amm_id": f"amm{i:08d}",
+                "apy": rnd.uniform(0, 20_000),
+            })
+        return pairs
+
+    def raydium_body(self):
+        # 世代ごとに1回だけシリアライズする
+        body = self._raydium_body.get(self.generation)
+        if body is None:
+            g = self.generation
+            pairs = self.raydium
+            if g:
+                pairs = []
+                for p in self.raydium:
+                    if _h(f"{p['pair_id']}:{g}") < self.growth_ratio:
+                        p = dict(p, liquidity=(p.get("liquidity") or 0) * (1.3 + 0.5 * g))
+                    pairs.append(p)
+            body = json.dumps(pairs).encode()
+            self._raydium_body = {g: body}
+        return body
+
+    # --- Dexscreener ---
+    def dex_pair(self, mint, i=0, chain="solana", address=None):
+        r = _h(mint)
+        price = 0.0001 + r * (1 + self.generation * 0.5)
+        lp = 31_000 + r * 200_000
+        if r < self.growth_ratio:
+            # advance ごとに一部のペアの LP も増やす（Dexscreener ソースのチェーンでも検知が出るように）
+            lp *= 1 + self.generation * 0.6
+        return {
+            "chainId": chain,
+            "dexId": "raydium",
+            "pairAddress": address or f"{mint}pa{i}",
+            "baseToken": {"address": mint, "symbol": f"S{mint[-8:]}", "name": mint},
+            "quoteToken": {"address": "So11111111111111111111111111111111111111112",
+                           "symbol": QUOTE_SYMBOLS.get(chain, "WETH")},
+            "priceUsd": f"{price:.8f}",
+            "priceChange": {"m5": round(r * 20 - 2, 2), "h1": round(r * 50 - 10, 2)},
+            "txns": {"m5": {"buys": int(r * 40), "sells": int(r * 20)}},
+            "volume": {"m5": round(r * 10_000, 2), "h24": round(r * 400_000, 2)},
+            "liquidity": {"usd": round(lp * (1 + i * 0.1), 2)},
+            "fdv": round(lp * (1.2 + r * 5), 2),
+            "marketCap": round(lp * (1.2 + r * 5), 2),
+            "pairCreatedAt": int(time.time() * 1000) - int(r * 86_400_000),
+        }
+
+    def tokens(self, mints):
+        if self.recorded_dex is not None:
+            wanted = set(mints)
+            pairs = [p for p in self.recorded_dex
+                     if (p.get("baseToken") or {}).get("address") in wanted
+                     or (p.get("quoteToken") or {}).get("address") in wanted]
+        else:
+            pairs = [self.dex_pair(m, i, chain=self.chain_of.get(m, "solana")) for m in mints for i in range(2)]
+        return {"pairs": pairs[:DEX_RESPONSE_PAIR_CAP]}
+
+    def pairs(self, chain, addresses):
+        if self.recorded_dex is not None:
+            wanted = {a.lower() for a in addresses}
+            return {"pairs": [p for p in self.recorded_dex
+                              if (p.get("pairAddress") or "").lower() in wanted]}
+        return {"pairs": [self.dex_pair(a, chain=chain, address=a) for a in addresses]}
+
+    def search(self, q):
+        if self.recorded_dex is not None:
+            ql = q.lower()
+            return {"pairs": [p for p in self.recorded_dex
+                              if ql in json.dumps(p.get("baseToken") or {}).lower()][:self.search_pairs]}
+        # キーワードをまたいで同じペアが返るよう、半分は共通のプールから選ぶ
+        pairs = []
+        for i in range(self.search_pairs):
+            key = f"common{i % 10}" if i % 2 else f"{q}{i}"
+            chain = self.search_chains[i % len(self.search_chains)]
+            self.chain_of[key] = chain
+            pairs.append(self.dex_pair(key, chain=chain, address=f"{key}pa"))
+        return {"pairs": pairs}
+
+
+class StubServer:
+    def __init__(self, data, host="127.0.0.1", raydium_port=0, dex_port=0,
+                 latency_ms=0, jitter_ms=0, error_rate=0.0, seed=0):
+        self.data = data
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.errors = 0
+        self.bytes_sent = 0
+
+        handler = self._handler()
+        # Raydium と Dexscreener はポートを分ける（http_engine の流量制限が host:port 単位のため）
+        self.raydium = ThreadingHTTPServer((host, raydium_port), handler)
+        self.dex = ThreadingHTTPServer((host, dex_port), handler)
+        self.raydium.daemon_threads = True
+        self.dex.daemon_threads = True
+        self.threads = []
+
+    @property
+    def raydium_base(self):
+        host, port = self.raydium.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def dex_base(self):
+        host, port = self.dex.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        for srv in (self.raydium, self.dex):
+            t = threading.Thread(target=srv.serve_forever, daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        for srv in (self.raydium, self.dex):
+            srv.shutdown()
+            srv.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "generation": self.data.generation,
+                "requests": sum(self.counts.values()),
+                "by_endpoint": dict(self.counts),
+                "errors": self.errors,
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.errors = 0
+            self.bytes_sent = 0
+            self.data.generation = 0
+
+    def advance(self):
+        with self.lock:
+            self.data.generation += 1
+
+    # --- リクエスト処理 ---
+    def _route(self, path, query):
+        if path == "/pairs":
+            return "raydium_pairs", self.data.raydium_body()
+        if path.startswith("/latest/dex/tokens/"):
+            mints = [m for m in unquote(path.rsplit("/", 1)[1]).split(",") if m]
+            return "dex_tokens", self.data.tokens(mints)
+        if path.startswith("/latest/dex/pairs/"):
+            parts = path.split("/")
+            if len(parts) < 6:
+                return None, None
+            addresses = [a for a in unquote(parts[5]).split(",") if a]
+            return "dex_pairs", self.data.pairs(parts[4], addresses)
+        if path.startswith("/latest/dex/search"):
+            q = (query.get("q") or [""])[0]
+            return "dex_search", self.data.search(q)
+        return None, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return len(body)
+
+            def do_POST(self):
+                u = urlparse(self.path)
+                if u.path == "/_bench/advance":
+                    server.advance()
+                elif u.path == "/_bench/reset":
+                    server.reset()
+                else:
+                    self._reply(404, {"error": "not found"})
+                    return
+                self._reply(200, server.stats())
+
+            def do_GET(self):
+                u = urlparse(self.path)
+                if u.path == "/_bench/stats":
+                    self._reply(200, server.stats())
+                    return
+
+                name, body = server._route(u.path, parse_qs(u.query))
+                if name is None:
+                    self._reply(404, {"error": "not found"})
+                    return
+
+                with server.lock:
+                    server.counts[name] = server.counts.get(name, 0) + 1
+                    fail = server.rnd.random() < server.error_rate
+                    delay = server.latency_ms + server.rnd.uniform(0, server.jitter_ms)
+
+                if delay > 0:
+                    time.sleep(delay / 1000)
+                if fail:
+                    with server.lock:
+                        server.errors += 1
+                    self._reply(503, {"error": "stub error"})
+                    return
+
+                n = self._reply(200, body)
+                with server.lock:
+                    server.bytes_sent += n
+
+        return Handler
+
+
+def add_arguments(ap):
+    ap.add_argument("--raydium-pairs", type=int, default=20000, help="合成 /pairs のペア数")
+    ap.add_argument("--search-pairs", type=int, default=30, help="search 1回あたりのペア数")
+    ap.add_argument("--search-chains", default="solana",
+                    help="search の結果に混ぜる chainId（カンマ区切り。複数チェーンの step2 用）")
+    ap.add_argument("--growth-ratio", type=float, default=0.05,
+                    help="/_bench/advance で LP が増えるペアの割合")
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--jitter-ms", type=float, default=0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="503 を返す割合")
+    ap.add_argument("--fixtures", help="記録済みレスポンスのディレクトリ")
+    ap.add_argument("--seed", type=int, default=0)
+
+
+def from_args(args, raydium_port=0, dex_port=0):
+    data = StubData(
+        raydium_pairs=args.raydium_pairs,
+        search_pairs=args.search_pairs,
+        growth_ratio=args.growth_ratio,
+        fixtures=args.fixtures,
+        seed=args.seed,
+        search_chains=[c for c in args.search_chains.split(",") if c],
+    )
+    return StubServer(
+        data,
+        raydium_port=raydium_port,
+        dex_port=dex_port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Raydium / Dexscreener スタブサーバ")
+    add_arguments(ap)
+    ap.add_argument("--raydium-port", type=int, default=8701)
+    ap.add_argument("--dex-port", type=int, default=8702)
+    args = ap.parse_args()
+
+    server = from_args(args, args.raydium_port, args.dex_port).start()
+    print(f"[STUB] RAYDIUM_BASE={server.raydium_base} DEXSCREENER_BASE={server.dex_base}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
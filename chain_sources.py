@@ -0,0 +1,276 @@
+import os
+import time
+import random
+from urllib.parse import quote
+
+import api_cache
+import http_engine
+import metrics
+import serializer
+import snapshot_diff
+import vector_filter
+from json_stream import iter_json_array
+from records import Pair
+from rules import load_rules
+from step1_5_sources import load_keywords
+
+# -----------------------------
+# チェーン別のペア取得（ソースアダプタ）
+# -----------------------------
+# step2 の検知ループはチェーンに依存しない。チェーンごとの違いはここに閉じ込める。
+#   fetch_pairs(known)  フィルタを通過したペアを Pair レコードで返す（known は前回まで追跡していた pair_id）
+#                       取得に失敗して使える結果が無ければ None（step2 はそのサイクルの判定をしない）
+#   unknown             直前の fetch_pairs で状態を確かめられなかった pair_id（消滅扱いにしない）
+#   token_of(pair)      二次判定で Dexscreener に問い合わせるトークン
+#   rules               一次フィルタのルールセット（件数の集計用）
+#   name / chain / dex_chain  シャード名 / メール表示用のチェーン名 / Dexscreener の chainId
+#
+# solana は従来どおり Raydium /pairs の全件から WSOL ペアを絞り込む。
+# それ以外のチェーンは Raydium のような全件 API が無いので、Dexscreener のキーワード検索で新しい
+# ペアを拾い、前回まで追跡していたペアは /pairs/{chain}/{a,b,..} でまとめて取り直す。
+
+# 監視するチェーン（カンマ区切り）。複数指定すると step2 はチェーンごとに別プロセスで動く
+CHAINS = [c.strip().lower() for c in os.getenv("CHAINS", "solana").split(",") if c.strip()]
+
+RULES = load_rules()
+PARAMS = RULES.params
+RAYDIUM_RULES = RULES["raydium_pair"]
+DEX_PAIR_RULES = RULES["dex_pair"]
+
+RAYDIUM_API = f"{http_engine.RAYDIUM_BASE}/pairs"
+# /pairs を chunk 単位で読みながらフィルタする（"0" で1回で decode する経路。orjson があれば orjson）
+RAYDIUM_STREAM = os.getenv("RAYDIUM_STREAM", "1") != "0"
+STREAM_CHUNK_SIZE = 64 * 1024
+# 接続は早めに諦めて再試行に回す（読み込みは chunk ごとの待ち時間）
+RAYDIUM_TIMEOUT = (5, 30)
+# 最後に取得できたフィルタ後のペア。取得に失敗したサイクルはこれで判定を続ける（"" で無効）
+RAYDIUM_LAST_GOOD = os.getenv("RAYDIUM_LAST_GOOD", "cache/raydium_last_good.json.gz")
+RAYDIUM_LAST_GOOD_MAX_AGE = float(os.getenv("RAYDIUM_LAST_GOOD_MAX_AGE", "3600"))
+
+SEARCH_API = f"{http_engine.DEXSCREENER_BASE}/latest/dex/search?q="
+PAIRS_API = f"{http_engine.DEXSCREENER_BASE}/latest/dex/pairs/"
+# 複数アドレス指定 /pairs/{chain}/{a,b,c} の1リクエストあたり上限
+PAIRS_BATCH_SIZE = 30
+# 前回から取り直すペアの上限（検索で拾ったペアが増え続けても1サイクルの費用を抑える）
+# 上限を超えた分はサイクルごとに順番に入れ替えて取り直す（今回取り直さないペアは unknown 扱い）
+MAX_TRACKED_PAIRS = int(os.getenv("CHAIN_MAX_TRACKED_PAIRS", "600"))
+
+# メール・リンク用の表示名（無いチェーンは chainId をそのまま使う）
+CHAIN_LABELS = {
+    "solana": "Solana",
+    "ethereum": "Ethereum",
+    "base": "Base",
+    "bsc": "BSC",
+    "arbitrum": "Arbitrum",
+    "polygon": "Polygon",
+    "avalanche": "Avalanche",
+}
+
+
+# -----------------------------
+# Raydium（solana）
+# -----------------------------
+def fetch_raydium_pairs():
+    try:
+        with metrics.timer("raydium_download"):
+            resp = http_engine.get(RAYDIUM_API, timeout=RAYDIUM_TIMEOUT)
+        with metrics.timer("raydium_decode"):
+            data = serializer.loads(resp.content)
+        print(f"[API] ペア数: {len(data)}")
+        return data
+    except Exception as e:
+        print("[API] 取得エラー:", e)
+        return None
+
+
+def _timed_chunks(chunks, waited):
+    # chunk を待っていた時間（ネットワーク待ち）を waited[0] に足し込む
+    it = iter(chunks)
+    while True:
+        t0 = time.perf_counter()
+        chunk = next(it, None)
+        waited[0] += time.perf_counter() - t0
+        if chunk is None:
+            return
+        yield chunk
+
+
+def fetch_filtered_raydium_pairs():
+    # ストリーミング取得：フィルタを通過したペアだけを Pair レコードにしてメモリに残す
+    # ダウンロードとデコード・フィルタは交互に進むので、chunk 待ちの時間で切り分けて計測する
+    filtered = []
+    total = 0
+    waited = [0.0]
+    t0 = time.perf_counter()
+    try:
+        with http_engine.get(RAYDIUM_API, timeout=RAYDIUM_TIMEOUT, stream=True) as resp:
+            waited[0] += time.perf_counter() - t0
+            chunks = _timed_chunks(resp.iter_content(chunk_size=STREAM_CHUNK_SIZE), waited)
+            for p in iter_json_array(chunks):
+                total += 1
+                if pair_passes_filter(p):
+                    filtered.append(Pair.from_raydium(p))
+    except Exception as e:
+        print("[API] 取得エラー:", e)
+        return None
+    finally:
+        metrics.add_stage_time("raydium_download", waited[0])
+        metrics.add_stage_time("raydium_decode_filter", time.perf_counter() - t0 - waited[0])
+
+    print(f"[API] ペア数: {total}")
+    print(f"[FILTER] フィルタ後ヒット件数: {len(filtered)}")
+    return filtered
+
+
+def save_last_good(pairs, path=RAYDIUM_LAST_GOOD):
+    if not path:
+        return
+    snapshot = {
+        "time": time.time(),
+        "rules": snapshot_diff.rules_key(PARAMS),
+        "pairs": [p.to_dict() for p in pairs],
+    }
+    try:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        serializer.dump_file(snapshot, path)
+    except (OSError, RuntimeError) as e:
+        print("[API] 前回値の保存に失敗:", e)
+
+
+def load_last_good(path=RAYDIUM_LAST_GOOD, max_age=RAYDIUM_LAST_GOOD_MAX_AGE):
+    # 古すぎる・閾値が変わった後のスナップショットは使わない（None）
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        snapshot = serializer.load_file(path)
+    except (OSError, ValueError, RuntimeError) as e:
+        print("[API] 前回値を読めません:", e)
+        return None
+    age = time.time() - snapshot.get("time", 0)
+    if age > max_age or snapshot.get("rules") != snapshot_diff.rules_key(PARAMS):
+        return None
+    pairs = [Pair.from_raydium(p) for p in snapshot.get("pairs") or []]
+    print(f"[API] 取得に失敗したため {age / 60:.0f} 分前の取得結果（{len(pairs)} ペア）で判定します")
+    metrics.inc("raydium_last_good_used_total")
+    return pairs
+
+
+def pair_passes_filter(p):
+    return RAYDIUM_RULES.check(p)
+
+
+def filter_pairs(pairs):
+    with metrics.timer("filter"):
+        filtered = _filter_pairs(pairs)
+    print(f"[FILTER] フィルタ後ヒット件数: {len(filtered)}")
+    return filtered
+
+
+def _filter_pairs(pairs):
+    if vector_filter.available() and pairs:
+        mask = vector_filter.ruleset_mask(RAYDIUM_RULES, pairs)
+        return [pairs[i] for i in vector_filter.np.flatnonzero(mask)]
+    return [p for p in pairs if pair_passes_filter(p)]
+
+
+def extract_non_wsol_token(name, pair_id):
+    parts_name = name.split("/")
+    parts_id = pair_id.split("-")
+    if len(parts_name) != 2 or len(parts_id) != 2:
+        return parts_id[0]
+    return parts_id[1] if parts_name[0] == "WSOL" else parts_id[0]
+
+
+class RaydiumSource:
+    name = "solana"
+    chain = "Solana"
+    dex_chain = "solana"
+    rules = RAYDIUM_RULES
+    unknown = frozenset()
+
+    def fetch_pairs(self, known=()):
+        if RAYDIUM_STREAM:
+            pairs = fetch_filtered_raydium_pairs()
+        else:
+            raw = fetch_raydium_pairs()
+            pairs = None if raw is None else [Pair.from_raydium(p) for p in filter_pairs(raw)]
+        if pairs is None:
+            return load_last_good()
+        save_last_good(pairs)
+        return pairs
+
+    def token_of(self, pair):
+        return extract_non_wsol_token(pair.get("name"), pair.pair_id)
+
+
+# -----------------------------
+# Dexscreener（solana 以外）
+# -----------------------------
+class DexscreenerSource:
+    rules = DEX_PAIR_RULES
+
+    def __init__(self, chain, keywords=None):
+        self.name = chain
+        self.dex_chain = chain
+        self.chain = CHAIN_LABELS.get(chain, chain)
+        self.keywords = keywords if keywords is not None else load_keywords()
+        self.quote_symbols = frozenset(s.upper() for s in PARAMS["DEX_QUOTE_SYMBOLS"])
+        self.unknown = frozenset()
+        # 追跡ペアの巡回位置。cron では毎回新しいプロセスなので、開始位置をずらして偏らないようにする
+        self._cursor = random.randrange(1 << 30)
+
+    def _tracked_window(self, known):
+        # 上限に収まるなら全件。超える分は pair_id 順に巡回し、今回の窓と窓の外に分ける
+        known = sorted(known)
+        if len(known) <= MAX_TRACKED_PAIRS:
+            return known, []
+        start = self._cursor % len(known)
+        self._cursor = start + MAX_TRACKED_PAIRS
+        rotated = known[start:] + known[:start]
+        return rotated[:MAX_TRACKED_PAIRS], rotated[MAX_TRACKED_PAIRS:]
+
+    def fetch_pairs(self, known=()):
+        known, skipped = self._tracked_window(known)
+        batches = [known[i:i + PAIRS_BATCH_SIZE] for i in range(0, len(known), PAIRS_BATCH_SIZE)]
+        urls = [SEARCH_API + quote(kw) for kw in self.keywords]
+        urls += [f"{PAIRS_API}{self.dex_chain}/{','.join(b)}" for b in batches]
+
+        with metrics.timer("dex_pairs_download"):
+            # LP を見るための取得なので、前回のサイクルのキャッシュは使わない
+            responses = api_cache.get_json_many(urls, timeout=10, refresh=True)
+
+        with metrics.timer("dex_pairs_filter"):
+            seen = {}
+            total = 0
+            unknown = set(skipped)
+            for i, data in enumerate(responses):
+                if isinstance(data, Exception):
+                    print(f"[API] {self.name} 取得エラー:", data)
+                    # 取り直せなかった追跡ペアは消えたとはみなさない
+                    if i >= len(self.keywords):
+                        unknown.update(batches[i - len(self.keywords)])
+                    continue
+                for p in (data or {}).get("pairs") or []:
+                    if p.get("chainId") != self.dex_chain:
+                        continue
+                    total += 1
+                    addr = p.get("pairAddress")
+                    if addr and addr not in seen and self.rules.check(p):
+                        seen[addr] = Pair.from_dexscreener(p, self.quote_symbols)
+
+        print(f"[API] {self.name} ペア数: {total}（検索 {len(self.keywords)} / 追跡 {len(batches)} リクエスト"
+              + (f"、次回以降に回した追跡ペア {len(skipped)}" if skipped else "") + "）")
+        print(f"[FILTER] フィルタ後ヒット件数: {len(seen)}")
+        self.unknown = frozenset(unknown.difference(seen))
+        if responses and all(isinstance(data, Exception) for data in responses):
+            return None
+        return list(seen.values())
+
+    def token_of(self, pair):
+        return pair.token
+
+
+def make_source(name):
+    return RaydiumSource() if name == "solana" else DexscreenerSource(name)
@@ -0,0 +1,51 @@
+import os
+import heapq
+
+# -----------------------------
+# 二次判定（Dexscreener 確認）の優先度スケジューラ
+# -----------------------------
+# 一次判定を通った候補を優先度の高い順に並べ、1サイクルあたりのリクエスト予算に収まる分だけ
+# Dexscreener で確認する。予算に入らなかった候補は捨てずに次のサイクルへ繰り越す
+# （step2 は通知しなかった候補の指紋を「保留」にするので、LP が動かなくても次回また判定される）。
+#
+# 優先度: IMMEDIATE > WATCH、同じ判定なら前回通知からの成長率、次に LP 増加額の大きい順。
+# 費用: /tokens/{a,b,...} は1リクエストで batch_size 個の mint を確認できるので、
+#       予算 B リクエストなら上位 B * batch_size 個の mint まで。同じ mint の別ペアは追加費用なし。
+
+# 0 なら無制限（従来どおり全候補を確認）
+DEX_REQUEST_BUDGET = int(os.getenv("DEX_REQUEST_BUDGET", "10"))
+
+
+def priority(row):
+    return (row["decision"] == "IMMEDIATE", row["growth_since_last_mail"], row["lp_delta"])
+
+
+def schedule(rows, budget=DEX_REQUEST_BUDGET, batch_size=30):
+    # 戻り値: (確認する候補（優先度順）, 繰り越す候補（優先度順）)
+    heap = [(_neg(priority(r)), i, r) for i, r in enumerate(rows) if r["decision"]]
+    heapq.heapify(heap)
+    capacity = budget * batch_size if budget > 0 else None
+
+    selected, deferred = [], []
+    mints = set()
+    # 上位から必要な分だけ取り出す（全体のソートはしない）
+    while heap and (capacity is None or len(mints) < capacity):
+        r = heapq.heappop(heap)[2]
+        mints.add(r["mint"])
+        selected.append(r)
+    # 枠が埋まった後も、確認済みの mint と同じ候補は同じレスポンスで判定できる
+    while heap:
+        r = heapq.heappop(heap)[2]
+        (selected if r["mint"] in mints else deferred).append(r)
+    return selected, deferred
+
+
+def _neg(key):
+    return tuple(-k for k in key)
+
+
+def summary(selected, deferred, budget=DEX_REQUEST_BUDGET):
+    return (
+        f"[SCHED] 候補={len(selected) + len(deferred)} 確認={len(selected)} 繰り越し={len(deferred)}"
+        f" 予算={budget or '無制限'}"
+    )
@@ -0,0 +1,261 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows では別プロセスとの排他をしない（Actions / 常駐は Linux）
+    fcntl = None
+
+import serializer
+
+# -----------------------------
+# 検知レコードの追記専用ストア
+# -----------------------------
+# logs/detections.jsonl         : 検知レコード本体（追記のみ。行番号がレコード id）
+# logs/detections_updates.jsonl : 追跡結果の差分（{"id", "tracking", "auto_result"} を追記）
+# logs/detections_open.json     : 未決着レコードの索引と、各ファイルの読み込み済み位置
+#
+# 毎回読むのは索引と、前回以降に追記された末尾だけ。決着済み・期限切れのレコードは二度と読まない。
+#
+# 書き手: step2 が通知ごとに add() でレコードを追記し、step3 が update() / commit() で結果を追記する。
+# どちらも追記しかしないので、別プロセス（チェーンごとのシャードも）が同時に書いてもよい。
+# commit() は logs/detections.lock を取ってから、他のプロセスの追記を読み込み、差分を追記し、
+# 索引をプロセスごとの一時ファイル経由で置き換える。
+# id は行番号なので、追記した側も読み直してから id が決まる。
+# 未決着のレコードは (chain, pair) でも引ける（同じペアを二重に追跡しないため）。
+
+DETECTIONS_FILE = "logs/detections.jsonl"
+
+
+class DetectionStore:
+    def __init__(self, path=DETECTIONS_FILE):
+        self.path = path
+        base, ext = os.path.splitext(path)
+        self.updates_path = f"{base}_updates{ext}"
+        self.index_path = f"{base}_open.json"
+        self.lock_path = f"{base}.lock"
+
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+        self.open = {}            # id(str) -> 差分を反映済みのレコード
+        self.by_pair = {}         # pair_key(chain, pair) -> 未決着レコードの id
+        self.offset = 0           # detections.jsonl の読み込み済みバイト数
+        self.updates_offset = 0   # detections_updates.jsonl の読み込み済みバイト数
+        self.next_id = 0
+        self._deltas = []
+
+        self._load_index()
+        self._scan_new_records()
+        self._scan_new_updates()
+
+    # --- 読み込み ---
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                idx = serializer.loads(f.read())
+        except ValueError:
+            print("[DETECT] 索引が壊れているため作り直します")
+            return
+
+        # 本体が索引より短い（作り直された等）なら索引は使わない
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if idx.get("offset", 0) > size:
+            return
+        self.open = idx.get("open", {})
+        self.offset = idx.get("offset", 0)
+        self.updates_offset = idx.get("updates_offset", 0)
+        self.next_id = idx.get("next_id", 0)
+        for rid, rec in self.open.items():
+            self._index(rid, rec)
+
+    def _index(self, rid, rec):
+        if rec.get("chain") and rec.get("pair"):
+            self.by_pair[pair_key(rec["chain"], rec["pair"])] = rid
+
+    def _unindex(self, rid, rec):
+        if rec.get("chain") and rec.get("pair"):
+            key = pair_key(rec["chain"], rec["pair"])
+            if self.by_pair.get(key) == rid:
+                del self.by_pair[key]
+
+    def refresh(self):
+        # 他のプロセスが前回以降に追記した分を取り込む
+        self._scan_new_records()
+        self._scan_new_updates()
+
+    def _scan_new_records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break   # 書き込み途中の行は次回
+                self.offset += len(raw)
+                rid = str(self.next_id)
+                self.next_id += 1
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    rec = serializer.loads(line)
+                except ValueError:
+                    continue
+                if "auto_result" not in rec:
+                    self.open[rid] = rec
+                    self._index(rid, rec)
+
+    def _scan_new_updates(self):
+        if not os.path.exists(self.updates_path):
+            return
+        with open(self.updates_path, "rb") as f:
+            f.seek(self.updates_offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self.updates_offset += len(raw)
+                try:
+                    delta = serializer.loads(raw)
+                except ValueError:
+                    continue
+                self._apply(delta)
+
+    def _apply(self, delta):
+        rec = self.open.get(delta.get("id"))
+        if rec is None:
+            return
+        for k, v in delta.items():
+            if k != "id":
+                rec[k] = v
+        if "auto_result" in rec:
+            del self.open[delta["id"]]
+            self._unindex(delta["id"], rec)
+
+    # --- 参照 ---
+    def open_records(self):
+        # {id: record}。record を直接書き換えず update() を使う
+        return dict(self.open)
+
+    def open_for(self, chain, pair):
+        # そのペアを追跡中のレコードの id（無ければ None）
+        return self.by_pair.get(pair_key(chain, pair))
+
+    # --- 追記 ---
+    def add(self, record):
+        # 検知レコードを1行追記し、その id を返す（1回の write なので他のプロセスの行と混ざらない）
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(serializer.dumps(record) + "\n")
+        self._scan_new_records()
+        return self.open_for(record.get("chain"), record.get("pair"))
+
+    # --- 更新 ---
+    def update(self, rid, **fields):
+        delta = {"id": rid, **fields}
+        self._deltas.append(delta)
+        self._apply(delta)
+
+    def commit(self):
+        # 差分を追記し、索引を書き直す（索引の大きさは未決着件数に比例）
+        with self._locked():
+            # 他のプロセスが追記した分を先に取り込む（読み込み位置を飛ばして取りこぼさないように）
+            self.refresh()
+            if self._deltas:
+                body = serializer.dumps_lines(self._deltas).encode("utf-8")
+                with open(self.updates_path, "ab") as f:
+                    start = f.seek(0, os.SEEK_END)
+                    f.write(body)
+                # 読み込み済みの位置が末尾と一致するときだけ、自分が書いた分だけ進める
+                # （書き込み途中の行が残っていたら、次の refresh で自分の差分ごと読み直す。反映は何度でも同じ）
+                if self.updates_offset == start:
+                    self.updates_offset += len(body)
+                self._deltas = []
+
+            d = os.path.dirname(self.index_path) or "."
+            stem = os.path.splitext(os.path.basename(self.index_path))[0]
+            fd, tmp = tempfile.mkstemp(dir=d, prefix=f".{stem}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(serializer.dumps({
+                        "offset": self.offset,
+                        "updates_offset": self.updates_offset,
+                        "next_id": self.next_id,
+                        "open": self.open,
+                    }))
+                os.replace(tmp, self.index_path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def pair_key(chain, pair):
+    # EVM のアドレスは大文字小文字が揺れるので小文字で比べる
+    return f"{chain}:{(pair or '').lower()}"
+
+
+def iter_records(path=DETECTIONS_FILE):
+    # 本体に差分をすべて反映したレコードを id 順に返す（分析用。全件を読む）
+    base, ext = os.path.splitext(path)
+    updates_path = f"{base}_updates{ext}"
+
+    records = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                try:
+                    records.append(serializer.loads(line) if line else None)
+                except ValueError:
+                    records.append(None)
+
+    if os.path.exists(updates_path):
+        with open(updates_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    delta = serializer.loads(line)
+                    rec = records[int(delta["id"])]
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if rec is not None:
+                    rec.update({k: v for k, v in delta.items() if k != "id"})
+
+    for rid, rec in enumerate(records):
+        if rec is not None:
+            yield str(rid), rec
+
+
+def main(argv):
+    # python detection_store.py materialize [logs/detections.jsonl] [out.jsonl]
+    if len(argv) < 2 or argv[1] != "materialize":
+        print("usage: detection_store.py materialize [detections.jsonl] [out.jsonl]")
+        return 1
+    path = argv[2] if len(argv) > 2 else DETECTIONS_FILE
+    out_path = argv[3] if len(argv) > 3 else os.path.splitext(path)[0] + "_merged.jsonl"
+    n = 0
+    with open(out_path, "w", encoding="utf-8") as f:
+        for _, rec in iter_records(path):
+            f.write(serializer.dumps(rec) + "\n")
+            n += 1
+    print(f"[DETECT] {n} 件 → {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
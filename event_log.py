@@ -0,0 +1,194 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import shutil
+import threading
+from datetime import datetime
+
+import serializer
+
+# -----------------------------
+# 追記専用の JSONL イベントログ
+# -----------------------------
+# 1判定 = 1行。書き込みはバッファしてまとめて追記し、サイズ / 経過時間でファイルを切り替える。
+# 切り替えたセグメントは <name>.<YYYYmmddTHHMMSS>.jsonl(.gz) として同じディレクトリに残す。
+
+LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_MAX_AGE_SECONDS = int(os.getenv("EVENT_LOG_MAX_AGE", str(24 * 60 * 60)))
+LOG_COMPRESS = os.getenv("EVENT_LOG_COMPRESS", "1") != "0"
+BUFFER_RECORDS = 500
+
+
+class EventLog:
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, max_age_seconds=LOG_MAX_AGE_SECONDS,
+                 compress=LOG_COMPRESS, buffer_records=BUFFER_RECORDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.compress = compress
+        self.buffer_records = buffer_records
+
+        self._buffer = []
+        self._lock = threading.Lock()       # バッファ用
+        self._io_lock = threading.Lock()    # ファイル書き込み / ローテーション用
+
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        migrate_legacy(path)
+        self._started_at = self._segment_start()
+
+    def _segment_start(self):
+        # 現セグメントの先頭行の time（無ければファイル作成時刻）
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                first = serializer.loads(f.readline())
+            return datetime.fromisoformat(first["time"])
+        except Exception:
+            return datetime.utcfromtimestamp(os.path.getmtime(self.path))
+
+    def append(self, record):
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.buffer_records
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return 0
+
+        lines = serializer.dumps_lines(records)
+        with self._io_lock:
+            self._maybe_rotate(len(lines.encode("utf-8")))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            if self._started_at is None:
+                self._started_at = datetime.utcnow()
+        return len(records)
+
+    def close(self):
+        self.flush()
+
+    def _maybe_rotate(self, incoming_bytes):
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return
+
+        too_big = size + incoming_bytes > self.max_bytes
+        too_old = (
+            self._started_at is not None and
+            (datetime.utcnow() - self._started_at).total_seconds() > self.max_age_seconds
+        )
+        if too_big or too_old:
+            self.rotate()
+
+    def rotate(self):
+        stamp = (self._started_at or datetime.utcnow()).strftime("%Y%m%dT%H%M%S")
+        base, ext = os.path.splitext(self.path)
+        target = f"{base}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{base}.{stamp}-{n}{ext}"
+            n += 1
+
+        os.replace(self.path, target)
+        if self.compress:
+            with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+            target += ".gz"
+        self._started_at = None
+        print(f"[LOG] ローテーション: {target}")
+        return target
+
+
+def migrate_legacy(path):
+    # 旧形式（pair_id -> 最新エントリの dict を indent=2 で保存）なら JSONL に書き直す
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.readline().strip()
+    if head != "{":
+        return False
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+    except ValueError:
+        return False
+
+    entries = sorted(legacy.values(), key=lambda e: e.get("time") or "")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(serializer.dumps(e) + "\n")
+    os.replace(tmp, path)
+    print(f"[LOG] 旧形式のログを JSONL に変換しました: {len(entries)} 件")
+    return True
+
+
+def segments(path):
+    # 古い順のセグメント一覧（ローテーション済み → 現行ファイル）
+    base, ext = os.path.splitext(path)
+    rotated = sorted(
+        glob.glob(f"{glob.escape(base)}.*{ext}") + glob.glob(f"{glob.escape(base)}.*{ext}.gz")
+    )
+    rotated = [p for p in rotated if p != path]
+    if os.path.exists(path):
+        rotated.append(path)
+    return rotated
+
+
+def iter_events(path):
+    for seg in segments(path):
+        opener = gzip.open if seg.endswith(".gz") else open
+        with opener(seg, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield serializer.loads(line)
+                except ValueError:
+                    continue
+
+
+def compact(path, out_path, key="pair_id"):
+    # 全セグメントを流し読みし、key ごとの最新エントリだけを JSON に書き出す
+    latest = {}
+    total = 0
+    for e in iter_events(path):
+        total += 1
+        k = e.get(key)
+        if k is not None:
+            latest[k] = e
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(latest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out_path)
+    return total, len(latest)
+
+
+def main(argv):
+    # python event_log.py compact [logs/debug_notifications.jsonl] [out.json]
+    if len(argv) < 2 or argv[1] != "compact":
+        print("usage: event_log.py compact [log.jsonl] [out.json]")
+        return 1
+    path = argv[2] if len(argv) > 2 else "logs/debug_notifications.jsonl"
+    out_path = argv[3] if len(argv) > 3 else os.path.splitext(path)[0] + ".latest.json"
+    total, n = compact(path, out_path)
+    print(f"[LOG] {total} 行 → {n} ペア: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
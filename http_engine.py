@@ -0,0 +1,568 @@
+import os
+import time
+import atexit
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import serializer
+
+try:
+    import aiohttp
+except ImportError:   # aiohttp が無ければスレッドプールで代用
+    aiohttp = None
+
+# -----------------------------
+# HTTP 取得エンジン
+# -----------------------------
+# - requests.Session を共有して keep-alive 接続を使い回す（同期 API）
+# - aiohttp で複数 URL を並行取得（非同期 API と、その同期ラッパ）
+#   同期ラッパは専用スレッドのイベントループと aiohttp セッションを1つずつ使い回す
+#   （呼び出しごと・サイクルごとに接続と TLS をやり直さない。終了時に close() で閉じる）
+# - ホストごとのトークンバケットで流量を制限
+# - 失敗（接続エラー / タイムアウト / 429 / 5xx）はジッタ付きの指数バックオフで再試行
+# - ホストごとのサーキットブレーカ: 連続して失敗したホストには一定時間リクエストを送らない
+#   （429 / 5xx を返している API を叩き続けず、すぐに CircuitOpenError で諦める）
+# - ヘッジ: 応答がそのホストの p95 より遅ければ同じ GET をもう1本送り、先に返った方を使う
+#   （送るのはリクエスト数の HEDGE_MAX_RATIO まで。stream=True の取得はヘッジしない）
+
+# --- API の接続先（ベンチマークではローカルのスタブサーバに向ける） ---
+DEXSCREENER_BASE = os.getenv("DEXSCREENER_BASE", "https://api.dexscreener.com").rstrip("/")
+RAYDIUM_BASE = os.getenv("RAYDIUM_BASE", "https://api.raydium.io").rstrip("/")
+
+MAX_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "8"))
+POOL_SIZE = max(MAX_CONCURRENCY, 10)
+KEEPALIVE_SECONDS = 30
+
+# --- ホスト（host:port）ごとの流量制限（1秒あたりのリクエスト数, バースト） ---
+# Dexscreener は 300 req/min 程度が上限なので少し余裕を持たせる
+HOST_LIMITS = {
+    urlparse(DEXSCREENER_BASE).netloc: (float(os.getenv("DEXSCREENER_RPS", "4")), 8),
+    urlparse(RAYDIUM_BASE).netloc: (float(os.getenv("RAYDIUM_RPS", "1")), 2),
+}
+DEFAULT_LIMIT = (10.0, 10)
+
+# --- 再試行 ---
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+RETRY_BASE_SECONDS = float(os.getenv("HTTP_RETRY_BASE", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("HTTP_RETRY_MAX", "8"))
+RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+
+# --- サーキットブレーカ（連続失敗回数, 最初の遮断秒数。遮断が続くたびに倍、最大 BREAKER_MAX_SECONDS） ---
+BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))
+BREAKER_SECONDS = float(os.getenv("HTTP_BREAKER_SECONDS", "30"))
+BREAKER_MAX_SECONDS = 300.0
+
+# --- ヘッジ ---
+HEDGE_ENABLED = os.getenv("HTTP_HEDGE", "1") != "0"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_RATIO = 0.1
+LATENCY_SAMPLES = 200
+
+stats = {
+    "requests": 0,
+    "errors": 0,
+    "retries": 0,
+    "hedged": 0,
+    "breaker_rejected": 0,
+}
+# stats は複数のスレッド（並行取得のワーカー・http-loop）から更新するので _count で加算する
+_stats_lock = threading.Lock()
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        stats[key] += n
+
+
+class CircuitOpenError(requests.RequestException):
+    # ブレーカが開いているホストへのリクエスト（送らずに失敗させる）
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        # トークンを1つ確保し、使えるようになるまでの待ち秒数を返す
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class HostHealth:
+    # ホストごとの連続失敗回数・遮断期限・最近の応答時間
+    def __init__(self, host):
+        self.host = host
+        self.failures = 0
+        self.open_until = 0.0
+        self.open_seconds = BREAKER_SECONDS
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.requests = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        # 遮断中なら CircuitOpenError。期限が過ぎたら通す（失敗すればすぐにまた遮断される）
+        remaining = self.open_until - time.monotonic()
+        if remaining > 0:
+            _count("breaker_rejected")
+            raise CircuitOpenError(f"{self.host} は遮断中（あと {remaining:.0f} 秒）")
+
+    def success(self, seconds):
+        with self.lock:
+            self.failures = 0
+            self.open_seconds = BREAKER_SECONDS
+            self.latencies.append(seconds)
+            self.requests += 1
+
+    def failure(self, error):
+        if not _counts_against_host(error):
+            return
+        with self.lock:
+            self.failures += 1
+            self.requests += 1
+            if self.failures < BREAKER_THRESHOLD:
+                return
+            seconds = max(self.open_seconds, _retry_after(error) or 0)
+            self.open_until = time.monotonic() + seconds
+            self.open_seconds = min(self.open_seconds * 2, BREAKER_MAX_SECONDS)
+        print(f"[HTTP] {self.host} で {self.failures} 回続けて失敗したため {seconds:.0f} 秒遮断します: {error}")
+        metrics.inc("http_breaker_open_total", host=self.host)
+
+    def hedge_delay(self):
+        # ヘッジを送るまでの待ち秒数（送らないなら None）
+        with self.lock:
+            if (not HEDGE_ENABLED or len(self.latencies) < HEDGE_MIN_SAMPLES
+                    or self.hedges >= HEDGE_MAX_RATIO * self.requests):
+                return None
+            ordered = sorted(self.latencies)
+            return ordered[min(int(len(ordered) * HEDGE_QUANTILE), len(ordered) - 1)]
+
+    def hedged(self):
+        with self.lock:
+            self.hedges += 1
+        _count("hedged")
+        metrics.inc("http_hedged_total", host=self.host)
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def health_for(url):
+    host = urlparse(url).netloc
+    with _health_lock:
+        h = _health.get(host)
+        if h is None:
+            h = _health[host] = HostHealth(host)
+        return h
+
+
+def _status_of(error):
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    return getattr(error, "status", None)   # aiohttp.ClientResponseError
+
+
+def _retry_after(error):
+    # 429 / 503 の Retry-After（秒）
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _counts_against_host(error):
+    # ホストの不調とみなす失敗（404 などの 4xx や JSON の壊れは数えない）
+    status = _status_of(error)
+    if status is not None:
+        return status in RETRY_STATUS
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError)):
+        return True
+    return aiohttp is not None and isinstance(error, aiohttp.ClientError)
+
+
+def _retryable(error):
+    return not isinstance(error, CircuitOpenError) and _counts_against_host(error)
+
+
+def _retry_delay(attempt, error):
+    # full jitter: 0〜min(上限, base * 2^attempt) の一様乱数。Retry-After があればそれに従う
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        return min(retry_after, RETRY_MAX_SECONDS)
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def _note_retry(url, attempt, error):
+    _count("retries")
+    metrics.inc("http_retries_total", endpoint=endpoint_of(url))
+    print(f"[HTTP] 再試行 {attempt + 1}/{HTTP_RETRIES}: {endpoint_of(url)} ({error})")
+
+
+def endpoint_of(url):
+    # 計測用のエンドポイント名（/latest/dex/tokens/{mints} → /latest/dex/tokens）
+    path = urlparse(url).path.strip("/")
+    return "/" + "/".join(path.split("/")[:3])
+
+
+def _record(url, seconds, error=False):
+    endpoint = endpoint_of(url)
+    metrics.observe("http_request_seconds", seconds, endpoint=endpoint)
+    metrics.inc("http_requests_total", endpoint=endpoint)
+    if error:
+        metrics.inc("http_errors_total", endpoint=endpoint)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(url):
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        b = _buckets.get(host)
+        if b is None:
+            rate, burst = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+            b = _buckets[host] = TokenBucket(rate, burst)
+        return b
+
+
+# -----------------------------
+# 同期 API（共有セッション）
+# -----------------------------
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(HOST_LIMITS) + 2, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+_hedge_pool = None
+
+
+def hedge_pool():
+    global _hedge_pool
+    with _session_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="http-hedge")
+        return _hedge_pool
+
+
+def get(url, timeout=10, stream=False, retries=None):
+    # 失敗したら再試行し、それでも駄目なら最後の例外を送出する
+    # stream=True のときの計測値はヘッダ受信までの時間（本文の途中で切れた場合は再試行しない）
+    retries = HTTP_RETRIES if retries is None else retries
+    health = health_for(url)
+    for attempt in range(retries + 1):
+        health.check()
+        try:
+            if stream:
+                return _send(url, timeout, stream, health)
+            return _send_hedged(url, timeout, health)
+        except Exception as e:
+            if attempt >= retries or not _retryable(e):
+                raise
+            _note_retry(url, attempt, e)
+            time.sleep(_retry_delay(attempt, e))
+
+
+def _send(url, timeout, stream, health):
+    bucket_for(url).acquire()
+    _count("requests")
+    t0 = time.perf_counter()
+    resp = None
+    try:
+        resp = session().get(url, timeout=timeout, stream=stream)
+        resp.raise_for_status()
+    except Exception as e:
+        if resp is not None:
+            resp.close()   # stream=True のエラー応答で接続を握ったままにしない
+        _count("errors")
+        _record(url, time.perf_counter() - t0, error=True)
+        health.failure(e)
+        raise
+    seconds = time.perf_counter() - t0
+    _record(url, seconds)
+    health.success(seconds)
+    return resp
+
+
+def _send_hedged(url, timeout, health):
+    delay = health.hedge_delay()
+    if delay is None:
+        return _send(url, timeout, False, health)
+
+    first = hedge_pool().submit(_send, url, timeout, False, health)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    # p95 を過ぎても返らない: もう1本送り、先に成功した方を使う（遅い方は返ってきたら閉じる）
+    health.hedged()
+    pending = {first, hedge_pool().submit(_send, url, timeout, False, health)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                for other in pending:
+                    other.add_done_callback(_close_result)
+                return f.result()
+            error = f.exception()
+    raise error
+
+
+def _close_result(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+def get_json(url, timeout=10):
+    return serializer.loads(get(url, timeout=timeout).content)
+
+
+# -----------------------------
+# 非同期 API
+# -----------------------------
+async def _fetch_aiohttp(client, sem, url, timeout):
+    # 失敗しても送出せず、最後の例外オブジェクトを返す
+    async with sem:
+        health = health_for(url)
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                health.check()
+                return await _hedged_async(lambda: _send_aiohttp(client, url, timeout, health), health)
+            except Exception as e:
+                if attempt >= HTTP_RETRIES or not _retryable(e):
+                    return e
+                _note_retry(url, attempt, e)
+                await asyncio.sleep(_retry_delay(attempt, e))
+
+
+async def _send_aiohttp(client, url, timeout, health):
+    await bucket_for(url).acquire_async()
+    _count("requests")
+    t0 = time.perf_counter()
+    try:
+        async with client.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            resp.raise_for_status()
+            body = await resp.read()
+    except Exception as e:
+        _count("errors")
+        _record(url, time.perf_counter() - t0, error=True)
+        health.failure(e)
+        raise
+    seconds = time.perf_counter() - t0
+    _record(url, seconds)
+    health.success(seconds)
+    return serializer.loads(body)
+
+
+async def _hedged_async(send, health):
+    delay = health.hedge_delay()
+    first = asyncio.ensure_future(send())
+    if delay is None:
+        return await first
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    health.hedged()
+    pending = {first, asyncio.ensure_future(send())}
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+            error = task.exception()
+    raise error
+
+
+async def _fetch_threaded(sem, url, timeout):
+    # aiohttp が無いとき: 同期の get()（再試行・ヘッジ込み）をスレッドで回す
+    async with sem:
+        loop = asyncio.get_running_loop()
+        try:
+            resp = await loop.run_in_executor(None, get, url, timeout)
+            return serializer.loads(resp.content)
+        except Exception as e:
+            return e
+
+
+def _new_client():
+    connector = aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE_SECONDS)
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def _gather(coros, client):
+    # client を渡されなければ、この呼び出しの間だけのセッションを作る
+    if client is not None:
+        return await asyncio.gather(*coros(client))
+    async with _new_client() as client:
+        return await asyncio.gather(*coros(client))
+
+
+async def fetch_json_many_async(urls, timeout=10, concurrency=None, client=None):
+    # urls と同じ順で JSON を返す。失敗した URL の位置には例外オブジェクトが入る
+    # client: 使い回す aiohttp.ClientSession（同期ラッパは共有セッションを渡す）
+    concurrency = concurrency or MAX_CONCURRENCY
+    sem = asyncio.Semaphore(concurrency)
+
+    if aiohttp is None:
+        return await asyncio.gather(*(_fetch_threaded(sem, u, timeout) for u in urls))
+
+    return await _gather(lambda c: [_fetch_aiohttp(c, sem, u, timeout) for u in urls], client)
+
+
+async def fetch_json_each_async(urls, on_result, timeout=10, concurrency=None, client=None):
+    # 完了した順に on_result(index, data_or_exception) を呼ぶ
+    concurrency = concurrency or MAX_CONCURRENCY
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(i, coro):
+        on_result(i, await coro)
+
+    if aiohttp is None:
+        await asyncio.gather(*(run(i, _fetch_threaded(sem, u, timeout)) for i, u in enumerate(urls)))
+        return
+
+    await _gather(lambda c: [run(i, _fetch_aiohttp(c, sem, u, timeout)) for i, u in enumerate(urls)], client)
+
+
+# -----------------------------
+# 同期ラッパ（共有イベントループ + 共有セッション）
+# -----------------------------
+# aiohttp のセッションは作ったイベントループでしか使えないので、専用スレッドでループを回し続け、
+# セッションもそのループで1つだけ作る。
+_loop = None
+_loop_pid = None
+_client = None
+
+
+def _event_loop():
+    global _loop, _loop_pid, _client
+    with _session_lock:
+        if _loop is None or _loop_pid != os.getpid():   # fork した子ではループのスレッドが無いので作り直す
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _client = None
+            threading.Thread(target=_loop.run_forever, name="http-loop", daemon=True).start()
+        return _loop
+
+
+async def _shared_client():
+    # ループのスレッドの中でだけ呼ぶ
+    global _client
+    if aiohttp is None:
+        return None
+    if _client is None or _client.closed:
+        _client = _new_client()
+    return _client
+
+
+def _run_sync(make_coro):
+    # make_coro(client) のコルーチンを共有ループで実行して結果を待つ
+    loop = _event_loop()
+    if threading.current_thread().name == "http-loop":
+        # ループ自身の中から呼ばれた（on_result から同期 API を呼んだなど）: 待つと止まるので別ループで回す
+        result = {}
+        t = threading.Thread(target=lambda: result.setdefault("v", asyncio.run(make_coro(None))))
+        t.start()
+        t.join()
+        return result["v"]
+
+    async def run():
+        return await make_coro(await _shared_client())
+
+    return asyncio.run_coroutine_threadsafe(run(), loop).result()
+
+
+def close():
+    # 共有セッションとループを閉じる（atexit でも呼ばれる。閉じた後に使えばまた作り直す）
+    global _loop, _client
+    with _session_lock:
+        loop, client = _loop, _client
+        _loop = _client = None
+    if loop is None or _loop_pid != os.getpid():
+        return
+    if client is not None and not client.closed:
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+        except Exception as e:
+            print("[HTTP] セッションを閉じられませんでした:", e)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+atexit.register(close)
+
+
+def fetch_json_each(urls, on_result, timeout=10, concurrency=None):
+    urls = list(urls)
+    if urls:
+        _run_sync(lambda client: fetch_json_each_async(urls, on_result, timeout, concurrency, client))
+
+
+def get_json_many(urls, timeout=10, concurrency=None):
+    urls = list(urls)
+    if not urls:
+        return []
+    if len(urls) == 1:
+        try:
+            return [get_json(urls[0], timeout=timeout)]
+        except Exception as e:
+            return [e]
+
+    return _run_sync(lambda client: fetch_json_many_async(urls, timeout, concurrency, client))
+
+
+def summary():
+    with _stats_lock:
+        stats_now = dict(stats)
+    return (
+        f"[HTTP] requests={stats_now['requests']} errors={stats_now['errors']} retries={stats_now['retries']} "
+        f"hedged={stats_now['hedged']} 遮断中で送らず={stats_now['breaker_rejected']}"
+    )
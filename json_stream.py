@@ -0,0 +1,105 @@
+import json
+import codecs
+
+# -----------------------------
+# JSON 配列のストリーミングパーサ
+# -----------------------------
+# [ {...}, {...}, ... ] 形式のレスポンスを chunk ごとに読み、
+# 要素を1件ずつ返す。全体を list として保持しないのでメモリは要素1件分＋バッファ分で済む。
+
+_WS = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+def _skip(buf, i, chars):
+    n = len(buf)
+    while i < n and buf[i] in chars:
+        i += 1
+    return i
+
+
+def iter_json_array(chunks):
+    dec = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    started = False
+    finished = False
+    # 次に来てよいもの: "first"（"[" の直後: 要素か "]"）/ "value"（"," の直後: 要素）/ "sep"（要素の直後: "," か "]"）
+    expect = "first"
+
+    def feed(chunk, final=False):
+        return dec.decode(chunk, final) if isinstance(chunk, bytes) else chunk
+
+    chunks = iter(chunks)
+    eof = False
+
+    while not finished:
+        if not eof:
+            try:
+                buf += feed(next(chunks))
+            except StopIteration:
+                buf += feed(b"", final=True)
+                eof = True
+
+        i = _skip(buf, 0, _WS)
+
+        if not started:
+            if i >= len(buf):
+                buf = ""
+                if eof:
+                    raise ValueError("JSON 配列が空です（レスポンスが途中で切れた可能性があります）")
+                continue
+            if buf[i] != "[":
+                raise ValueError("JSON 配列ではありません")
+            started = True
+            i += 1
+
+        while True:
+            i = _skip(buf, i, _WS)
+            if i >= len(buf):
+                break
+            c = buf[i]
+            if c == "]" and expect != "value":
+                finished = True
+                i += 1
+                break
+            if expect == "sep":
+                if c != ",":
+                    raise ValueError(f"JSON 配列の要素の間に ',' がありません（位置 {i}）")
+                expect = "value"
+                i += 1
+                continue
+            if c in ",]":
+                raise ValueError(f"JSON 配列に要素の無い '{c}' があります（位置 {i}）")
+            try:
+                obj, end = _decoder.raw_decode(buf, i)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break
+            # 数値などがバッファ末尾で切れている可能性があるので続きを待つ
+            # （"12." や "12e" のように数値の途中で切れると、直後に区切り以外の文字が残る）
+            nxt = _skip(buf, end, _WS)
+            if not eof and (nxt >= len(buf)
+                            or (buf[nxt] not in ",]" and isinstance(obj, (int, float)))):
+                break
+            yield obj
+            expect = "sep"
+            i = end
+
+        buf = buf[i:]
+        # 閉じ括弧が来ないまま終わったら、要素の区切りで切れていても途中までの結果にはしない
+        # （切れた Raydium のレスポンスを使うと、残りのペアがすべて消滅扱いになる）
+        if eof and not finished:
+            raise ValueError("JSON 配列が途中で終わっています")
+
+    # "]" の後は空白しか許さない（残りの chunk も読んで確かめる）
+    while True:
+        if _skip(buf, 0, _WS) < len(buf):
+            raise ValueError("JSON 配列の後に余分なデータがあります")
+        if eof:
+            return
+        try:
+            buf = feed(next(chunks))
+        except StopIteration:
+            buf = feed(b"", final=True)
+            eof = True
@@ -0,0 +1,140 @@
+import os
+import math
+from array import array
+
+# -----------------------------
+# ペアごとの LP / 価格 / 出来高の履歴（固定長リングバッファ）
+# -----------------------------
+# 時刻を BUCKET_SECONDS ごとのバケットに区切り、1バケット1サンプルで持つ。
+# 長さは最長の窓（6h）ぶんで固定なので、ペア数が増えても履歴は際限なく伸びない。
+#   - 更新: 該当バケットに書くだけ（同じバケット内なら上書き）
+#   - 窓 W の成長率・速度: W 前のバケットを添字計算で引くだけ
+#   - ドローダウン: 窓内の最高 LP から（窓内のバケット数ぶん、最大 73 要素を見る）
+# 書かれなかったバケット（snapshot_diff で「変化なし」・取得できなかったサイクル）は NaN にしておき、
+# 窓の計算では飛ばす（実際には観測していない値を直前の値で作らない）。窓の始点が空きなら、
+# 窓内で最も古い観測値を始点にし、速度はその経過時間で割る。
+# state.db には float32 の配列をそのまま BLOB で保存する（1ペアあたり 1KB 弱）。
+
+BUCKET_SECONDS = int(os.getenv("HISTORY_BUCKET_SECONDS", "300"))
+WINDOWS = {
+    "10m": 10 * 60,
+    "30m": 30 * 60,
+    "1h": 60 * 60,
+    "6h": 6 * 60 * 60,
+}
+SLOTS = max(WINDOWS.values()) // BUCKET_SECONDS + 1
+SERIES = ("lp", "price", "volume")
+TYPECODE = "f"
+
+_NAN = float("nan")
+
+
+def _num(v):
+    try:
+        return float(v) if v is not None else _NAN
+    except (TypeError, ValueError):
+        return _NAN
+
+
+class Ring:
+    __slots__ = ("first", "head", "data")
+
+    def __init__(self, first=None, head=None, data=None):
+        self.first = first      # 最初に書いたバケット番号
+        self.head = head        # 最後に書いたバケット番号
+        if data is None:
+            data = array(TYPECODE, [_NAN]) * (len(SERIES) * SLOTS)
+        self.data = data
+
+    # --- 永続化 ---
+    @classmethod
+    def from_row(cls, first, head, blob):
+        data = array(TYPECODE)
+        data.frombytes(blob)
+        if len(data) != len(SERIES) * SLOTS:
+            # バケット幅や窓を変えた後の古い行は捨てて作り直す
+            return cls()
+        return cls(first, head, data)
+
+    def to_row(self):
+        return self.first, self.head, self.data.tobytes()
+
+    # --- 更新 ---
+    def _put(self, bucket, values):
+        i = bucket % SLOTS
+        for s, v in enumerate(values):
+            self.data[s * SLOTS + i] = v
+
+    def _get(self, series, bucket):
+        return self.data[series * SLOTS + bucket % SLOTS]
+
+    def update(self, ts, lp, price=None, volume=None):
+        bucket = int(ts // BUCKET_SECONDS)
+        values = (_num(lp), _num(price), _num(volume))
+        if self.head is None:
+            self.first = self.head = bucket
+            self._put(bucket, values)
+            return
+        if bucket < self.head:
+            return  # 時計が戻った場合は無視
+
+        # 前回から空いたバケットは NaN にする（リング1周ぶんを超える部分は不要）
+        gap = (_NAN,) * len(SERIES)
+        for b in range(max(self.head + 1, bucket - SLOTS + 1), bucket):
+            self._put(b, gap)
+        self._put(bucket, values)
+        self.head = bucket
+
+    # --- 参照 ---
+    def at(self, series, ago):
+        # ago バケット前の値（履歴が足りなければ None）
+        if self.head is None or ago >= SLOTS or self.head - ago < self.first:
+            return None
+        v = self._get(series, self.head - ago)
+        return None if math.isnan(v) else v
+
+    def window(self, seconds):
+        # 窓の始点と現在の比較。始点まで履歴が無い・窓内に現在以外の観測値が無ければ None
+        k = seconds // BUCKET_SECONDS
+        now = self.at(0, 0)
+        if now is None or self.head - k < self.first:
+            return None
+        # 始点が空きのバケットなら、窓内で最も古い観測値まで進める
+        for start in range(k, 0, -1):
+            then = self.at(0, start)
+            if then is not None:
+                break
+        else:
+            return None
+
+        peak = now
+        for ago in range(1, start + 1):
+            v = self.at(0, ago)
+            if v is not None and v > peak:
+                peak = v
+
+        price_now = self.at(1, 0)
+        price_then = self.at(1, start)
+        price_change = None
+        if price_now is not None and price_then:
+            price_change = round((price_now - price_then) / price_then * 100, 2)
+
+        return {
+            "growth": round((now - then) / max(then, 1) * 100, 2),
+            "velocity_usd_h": round((now - then) / (start * BUCKET_SECONDS / 3600), 1),
+            "drawdown": round((peak - now) / peak * 100, 2) if peak > 0 else 0.0,
+            "price_change": price_change,
+        }
+
+    def signals(self):
+        out = {}
+        for name, seconds in WINDOWS.items():
+            w = self.window(seconds)
+            if w is not None:
+                out[name] = w
+        return out
+
+
+def describe(signals):
+    # メール本文向けの短い要約（"30m +25.0% / 1h +40.2%"）
+    return " / ".join(f"{name} {w['growth']:+.1f}%" for name, w in signals.items())
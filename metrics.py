@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# -----------------------------
+# 計測（ステージ時間・レイテンシ・カウンタ）
+# -----------------------------
+# プロセス内に1つのレジストリを持ち、Prometheus テキスト形式か JSON で書き出す。
+#   with metrics.timer("raydium_download"): ...      ステージの所要時間（ヒストグラム）
+#   metrics.observe("http_request_seconds", dt, endpoint="/latest/dex/tokens")
+#   metrics.inc("http_errors_total", endpoint="/pairs")
+#   metrics.set_gauge("pairs_filtered", 195)
+# METRICS_FILE の拡張子が .json なら JSON、それ以外は Prometheus テキスト。
+# 常駐モードでは METRICS_PORT で /metrics（テキスト）と /metrics.json を返す。
+
+METRICS_FILE = os.getenv("METRICS_FILE", "logs/metrics.prom")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+PREFIX = "meme_"
+
+# 秒単位のヒストグラムの境界
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> value
+_gauges = {}        # (name, labels) -> value
+_histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+_last_stage = {}    # stage -> 直近の秒数（サイクルごとの要約表示用）
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, n=1, **labels):
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + n
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    k = _key(name, labels)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = [0] * (len(BUCKETS) + 2)
+        for i, le in enumerate(BUCKETS):
+            if value <= le:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+@contextmanager
+def timer(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        observe("stage_seconds", dt, stage=stage)
+        with _lock:
+            _last_stage[stage] = _last_stage.get(stage, 0.0) + dt
+
+
+def add_stage_time(stage, seconds):
+    # timer() で囲めない区間（ストリーミング中のネットワーク待ちなど）を足し込む
+    observe("stage_seconds", seconds, stage=stage)
+    with _lock:
+        _last_stage[stage] = _last_stage.get(stage, 0.0) + seconds
+
+
+def lap(stage, t0):
+    # 区切りごとの計測用。t0 からの経過をステージに足し込み、現在時刻を返す
+    #   t = time.perf_counter(); ...; t = metrics.lap("classify", t); ...
+    now = time.perf_counter()
+    add_stage_time(stage, now - t0)
+    return now
+
+
+def reset_stages():
+    with _lock:
+        _last_stage.clear()
+
+
+def stage_summary():
+    with _lock:
+        items = list(_last_stage.items())
+    if not items:
+        return "[METRICS] -"
+    total = sum(v for _, v in items)
+    parts = ", ".join(f"{k}={v:.2f}s" for k, v in sorted(items, key=lambda kv: -kv[1]))
+    return f"[METRICS] ステージ合計 {total:.2f}s: {parts}"
+
+
+# -----------------------------
+# 書き出し
+# -----------------------------
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus():
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+
+    lines = []
+    typed = set()
+
+    def type_line(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), v in counters:
+        type_line(name, "counter")
+        lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {v}")
+    for (name, labels), v in gauges:
+        type_line(name, "gauge")
+        lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {v}")
+    for (name, labels), h in histograms:
+        type_line(name, "histogram")
+        for i, le in enumerate(BUCKETS):
+            lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(labels, {'le': le})} {h[i]}")
+        lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(labels, {'le': '+Inf'})} {h[-1]}")
+        lines.append(f"{PREFIX}{name}_sum{_fmt_labels(labels)} {round(h[-2], 6)}")
+        lines.append(f"{PREFIX}{name}_count{_fmt_labels(labels)} {h[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json():
+    def group(items, value):
+        out = {}
+        for (name, labels), v in items:
+            out.setdefault(name, []).append(dict(labels=dict(labels), **value(v)))
+        return out
+
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+        last = dict(_last_stage)
+
+    return {
+        "time": time.time(),
+        "counters": group(counters, lambda v: {"value": v}),
+        "gauges": group(gauges, lambda v: {"value": v}),
+        "histograms": group(histograms, lambda h: {
+            "count": h[-1],
+            "sum": round(h[-2], 6),
+            "buckets": {str(le): h[i] for i, le in enumerate(BUCKETS)},
+        }),
+        "last_stage_seconds": last,
+    }
+
+
+def write(path=METRICS_FILE):
+    if not path:
+        return
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    body = json.dumps(to_json(), ensure_ascii=False, indent=2) if path.endswith(".json") else render_prometheus()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# /metrics エンドポイント（常駐モード用）
+# -----------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, ctype = render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, ctype = json.dumps(to_json(), ensure_ascii=False).encode(), "application/json"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=METRICS_PORT, host="127.0.0.1"):
+    # port=0 なら起動しない
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"[METRICS] /metrics を開けません (port={port}):", e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[METRICS] http://{host}:{port}/metrics")
+    return server
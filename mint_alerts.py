@@ -0,0 +1,113 @@
+import os
+
+# -----------------------------
+# mint 単位の通知の集約とクールダウン
+# -----------------------------
+# 同じトークンの複数プールが同時に伸びると、ペアごとに二次判定・価格取得・メールが重なる。
+# 1サイクルの候補を mint ごとにまとめ、二次判定と価格取得は mint ごとに1回、
+# メールは mint ごとに1通にする（優先度が最も高いペアを代表にし、他のプールは本文に併記）。
+#
+# 通知した mint は判定と時刻を state.db（mint_alert）に残す。MINT_ALERT_COOLDOWN_MINUTES の間は、
+# 判定が前回より上がらない限り（WATCH → IMMEDIATE だけ通す）Dexscreener にも問い合わせない。
+# 抑えた候補は通知済みにしない（指紋は保留のまま）ので、クールダウン明けにまだ伸びていれば通知される。
+#
+# 通知済み（ペアの last_notified_lp と mint のクールダウン）にするのはメールが届いてから（Deliveries）。
+# 送信結果を待っている mint は重ねて送らないよう抑え、キューが満杯で捨てた・SMTP が失敗した通知は
+# 指紋が保留のままなので、次のサイクルでまた判定されて送り直される。
+
+# 0 ならクールダウンなし（集約だけ行う）
+MINT_ALERT_COOLDOWN_MINUTES = float(os.getenv("MINT_ALERT_COOLDOWN_MINUTES", "60"))
+
+LEVELS = {None: 0, "WATCH": 1, "IMMEDIATE": 2}
+
+
+def level_of(rows):
+    # mint の候補のうち最も高い判定
+    return max((r["decision"] for r in rows), key=LEVELS.get, default=None)
+
+
+def suppressed(last, decision, now, cooldown_minutes=MINT_ALERT_COOLDOWN_MINUTES):
+    # last: その mint の前回の通知 (判定, 時刻) or None
+    if last is None or cooldown_minutes <= 0:
+        return False
+    level, alerted_at = last
+    if now - alerted_at >= cooldown_minutes * 60:
+        return False
+    return LEVELS.get(decision, 0) <= LEVELS.get(level, 0)
+
+
+def apply_cooldown(rows, last_alerts, now, cooldown_minutes=MINT_ALERT_COOLDOWN_MINUTES, in_flight=()):
+    # 判定のある候補を mint ごとに見て、クールダウン中・送信結果待ちの mint の候補に "suppressed" を付ける
+    # 戻り値: 抑えた候補の数
+    n = 0
+    for mint, group in group_by_mint(r for r in rows if r["decision"]).items():
+        if mint in in_flight or suppressed(last_alerts.get(mint), level_of(group), now, cooldown_minutes):
+            for r in group:
+                r["suppressed"] = True
+            n += len(group)
+    return n
+
+
+class Deliveries:
+    # 送信結果を待っている通知。ticket -> (mint, 判定, 時刻, [(pair_id, 通知時の LP), ...])
+    def __init__(self):
+        self.waiting = {}
+        self._next = 0
+
+    def add(self, mint, decision, alerted_at, pairs):
+        self._next += 1
+        self.waiting[self._next] = (mint, decision, alerted_at, pairs)
+        return self._next
+
+    def in_flight(self):
+        return {item[0] for item in self.waiting.values()}
+
+    def settle(self, results, store):
+        # results: mailer の [(ticket, 届いたか)]。届いた通知のペアと mint を通知済みにする
+        # 戻り値: (届いた通知の数, 届かなかった通知の数)
+        alerts = {}
+        lps = {}
+        failed = 0
+        for ticket, delivered in results:
+            item = self.waiting.pop(ticket, None)
+            if item is None:
+                continue
+            if not delivered:
+                failed += 1
+                continue
+            mint, decision, alerted_at, pairs = item
+            alerts[mint] = (decision, alerted_at)
+            lps.update(pairs)
+        if lps:
+            entries = store.get_many(lps)
+            for pid, entry in entries.items():
+                entry.last_notified_lp = lps[pid]
+            store.put_many(entries)
+        if alerts:
+            store.put_mint_alerts(alerts)
+        return len(alerts), failed
+
+
+def group_by_mint(rows):
+    # {mint: [row, ...]}。rows の順（優先度順）を保つので、各リストの先頭が代表
+    groups = {}
+    for r in rows:
+        groups.setdefault(r["mint"], []).append(r)
+    return groups
+
+
+def describe(group, limit=3):
+    # 代表以外のプールをメール本文用に1行で
+    others = group[1:]
+    if not others:
+        return ""
+    names = ", ".join(r["name"] for r in others[:limit]) + (" ..." if len(others) > limit else "")
+    total = sum(r["lp_usd"] for r in group)
+    return f"他 {len(others)} プール: {names} / 合計LP ${total:,.0f}"
+
+
+def summary(mails, coalesced, suppressed_count, cooldown_minutes=MINT_ALERT_COOLDOWN_MINUTES):
+    return (
+        f"[ALERT] mint 通知={mails} 集約したペア={coalesced} クールダウンで抑制={suppressed_count}"
+        f" (クールダウン {cooldown_minutes:g} 分)"
+    )
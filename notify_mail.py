@@ -8,10 +8,17 @@ FROM_EMAIL = os.getenv("FROM_EMAIL")
 TO_EMAIL   = os.getenv("TO_EMAIL")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
 
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+SMTP_TIMEOUT = 30
 
-def send_mail(
+# Dexscreener の chainId -> DEXTools のチェーン名（同じものは省略）
+DEXTOOLS_CHAINS = {"ethereum": "ether", "bsc": "bnb"}
+
+
+def build_message(
     symbol, score, growth, fdv, lp, urgency, reason,
-    chain=None, token=None, mint=None, pair_id=None,
+    chain=None, token=None, mint=None, pair_id=None, dex_chain="solana",
 
     # --- Dexscreener 詳細データ（Bot側で取得） ---
     price=None,
@@ -34,13 +41,15 @@ def send_mail(
     msg["To"] = TO_EMAIL
     msg["Subject"] = f"【ミーム検知】{symbol} | 緊急度:{urgency}"
 
-    # --- 各種リンク ---
-    link_dexscreener = f"https://dexscreener.com/solana/{mint}" if mint else "不明"
+    # --- 各種リンク（dex_chain は Dexscreener の chainId） ---
+    chain = chain or "Solana"
+    dextools_chain = DEXTOOLS_CHAINS.get(dex_chain, dex_chain)
+    link_dexscreener = f"https://dexscreener.com/{dex_chain}/{mint}" if mint else "不明"
     link_x1 = f"https://twitter.com/search?q=%24{symbol}"
-    link_x2 = f"https://twitter.com/search?q={symbol}%20solana"
+    link_x2 = f"https://twitter.com/search?q={symbol}%20{dex_chain}"
     link_x3 = f"https://twitter.com/search?q={symbol}%20token"
-    link_dextools = f"https://www.dextools.io/app/en/solana/pair-explorer/{pair_id}" if pair_id else "不明"
-    link_birdeye = f"https://birdeye.so/token/{mint}" if mint else "不明"
+    link_dextools = f"https://www.dextools.io/app/en/{dextools_chain}/pair-explorer/{pair_id}" if pair_id else "不明"
+    link_birdeye = f"https://birdeye.so/token/{mint}?chain={dex_chain}" if mint else "不明"
 
     # None を見やすく
     def fmt(v, default="-"):
@@ -48,15 +57,15 @@ def send_mail(
 
     # --- コパイロット向け解析依頼プロンプト（本文） ---
     body = f"""
-以下の Solana トークンについて、投資価値をプロレベルで総合評価してください。
+以下の {chain} トークンについて、投資価値をプロレベルで総合評価してください。
 
 【対象トークン】
 - Symbol: {symbol}
-- Chain: {chain or "Solana"}
+- Chain: {chain}
 - Token Mint: {token or mint or "不明"}
 - Dexscreener URL: {link_dexscreener}
 
-「{mint}」で Solana チェーンについて、「{link_dexscreener}」のページ内容を取得して解析し、
+「{mint}」で {chain} チェーンについて、「{link_dexscreener}」のページ内容を取得して解析し、
 コインを買う価値があるかに関わる、少なくとも以下の項目の値を取得してください。
 必要なら追加しても構いません。
 
@@ -85,7 +94,7 @@ def send_mail(
 
 [LPプール構成]
 - Pooled Token:
-- Pooled SOL:
+- Pooled Quote (SOL / ETH など):
 
 [ペア情報]
 - DEX:
@@ -99,7 +108,7 @@ def send_mail(
 
 - LP Growth (%): {growth:.1f}
 - Current LP (USD): {lp:,.0f}
-- FDV (Raydium): {fdv:,}
+- FDV (検知元): {fdv:,}
 - Price (Dexscreener): {fmt(price)}
 - Price Change 1m: {fmt(priceChange1m)}
 - Price Change 5m: {fmt(priceChange5m)}
@@ -182,7 +191,36 @@ def send_mail(
 """
 
     msg.attach(MIMEText(body, "plain", "utf-8"))
+    return msg
+
+
+def build_digest(messages):
+    # 同じサイクルの複数通知を1通にまとめる
+    if len(messages) == 1:
+        return messages[0]
+
+    msg = MIMEMultipart()
+    msg["From"] = FROM_EMAIL
+    msg["To"] = TO_EMAIL
+    urgent = any("緊急度:高" in m["Subject"] for m in messages)
+    msg["Subject"] = f"【ミーム検知】{len(messages)}件まとめ | 緊急度:{'高' if urgent else '中'}"
+
+    parts = []
+    for i, m in enumerate(messages, 1):
+        body = m.get_payload()[0].get_payload(decode=True).decode("utf-8")
+        parts.append(f"########## {i}/{len(messages)} {m['Subject']} ##########\n{body}")
+    msg.attach(MIMEText("\n\n".join(parts), "plain", "utf-8"))
+    return msg
+
+
+def connect():
+    server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    server.login(FROM_EMAIL, EMAIL_PASS)
+    return server
+
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(FROM_EMAIL, EMAIL_PASS)
+def send_mail(*args, **kwargs):
+    # 1通だけ同期で送る（接続 → ログイン → 送信 → 切断）
+    msg = build_message(*args, **kwargs)
+    with connect() as server:
         server.send_message(msg)
\ No newline at end of file
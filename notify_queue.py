@@ -0,0 +1,169 @@
+import os
+import time
+import queue
+import smtplib
+import threading
+
+import notify_mail
+import metrics
+
+# -----------------------------
+# 非同期メール送信キュー
+# -----------------------------
+# 検知ループは submit() で積むだけで SMTP を待たない。
+# 送信スレッドは認証済みの SMTP 接続を1本持ち続け、複数通を同じ接続で送る。
+# 失敗したら接続を張り直して再送する。digest=True なら1サイクル分を1通にまとめる。
+# submit(ticket=...) で積んだ通知は、送れたか（満杯で捨てた・再送しても失敗したか）を
+# take_results() / wait_results() で返す。step2 は届いた通知だけを通知済みにする。
+
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "100"))
+MAIL_DIGEST = os.getenv("MAIL_DIGEST", "0") == "1"
+# "1" ならメッセージを組み立てるだけで送らない（ベンチマーク・動作確認用）
+MAIL_DRY_RUN = os.getenv("MAIL_DRY_RUN", "0") == "1"
+MAIL_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2
+# この秒数メールが無ければ接続を閉じる（Gmail 側に切られる前に自分で閉じる）
+IDLE_CLOSE_SECONDS = 60
+# wait_results() で送信結果を待つ上限（秒）
+MAIL_RESULT_TIMEOUT = 120
+
+_STOP = object()
+
+
+class MailQueue:
+    def __init__(self, digest=MAIL_DIGEST, maxsize=MAIL_QUEUE_SIZE):
+        self.digest = digest
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.pending = []       # digest 用：今サイクルの通知
+        self.server = None
+        self.stats = {"queued": 0, "sent": 0, "dropped": 0, "failed": 0, "connects": 0}
+        self.results = []       # [(ticket, 届いたか)]
+        self.unresolved = 0     # キューに積んだが結果がまだの通知
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._worker, name="mail-sender", daemon=True)
+        self.thread.start()
+
+    # --- 検知ループ側 ---
+    def submit(self, ticket=None, **kwargs):
+        # send_mail() と同じ引数。送信は送信スレッドで行う
+        # ticket を渡すと、その通知の結果を take_results() で返す
+        if self.digest:
+            self.pending.append((ticket, kwargs))
+            return True
+        return self._enqueue([(ticket, kwargs)])
+
+    def end_cycle(self):
+        # digest モードで溜めた通知をまとめて1通としてキューに積む
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self._enqueue(batch)
+
+    def _enqueue(self, batch):
+        with self.cond:
+            self.unresolved += len(batch)
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            self.stats["dropped"] += len(batch)
+            metrics.inc("mails_dropped_total", len(batch))
+            print(f"[MAIL] キューが満杯のため {len(batch)} 件を破棄")
+            self._resolve(batch, False)
+            return False
+        self.stats["queued"] += len(batch)
+        return True
+
+    def _resolve(self, batch, delivered):
+        with self.cond:
+            self.results.extend((ticket, delivered) for ticket, _ in batch if ticket is not None)
+            self.unresolved -= len(batch)
+            self.cond.notify_all()
+
+    def take_results(self):
+        # 前回から結果が出た通知 [(ticket, 届いたか)]
+        with self.cond:
+            results, self.results = self.results, []
+        return results
+
+    def wait_results(self, timeout=MAIL_RESULT_TIMEOUT):
+        # 積んだ通知の結果がすべて出るまで待つ（時間切れなら出た分だけ返す）
+        self.end_cycle()
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.unresolved <= 0, timeout):
+                print(f"[MAIL] {self.unresolved} 件の送信結果を待ちきれませんでした")
+        return self.take_results()
+
+    def close(self, timeout=120):
+        # 残りを送り切ってから止める
+        self.end_cycle()
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print("[MAIL] 送信スレッドが時間内に終わりませんでした")
+
+    def summary(self):
+        s = self.stats
+        return (
+            f"[MAIL] queued={s['queued']} sent={s['sent']} failed={s['failed']} "
+            f"dropped={s['dropped']} connects={s['connects']}"
+        )
+
+    # --- 送信スレッド側 ---
+    def _worker(self):
+        while True:
+            try:
+                batch = self.queue.get(timeout=IDLE_CLOSE_SECONDS)
+            except queue.Empty:
+                self._disconnect()
+                continue
+
+            if batch is _STOP:
+                self._disconnect()
+                return
+
+            try:
+                messages = [notify_mail.build_message(**kw) for _, kw in batch]
+                if self.digest:
+                    messages = [notify_mail.build_digest(messages)]
+                for msg in messages:
+                    self._send(msg)
+            except Exception as e:
+                self.stats["failed"] += len(batch)
+                print("[MAIL] 送信エラー:", e)
+                self._resolve(batch, False)
+            else:
+                self._resolve(batch, True)
+
+    def _send(self, msg):
+        if MAIL_DRY_RUN:
+            self.stats["sent"] += 1
+            metrics.inc("mails_sent_total")
+            return
+        last_error = None
+        for attempt in range(MAIL_RETRIES):
+            if attempt:
+                metrics.inc("smtp_retries_total")
+            t0 = time.perf_counter()
+            try:
+                if self.server is None:
+                    self.server = notify_mail.connect()
+                    self.stats["connects"] += 1
+                    metrics.observe("smtp_connect_seconds", time.perf_counter() - t0)
+                self.server.send_message(msg)
+                self.stats["sent"] += 1
+                metrics.observe("smtp_send_seconds", time.perf_counter() - t0)
+                metrics.inc("mails_sent_total")
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                last_error = e
+                metrics.inc("smtp_errors_total")
+                self._disconnect()
+                time.sleep(RETRY_BACKOFF_SECONDS * (attempt + 1))
+        raise last_error
+
+    def _disconnect(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
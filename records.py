@@ -0,0 +1,97 @@
+import sys
+
+# -----------------------------
+# step2 のホットループで持ち回るレコード
+# -----------------------------
+# Raydium のペア・ペアの state・Dexscreener の詳細を、dict の代わりに __slots__ のクラスで持つ。
+# dict はペアごとにキーのハッシュ表を持つが、__slots__ は固定長の参照の並びだけなので
+# 1件あたりのメモリが数分の一になり、毎サイクルの dict 生成も減る。
+#
+# ルールエンジン（rules.compile_path）や snapshot_diff は obj.get(key, default) で読むので、
+# 同じ呼び方ができるよう get() を持たせてある。保存形式（JSONL / SQLite の行）への変換は
+# to_dict() / to_row() で、中身をコピーせずに値をそのまま渡す。
+
+
+class _Record:
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        # dict.get と同じく、無い項目（未設定の slot）なら default を返す
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__ if hasattr(self, k)}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Pair(_Record):
+    # 検知対象の1ペア（フィルタ通過後に step2 が使う項目だけ）
+    # token は二次判定で Dexscreener に問い合わせるトークン（Raydium では pair_id から求める）
+    __slots__ = ("pair_id", "name", "liquidity", "volume_24h_quote", "fdv", "price", "token")
+
+    @classmethod
+    def from_raydium(cls, p):
+        # 元の dict に無い項目は slot を未設定のままにする（get() で default が返る）
+        rec = cls()
+        for k in cls.__slots__:
+            if k in p:
+                setattr(rec, k, p[k])
+        pair_id = p.get("pair_id")
+        if isinstance(pair_id, str):
+            # 指紋・state・履歴の dict のキーと同じ文字列オブジェクトを使う
+            rec.pair_id = sys.intern(pair_id)
+        return rec
+
+    @classmethod
+    def from_dexscreener(cls, p, quote_symbols=()):
+        # Dexscreener のペア（/search, /pairs）から。pair_id はチェーン内で一意な pairAddress
+        # base 側が quote_symbols（WETH など）なら、もう片方を監視対象のトークンにする
+        base = p.get("baseToken") or {}
+        quote = p.get("quoteToken") or {}
+        if (base.get("symbol") or "").upper() in quote_symbols:
+            base, quote = quote, base
+        rec = cls()
+        rec.pair_id = sys.intern(p.get("pairAddress") or "")
+        rec.name = f"{base.get('symbol')}/{quote.get('symbol')}"
+        rec.liquidity = (p.get("liquidity") or {}).get("usd") or 0
+        rec.volume_24h_quote = (p.get("volume") or {}).get("h24")
+        rec.fdv = p.get("fdv")
+        try:
+            rec.price = float(p.get("priceUsd"))
+        except (TypeError, ValueError):
+            rec.price = None
+        rec.token = base.get("address")
+        return rec
+
+
+class PairState(_Record):
+    # state.db の pair_state の1行
+    __slots__ = ("lp", "max_lp", "last_notified_lp", "initial_price")
+
+    def __init__(self, lp=None, max_lp=None, last_notified_lp=None, initial_price=None):
+        self.lp = lp
+        self.max_lp = max_lp
+        self.last_notified_lp = last_notified_lp
+        self.initial_price = initial_price
+
+    def to_row(self):
+        return self.lp, self.max_lp, self.last_notified_lp, self.initial_price
+
+    def to_dict(self):
+        # 旧 state.json と同じく None の項目は書かない
+        return {k: v for k, v in zip(self.__slots__, self.to_row()) if v is not None}
+
+
+class DexDetails(_Record):
+    # Dexscreener のペアから二次判定・メール・ログに使う項目
+    __slots__ = (
+        "price", "priceChange1m", "priceChange5m", "priceChange1h",
+        "txns5m", "buys5m", "sells5m",
+        "volume5m", "liquidity_usd", "fdv", "marketcap", "contract_age_ms", "lp_mint", "pair_address",
+    )
+
+    def __init__(self, **fields):
+        for k in self.__slots__:
+            setattr(self, k, fields.get(k))
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+from collections import Counter
+
+try:
+    import yaml
+except ImportError:   # YAML のルールファイルを使うときだけ必要
+    yaml = None
+
+# -----------------------------
+# 宣言的フィルタルール
+# -----------------------------
+# rules.json（または .yml）のルールを起動時に1回だけコンパイルし、
+# 「obj を受け取って True / False を返す関数」の並びにする。
+#   - フィールドパス "liquidity.usd" は取り出し関数に事前変換
+#   - 軽いルールから順に評価し、最初に落ちたルールで打ち切る
+#   - ルールごとの却下件数を数える
+#
+# ルールの書式:
+#   {"name": "LP", "field": "liquidity", "op": "between", "min": "$MIN_LP_USD", "max": "$MAX_LP_USD"}
+#   "$NAME" は params の値に置き換わる。
+#   default   : キーが無いときの値（dict.get の第2引数）
+#   or        : 値が偽（None / 0 / ""）のときの値（`x or 0` 相当）
+#   allow_none: 値が None なら通す（省略時は None で却下）
+#   cast      : "int" / "float" / "upper" で比較前に変換
+#   cost      : 評価順の重み（省略時は op ごとの既定値）
+
+RULES_FILE = os.getenv(
+    "RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+)
+
+_MISSING = object()
+
+_CASTS = {
+    None: None,
+    "int": int,
+    "float": float,
+    "upper": lambda v: v.upper(),
+}
+
+
+def compile_path(path):
+    # "a.b.c" を取り出し関数にする（途中が dict でなければ None）
+    keys = path.split(".")
+    if len(keys) == 1:
+        k0 = keys[0]
+        return lambda o, d=None: o.get(k0, d)
+    if len(keys) == 2:
+        k0, k1 = keys
+        def get2(o, d=None):
+            v = o.get(k0)
+            return v.get(k1, d) if isinstance(v, dict) else d
+        return get2
+
+    def get_n(o, d=None):
+        for k in keys[:-1]:
+            o = o.get(k)
+            if not isinstance(o, dict):
+                return d
+        return o.get(keys[-1], d)
+    return get_n
+
+
+def _between(lo, hi):
+    return lambda v, ctx: lo <= v <= hi
+
+
+def _max_age_ms(limit):
+    def check(v, ctx):
+        now_ms = ctx.get("now_ms") if ctx else None
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        return now_ms - int(v) <= limit
+    return check
+
+
+# op 名 -> (比較関数を作る関数, 既定コスト)
+OPS = {
+    "between":     (lambda r: _between(r["min"], r["max"]), 1),
+    "gte":         (lambda r: (lambda v, ctx, x=r["value"]: v >= x), 1),
+    "gt":          (lambda r: (lambda v, ctx, x=r["value"]: v > x), 1),
+    "lte":         (lambda r: (lambda v, ctx, x=r["value"]: v <= x), 1),
+    "lt":          (lambda r: (lambda v, ctx, x=r["value"]: v < x), 1),
+    "eq":          (lambda r: (lambda v, ctx, x=r["value"]: v == x), 1),
+    "ne":          (lambda r: (lambda v, ctx, x=r["value"]: v != x), 1),
+    "in":          (lambda r: (lambda v, ctx, x=frozenset(r["value"]): v in x), 2),
+    "not_in":      (lambda r: (lambda v, ctx, x=frozenset(r["value"]): v not in x), 2),
+    "contains":    (lambda r: (lambda v, ctx, x=r["value"]: x in v), 3),
+    "max_age_ms":  (lambda r: _max_age_ms(r["value"]), 4),
+}
+
+
+def _resolve(value, params):
+    if isinstance(value, str) and value.startswith("$"):
+        return params[value[1:]]
+    if isinstance(value, list):
+        return [_resolve(v, params) for v in value]
+    return value
+
+
+def compile_rule(rule, params):
+    rule = {k: _resolve(v, params) for k, v in rule.items()}
+    name = rule["name"]
+    op = rule["op"]
+
+    # 2フィールドの比（fdv / liquidity.usd など）
+    if op == "ratio_between":
+        get_num = compile_path(rule["field"])
+        get_den = compile_path(rule["divisor"])
+        lo, hi = rule["min"], rule["max"]
+
+        def check_ratio(obj, ctx):
+            num = get_num(obj)
+            den = get_den(obj)
+            if not num or not den:
+                return False
+            return lo <= num / den <= hi
+        return name, check_ratio, rule.get("cost", 2)
+
+    make, default_cost = OPS[op]
+    compare = make(rule)
+    get = compile_path(rule["field"])
+    default = rule.get("default", None)
+    or_value = rule.get("or", _MISSING)
+    allow_none = rule.get("allow_none", False)
+    cast = _CASTS[rule.get("cast")]
+
+    def check(obj, ctx):
+        v = get(obj, default)
+        if or_value is not _MISSING and not v:
+            v = or_value
+        if v is None:
+            return allow_none
+        if cast is not None:
+            v = cast(v)
+        return compare(v, ctx)
+
+    return name, check, rule.get("cost", default_cost)
+
+
+class RuleSet:
+    def __init__(self, name, rules, params):
+        self.name = name
+        compiled = [compile_rule(r, params) for r in rules]
+        # 軽い順（同じコストならファイルの記述順）
+        order = sorted(range(len(compiled)), key=lambda i: (compiled[i][2], i))
+        self.rules = [(compiled[i][0], compiled[i][1]) for i in order]
+        # params を埋めたルール定義（評価順。vector_filter が列演算に組み直す用）
+        self.specs = [{k: _resolve(v, params) for k, v in rules[i].items()} for i in order]
+        self.rejections = Counter()
+        self.evaluated = 0
+        self.passed = 0
+
+    def first_failure(self, obj, ctx=None):
+        # 通過なら None、落ちたら最初に落ちたルール名（例外なら "<name>_ERR"）
+        self.evaluated += 1
+        for name, check in self.rules:
+            try:
+                ok = check(obj, ctx)
+            except Exception:
+                self.rejections[f"{name}_ERR"] += 1
+                return f"{name}_ERR"
+            if not ok:
+                self.rejections[name] += 1
+                return name
+        self.passed += 1
+        return None
+
+    def check(self, obj, ctx=None):
+        return self.first_failure(obj, ctx) is None
+
+    def add_counts(self, evaluated, passed, rejections):
+        # first_failure() を通さずにまとめて判定したときの集計（rejections: {ルール名: 件数}）
+        self.evaluated += evaluated
+        self.passed += passed
+        self.rejections.update({k: v for k, v in rejections.items() if v})
+
+    def reset_counters(self):
+        self.rejections.clear()
+        self.evaluated = 0
+        self.passed = 0
+
+    def summary(self):
+        detail = ", ".join(f"{k}={v}" for k, v in self.rejections.most_common())
+        return f"[RULES] {self.name}: 評価={self.evaluated} 通過={self.passed} 却下[{detail or '-'}]"
+
+
+class Rules:
+    def __init__(self, config, overrides=None):
+        self.params = dict(config.get("params", {}))
+        if overrides:
+            self.params.update(overrides)
+        self.sets = {
+            name: RuleSet(name, rules, self.params)
+            for name, rules in config.get("rulesets", {}).items()
+        }
+
+    def __getitem__(self, name):
+        return self.sets[name]
+
+
+def read_config(path=RULES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yml", ".yaml")):
+            if yaml is None:
+                raise RuntimeError("YAML のルールファイルには PyYAML が必要です")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_rules(path=RULES_FILE, overrides=None):
+    return Rules(read_config(path), overrides)
@@ -0,0 +1,203 @@
+import os
+import sys
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:   # orjson が無ければ標準の json を使う
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:   # msgpack が無ければバイナリ形式は使えない（JSON 系だけ）
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:   # zstandard が無ければ圧縮は gzip だけ
+    zstandard = None
+
+# -----------------------------
+# シリアライズ層
+# -----------------------------
+# ログ・キャッシュ・スナップショットの読み書きをここに集め、バックエンドを差し替えられるようにする。
+#
+# JSON（テキスト。JSONL のログ、API キャッシュ、API レスポンスの decode）:
+#   JSON_BACKEND=auto   orjson があれば orjson、無ければ標準の json（既定）
+#   JSON_BACKEND=json   常に標準の json（出力を従来とバイト単位で揃えたいとき）
+#   orjson で書けない値（64bit を超える整数など）はその場で標準の json に切り替える。
+#
+# ファイル形式（スナップショットなど、まとめて読み書きするファイル）は拡張子で決める:
+#   .json / .msgpack に、圧縮 .gz / .zst を付けられる（例: raydium_xxx.msgpack.zst）
+#   msgpack / zstandard はインストールされているときだけ使える。
+#
+#   python serializer.py formats                 使える形式の一覧
+#   python serializer.py convert in.json out.msgpack.zst
+
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+GZIP_LEVEL = int(os.getenv("SERIALIZER_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("SERIALIZER_ZSTD_LEVEL", "3"))
+
+_use_orjson = orjson is not None and JSON_BACKEND != "json"
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+FORMATS = ("json", "msgpack")
+COMPRESSIONS = ("", "gz", "zst")
+
+
+# -----------------------------
+# JSON
+# -----------------------------
+def json_backend():
+    return "orjson" if _use_orjson else "json"
+
+
+def dumps(obj):
+    # ensure_ascii=False の json.dumps と同じ文字列（空白の有無など細部は orjson の流儀）
+    if _use_orjson:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTS).decode("utf-8")
+        except (TypeError, orjson.JSONEncodeError):
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def dumps_lines(records):
+    # JSONL 用。1レコード1行の文字列をまとめて返す
+    if _use_orjson:
+        try:
+            opts = _ORJSON_OPTS | orjson.OPT_APPEND_NEWLINE
+            return b"".join(orjson.dumps(r, option=opts) for r in records).decode("utf-8")
+        except (TypeError, orjson.JSONEncodeError):
+            pass
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+
+
+def loads(data):
+    # str / bytes のどちらでも受け付ける（HTTP レスポンスは resp.content をそのまま渡す）
+    if _use_orjson:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass   # NaN / Infinity など標準の json だけが読める値は下で読み直す
+    return json.loads(data)
+
+
+# -----------------------------
+# ファイル形式
+# -----------------------------
+def format_of(path):
+    # 拡張子から (形式, 圧縮) を返す。例: "a.msgpack.zst" -> ("msgpack", "zst")
+    name = os.path.basename(path)
+    compression = ""
+    for c in ("gz", "zst"):
+        if name.endswith("." + c):
+            compression = c
+            name = name[:-len(c) - 1]
+            break
+    fmt = "msgpack" if name.endswith((".msgpack", ".mpk")) else "json"
+    return fmt, compression
+
+
+def extension(fmt, compression=""):
+    return f".{fmt}" + (f".{compression}" if compression else "")
+
+
+def parse_extension(spec):
+    # "msgpack.zst" / ".json.gz" のような指定を (形式, 圧縮) にして、使えるか確かめる
+    fmt, compression = format_of("x." + spec.lstrip("."))
+    check_available(fmt, compression)
+    return fmt, compression
+
+
+def available():
+    out = []
+    for fmt in FORMATS:
+        for c in COMPRESSIONS:
+            try:
+                check_available(fmt, c)
+            except RuntimeError:
+                continue
+            out.append((fmt, c))
+    return out
+
+
+def check_available(fmt, compression=""):
+    if fmt == "msgpack" and msgpack is None:
+        raise RuntimeError("msgpack がインストールされていません（pip install msgpack）")
+    if compression == "zst" and zstandard is None:
+        raise RuntimeError("zstandard がインストールされていません（pip install zstandard）")
+
+
+def encode(obj, fmt="json", compression=""):
+    check_available(fmt, compression)
+    if fmt == "msgpack":
+        body = msgpack.packb(obj, use_bin_type=True)
+    else:
+        body = dumps(obj).encode("utf-8")
+    if compression == "gz":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    elif compression == "zst":
+        body = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return body
+
+
+def decode(body, fmt="json", compression=""):
+    check_available(fmt, compression)
+    if compression == "gz":
+        body = gzip.decompress(body)
+    elif compression == "zst":
+        body = zstandard.ZstdDecompressor().decompress(body)   # compress() はフレームに元の大きさを書く
+    if fmt == "msgpack":
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    return loads(body)
+
+
+def dump_file(obj, path):
+    # 書き終えてから置き換える（読み手が途中のファイルを見ないように）
+    body = encode(obj, *format_of(path))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+    return len(body)
+
+
+def load_file(path):
+    with open(path, "rb") as f:
+        body = f.read()
+    return decode(body, *format_of(path))
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _convert(src, dst):
+    obj = load_file(src)
+    size = dump_file(obj, dst)
+    print(f"[SERIAL] {src} ({os.path.getsize(src)} bytes) -> {dst} ({size} bytes)")
+
+
+def main(argv):
+    # python serializer.py convert in out [in out ...]
+    # python serializer.py formats
+    if len(argv) >= 2 and argv[1] == "formats":
+        print(f"[SERIAL] JSON バックエンド: {json_backend()}")
+        for fmt, c in available():
+            print(f"[SERIAL]   {extension(fmt, c)}")
+        return 0
+    if len(argv) >= 4 and argv[1] == "convert" and len(argv) % 2 == 0:
+        try:
+            for src, dst in zip(argv[2::2], argv[3::2]):
+                _convert(src, dst)
+        except RuntimeError as e:
+            print("[SERIAL]", e)
+            return 1
+        return 0
+    print("usage: serializer.py formats | convert in out [in out ...]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+# -----------------------------
+# Raydium スナップショットの差分
+# -----------------------------
+# 前回サイクルのペアごとの指紋（LP / 24h 出来高 / FDV）と今回の /pairs を比べ、
+# 新規・変化・保留のペアだけを判定に回す。変化なしのペアは state もログも触らない。
+#
+# 保留（pending）: 一次判定は通ったが二次判定で通知しなかったペア。LP が同じでも
+# 次のサイクルで Dexscreener 側の条件を満たせば通知されるので、毎回判定し直す。
+#
+# 変化なしとみなした小さな動きは指紋を更新しない（前回判定時の値との差で比べ続ける）ので、
+# 閾値未満の変化が積み重なっても取りこぼさない。
+
+# 相対変化がこれ以下なら「変化なし」（0 なら少しでも変われば判定する）
+SNAPSHOT_EPSILON = float(os.getenv("SNAPSHOT_EPSILON", "0.0005"))
+
+
+def _num(v):
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def fingerprint(p):
+    return (_num(p.get("liquidity")), _num(p.get("volume_24h_quote")), _num(p.get("fdv")))
+
+
+def _moved(new, old, epsilon):
+    if new is None or old is None:
+        return new != old
+    return abs(new - old) > epsilon * max(abs(old), 1.0)
+
+
+def diff(pairs, previous, epsilon=SNAPSHOT_EPSILON):
+    # previous: {pair_id: (lp, volume, fdv, pending)}
+    # 戻り値: (判定するペアのリスト, 消えた pair_id のリスト, 種類ごとの件数)
+    evaluate = []
+    counts = Counter()
+    seen = set()
+    for p in pairs:
+        pair_id = p.get("pair_id")
+        if not pair_id or pair_id in seen:
+            continue
+        seen.add(pair_id)
+
+        old = previous.get(pair_id)
+        if old is None:
+            kind = "new"
+        elif old[3]:
+            kind = "pending"
+        elif any(_moved(n, o, epsilon) for n, o in zip(fingerprint(p), old[:3])):
+            kind = "changed"
+        else:
+            counts["unchanged"] += 1
+            continue
+        counts[kind] += 1
+        evaluate.append(p)
+
+    removed = [pid for pid in previous if pid not in seen]
+    counts["removed"] = len(removed)
+    return evaluate, removed, counts
+
+
+def rules_key(params):
+    # 閾値が変わったら前回の指紋は使えない（変化なしでも判定結果が変わりうる）
+    body = json.dumps(params, sort_keys=True, default=str).encode()
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+def summary(counts):
+    return (
+        f"[DIFF] 新規={counts['new']} 変化={counts['changed']} 保留={counts['pending']} "
+        f"変化なし={counts['unchanged']} 消滅={counts['removed']}"
+    )
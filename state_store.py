@@ -0,0 +1,491 @@
+import os
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import threading
+
+import serializer
+from lp_history import Ring
+from records import PairState
+
+# -----------------------------
+# ペア state の SQLite ストア
+# -----------------------------
+# state.json（全ペアの dict）を毎回 deepcopy して全書き換えする代わりに、
+# ペア単位の行として保存し、変化したペアだけを1トランザクションで書き込む。
+# pair_fingerprint には前回判定した時点の Raydium の値（snapshot_diff 用）を持つ。
+# pair_history には LP / 価格 / 出来高のリングバッファ（lp_history.Ring）を BLOB で持つ。
+# mint_alert には mint ごとの最後の通知（判定レベルと時刻。mint_alerts のクールダウン用）を持つ。
+#
+# 寿命管理: pair_state.last_seen は最後に Raydium のフィルタ後ユニバースに現れた時刻。
+#   - STATE_TTL_HOURS      ユニバースから消えてこの時間が経ったペアを削除
+#   - STATE_INACTIVE_HOURS ユニバースには居るが state がこの時間変化していないペアを削除
+#                          （指紋は残すので、次に動いたときに新規ペアとして測り直す）
+#   - STATE_ARCHIVE        指定すると削除した行を gzip の JSONL に追記してから消す
+# 削除で空いたページは、空き率が STATE_VACUUM_RATIO を超えたら VACUUM で詰める
+# （state.db は毎回 git に commit されるので、ファイルサイズを増やし続けない）。
+
+STATE_DB = os.getenv("STATE_DB", "state.db")
+LEGACY_STATE_FILE = "state.json"
+
+STATE_TTL_HOURS = float(os.getenv("STATE_TTL_HOURS", "24"))
+STATE_INACTIVE_HOURS = float(os.getenv("STATE_INACTIVE_HOURS", "168"))
+STATE_ARCHIVE = os.getenv("STATE_ARCHIVE", "")
+STATE_VACUUM_RATIO = float(os.getenv("STATE_VACUUM_RATIO", "0.25"))
+# last_seen の更新間隔。毎サイクル全ペアの行を書き換えないよう、この秒数より古いときだけ更新する
+LAST_SEEN_RESOLUTION = int(os.getenv("STATE_LAST_SEEN_RESOLUTION", "3600"))
+
+FIELDS = ("lp", "max_lp", "last_notified_lp", "initial_price")
+# IN (...) に渡すプレースホルダ数の上限（SQLite の制限より十分小さく）
+QUERY_CHUNK = 500
+# write() に渡す dirty の既定値（migrate_from_json のように一部のキーだけ渡してもよい）
+EMPTY_DIRTY = {"state": {}, "fingerprints": {}, "removed": (), "reset": False, "key": None,
+               "history": [], "seen": (), "alerts": {}}
+
+
+class StateStore:
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pair_state ("
+            " pair_id TEXT PRIMARY KEY,"
+            " lp REAL,"
+            " max_lp REAL,"
+            " last_notified_lp REAL,"
+            " initial_price REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " last_seen REAL)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pair_state)")]
+        if "last_seen" not in columns:
+            # last_seen 追加前の DB: 最後に値が変わった時刻を初期値にする
+            self.conn.execute("ALTER TABLE pair_state ADD COLUMN last_seen REAL")
+            self.conn.execute("UPDATE pair_state SET last_seen = updated_at")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pair_state_updated ON pair_state(updated_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pair_state_last_seen ON pair_state(last_seen)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pair_fingerprint ("
+            " pair_id TEXT PRIMARY KEY,"
+            " lp REAL,"
+            " volume REAL,"
+            " fdv REAL,"
+            " pending INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pair_history ("
+            " pair_id TEXT PRIMARY KEY,"
+            " first INTEGER,"
+            " head INTEGER,"
+            " data BLOB NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS mint_alert ("
+            " mint TEXT PRIMARY KEY,"
+            " level TEXT NOT NULL,"
+            " alerted_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+        # 読み込んだ行のキャッシュと、未書き込みの行（どちらも FIELDS 順のタプル）
+        self._cache = {}
+        self._missing = set()
+        self._dirty = {}
+        self._count = None
+        # このサイクルでユニバースに居たペア（last_seen の更新用）
+        self._seen = set()
+
+        # 指紋（全件をメモリに持つ。1ペアあたり数十バイト）
+        self._fingerprints = None
+        self._fp_dirty = {}
+        self._fp_removed = set()
+        self._fp_reset = False
+        self._fp_key = None
+
+        # 履歴（読み込んだものだけ持つ）
+        self._history = {}
+        self._history_dirty = set()
+
+        # mint ごとの最後の通知（全件をメモリに持つ。クールダウン中の mint だけなので少ない）
+        self._alerts = None
+        self._alerts_dirty = {}
+
+    # --- 読み込み ---
+    def get_many(self, pair_ids):
+        # 存在するペアだけを {pair_id: PairState} で返す（呼び出し側で自由に変更してよい）
+        pair_ids = list(pair_ids)
+        need = [pid for pid in dict.fromkeys(pair_ids)
+                if pid not in self._cache and pid not in self._missing]
+        if need:
+            found = {}
+            with self.lock:
+                for i in range(0, len(need), QUERY_CHUNK):
+                    chunk = need[i:i + QUERY_CHUNK]
+                    rows = self.conn.execute(
+                        f"SELECT pair_id, {', '.join(FIELDS)} FROM pair_state"
+                        f" WHERE pair_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for row in rows:
+                        found[row[0]] = row[1:]
+            for pid in need:
+                if pid in found:
+                    self._cache[pid] = found[pid]
+                else:
+                    self._missing.add(pid)
+
+        return {pid: PairState(*self._cache[pid]) for pid in pair_ids if pid in self._cache}
+
+    def count(self):
+        if self._count is None:
+            with self.lock:
+                self._count = self.conn.execute("SELECT COUNT(*) FROM pair_state").fetchone()[0]
+        return self._count
+
+    def load_all(self):
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT pair_id, {', '.join(FIELDS)} FROM pair_state ORDER BY pair_id"
+            ).fetchall()
+        state = {row[0]: dict(zip(FIELDS, row[1:])) for row in rows}
+        state.update({pid: dict(zip(FIELDS, row)) for pid, row in self._dirty.items()})
+        return state
+
+    # --- 書き込み ---
+    def put_many(self, entries):
+        # {pair_id: PairState} のうち値が変わったペアだけを dirty にする
+        changed = 0
+        for pid, entry in entries.items():
+            row = entry.to_row()
+            if self._cache.get(pid) == row:
+                continue
+            if pid in self._missing:
+                self._count = self.count() + 1
+                self._missing.discard(pid)
+            self._cache[pid] = row
+            self._dirty[pid] = row
+            changed += 1
+        return changed
+
+    def touch(self, pair_ids):
+        # ユニバースに居たペアを記録する（書き込みは take_dirty / write でまとめて）
+        self._seen.update(pair_ids)
+
+    # --- 指紋 ---
+    def fingerprints(self, key):
+        # {pair_id: (lp, volume, fdv, pending)}。key（閾値のハッシュ）が前回と違えば空を返す
+        if self._fingerprints is None:
+            with self.lock:
+                row = self.conn.execute("SELECT value FROM meta WHERE key = 'fingerprint_key'").fetchone()
+                if row and row[0] == key:
+                    rows = self.conn.execute(
+                        "SELECT pair_id, lp, volume, fdv, pending FROM pair_fingerprint"
+                    ).fetchall()
+                    self._fingerprints = {r[0]: (r[1], r[2], r[3], bool(r[4])) for r in rows}
+                else:
+                    self._fingerprints = {}
+                    self._fp_reset = True
+            self._fp_key = key
+        elif key != self._fp_key:
+            self._fingerprints = {}
+            self._fp_dirty = {}
+            self._fp_removed = set()
+            self._fp_reset = True
+            self._fp_key = key
+        return self._fingerprints
+
+    def put_fingerprints(self, updates, removed=()):
+        for pid, fp in updates.items():
+            self._fingerprints[pid] = fp
+            self._fp_dirty[pid] = fp
+            self._fp_removed.discard(pid)
+        for pid in removed:
+            self._fingerprints.pop(pid, None)
+            self._fp_dirty.pop(pid, None)
+            self._fp_removed.add(pid)
+
+    # --- 履歴 ---
+    def get_history(self, pair_ids):
+        # {pair_id: Ring}。無いペアは空の Ring を返す（変更したら put_history に渡す）
+        pair_ids = list(pair_ids)
+        need = [pid for pid in dict.fromkeys(pair_ids) if pid not in self._history]
+        if need:
+            with self.lock:
+                for i in range(0, len(need), QUERY_CHUNK):
+                    chunk = need[i:i + QUERY_CHUNK]
+                    rows = self.conn.execute(
+                        "SELECT pair_id, first, head, data FROM pair_history"
+                        f" WHERE pair_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for pid, first, head, blob in rows:
+                        self._history[pid] = Ring.from_row(first, head, blob)
+            for pid in need:
+                if pid not in self._history:
+                    self._history[pid] = Ring()
+        return {pid: self._history[pid] for pid in pair_ids}
+
+    def put_history(self, pair_ids):
+        self._history_dirty.update(pair_ids)
+
+    # --- mint ごとの通知 ---
+    def mint_alerts(self, mints):
+        # {mint: (判定, 通知時刻)}。通知したことの無い mint は含まない
+        if self._alerts is None:
+            with self.lock:
+                rows = self.conn.execute("SELECT mint, level, alerted_at FROM mint_alert").fetchall()
+            self._alerts = {m: (level, at) for m, level, at in rows}
+        return {m: self._alerts[m] for m in mints if m in self._alerts}
+
+    def put_mint_alerts(self, updates):
+        # updates: {mint: (判定, 通知時刻)}
+        if self._alerts is None:
+            self.mint_alerts(())
+        self._alerts.update(updates)
+        self._alerts_dirty.update(updates)
+
+    def take_dirty(self):
+        dirty = {
+            "state": self._dirty,
+            "fingerprints": self._fp_dirty,
+            "removed": self._fp_removed,
+            "reset": self._fp_reset,
+            "key": self._fp_key,
+            # 書き込みスレッドに渡すので、この時点の内容をコピーしておく
+            "history": [(pid, *self._history[pid].to_row()) for pid in self._history_dirty],
+            "seen": self._seen,
+            "alerts": self._alerts_dirty,
+        }
+        self._dirty, self._fp_dirty, self._fp_removed, self._fp_reset = {}, {}, set(), False
+        self._history_dirty = set()
+        self._seen = set()
+        self._alerts_dirty = {}
+        return dirty
+
+    def write(self, dirty):
+        # dirty 行を1トランザクションで upsert する（別スレッドから呼んでもよい）
+        # 戻り値は書き込んだ state の行数
+        dirty = {**EMPTY_DIRTY, **dirty}
+        if not (dirty["state"] or dirty["fingerprints"] or dirty["removed"] or dirty["reset"]
+                or dirty["history"] or dirty["seen"] or dirty["alerts"]):
+            return 0
+        now = time.time()
+        rows = [(pid, *row, now, now, now) for pid, row in dirty["state"].items()]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO pair_state (pair_id, {', '.join(FIELDS)}, created_at, updated_at, last_seen)"
+                    f" VALUES (?, {', '.join('?' * len(FIELDS))}, ?, ?, ?)"
+                    " ON CONFLICT(pair_id) DO UPDATE SET"
+                    + ", ".join(f" {k} = excluded.{k}" for k in FIELDS)
+                    + ", updated_at = excluded.updated_at, last_seen = excluded.last_seen",
+                    rows,
+                )
+                # 条件に合わない行は書き換わらないので、ほとんどのサイクルでページは変わらない
+                self.conn.executemany(
+                    "UPDATE pair_state SET last_seen = ? WHERE pair_id = ? AND last_seen < ?",
+                    [(now, pid, now - LAST_SEEN_RESOLUTION) for pid in dirty["seen"]],
+                )
+                if dirty["reset"]:
+                    self.conn.execute("DELETE FROM pair_fingerprint")
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint_key', ?)",
+                        (dirty["key"],),
+                    )
+                self.conn.executemany(
+                    "DELETE FROM pair_fingerprint WHERE pair_id = ?",
+                    [(pid,) for pid in dirty["removed"]],
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO pair_fingerprint (pair_id, lp, volume, fdv, pending)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(pid, *fp[:3], int(fp[3])) for pid, fp in dirty["fingerprints"].items()],
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO pair_history (pair_id, first, head, data) VALUES (?, ?, ?, ?)",
+                    dirty["history"],
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO mint_alert (mint, level, alerted_at) VALUES (?, ?, ?)",
+                    [(m, level, at) for m, (level, at) in dirty["alerts"].items()],
+                )
+        return len(rows)
+
+    def flush(self):
+        return self.write(self.take_dirty())
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # --- 寿命管理 ---
+    def evict(self, ttl_hours=STATE_TTL_HOURS, inactive_hours=STATE_INACTIVE_HOURS,
+              archive=STATE_ARCHIVE, now=None):
+        # 期限切れのペアを削除し、{"absent": n, "inactive": n} を返す（0 以下の時間は無効）
+        # まだ書き込んでいない行・このサイクルで見たペアは対象にしない
+        now = now or time.time()
+        absent_before = now - ttl_hours * 3600 if ttl_hours > 0 else 0
+        inactive_before = now - inactive_hours * 3600 if inactive_hours > 0 else 0
+        keep = set(self._dirty) | self._seen
+
+        with self.lock:
+            # TTL より前の通知記録はもうクールダウンに効かない（ペアの削除とは別に消す）
+            with self.conn:
+                self.conn.execute("DELETE FROM mint_alert WHERE alerted_at < ?", (absent_before,))
+            rows = self.conn.execute(
+                f"SELECT pair_id, {', '.join(FIELDS)}, created_at, updated_at, last_seen FROM pair_state"
+                " WHERE last_seen < ? OR updated_at < ?",
+                (absent_before, inactive_before),
+            ).fetchall()
+        if self._alerts is not None:
+            self._alerts = {m: v for m, v in self._alerts.items() if v[1] >= absent_before}
+        absent, inactive = [], []
+        for row in rows:
+            if row[0] in keep:
+                continue
+            (absent if row[-1] < absent_before else inactive).append(row)
+        if not (absent or inactive):
+            return {"absent": 0, "inactive": 0}
+
+        if archive:
+            # 書き出しに失敗したら削除しない
+            _archive_rows(archive, [("absent", r) for r in absent] + [("inactive", r) for r in inactive], now)
+
+        absent_ids = [r[0] for r in absent]
+        all_ids = absent_ids + [r[0] for r in inactive]
+        with self.lock:
+            with self.conn:
+                for table, ids in (("pair_state", all_ids), ("pair_history", all_ids),
+                                   ("pair_fingerprint", absent_ids)):
+                    for i in range(0, len(ids), QUERY_CHUNK):
+                        chunk = ids[i:i + QUERY_CHUNK]
+                        self.conn.execute(
+                            f"DELETE FROM {table} WHERE pair_id IN ({','.join('?' * len(chunk))})", chunk
+                        )
+
+        for pid in all_ids:
+            self._cache.pop(pid, None)
+            self._missing.add(pid)
+            self._history.pop(pid, None)
+            self._history_dirty.discard(pid)
+        for pid in absent_ids:
+            if self._fingerprints is not None:
+                self._fingerprints.pop(pid, None)
+            self._fp_dirty.pop(pid, None)
+        self._count = None
+        return {"absent": len(absent), "inactive": len(inactive)}
+
+    def size_bytes(self):
+        with self.lock:
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        return page_size * pages
+
+    def vacuum(self, min_free_ratio=STATE_VACUUM_RATIO):
+        # 空きページの割合が min_free_ratio 以上なら VACUUM する（0 なら常に）
+        # 実行したら (前のバイト数, 後のバイト数)、しなければ None を返す
+        with self.lock:
+            pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not pages or free / pages < min_free_ratio:
+            return None
+        before = self.size_bytes()
+        with self.lock:
+            self.conn.execute("VACUUM")
+        return before, self.size_bytes()
+
+    # --- state.json からの移行 ---
+    def migrate_from_json(self, json_path=LEGACY_STATE_FILE):
+        with open(json_path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        legacy = json.loads(text) if text else {}
+        entries = {}
+        for pid, e in legacy.items():
+            row = tuple(e.get(k) for k in FIELDS)
+            if row[1] is None:
+                row = (row[0], row[0], *row[2:])
+            entries[pid] = row
+        n = self.write({"state": entries})
+        self._cache.clear()
+        self._missing.clear()
+        self._count = None
+        # 読み戻して旧 state.json と一致するか確かめる（一致しなければ移行失敗として止める）
+        stored = self.load_all()
+        bad = [pid for pid, row in entries.items() if stored.get(pid) != dict(zip(FIELDS, row))]
+        if bad:
+            raise RuntimeError(f"{json_path} の移行結果が一致しません: {len(bad)} ペア (例: {bad[0]})")
+        return n
+
+
+def _archive_rows(path, rows, now):
+    # 削除する行を gzip の JSONL に追記する（gzip はメンバーを連結しても読める）
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for reason, row in rows:
+            rec = {"pair_id": row[0], **dict(zip(FIELDS, row[1:1 + len(FIELDS)]))}
+            rec.update(created_at=row[-3], updated_at=row[-2], last_seen=row[-1],
+                       evicted_at=now, reason=reason)
+            f.write(serializer.dumps(rec) + "\n")
+
+
+def open_store(path=STATE_DB, legacy_path=LEGACY_STATE_FILE):
+    # DB が無く、旧 state.json があれば初回だけ自動で移行する
+    fresh = not os.path.exists(path)
+    store = StateStore(path)
+    if fresh and os.path.exists(legacy_path) and os.path.getsize(legacy_path) > 0:
+        try:
+            n = store.migrate_from_json(legacy_path)
+        except Exception:
+            # 作りかけの DB を残すと次回は移行済み扱いになり、旧 state を黙って捨ててしまう
+            store.conn.close()
+            os.remove(path)
+            raise
+        print(f"[STATE] {legacy_path} から {n} ペアを移行しました")
+    return store
+
+
+def main(argv):
+    # python state_store.py migrate [state.json] [state.db]
+    # python state_store.py export  [state.db]   > state.json
+    # python state_store.py compact [state.db]   期限切れの削除 + VACUUM（STATE_TTL_HOURS などは環境変数）
+    if len(argv) < 2 or argv[1] not in ("migrate", "export", "compact"):
+        print("usage: state_store.py migrate [state.json] [state.db] | export [state.db] | compact [state.db]")
+        return 1
+
+    if argv[1] == "migrate":
+        src = argv[2] if len(argv) > 2 else LEGACY_STATE_FILE
+        dst = argv[3] if len(argv) > 3 else STATE_DB
+        store = StateStore(dst)
+        n = store.migrate_from_json(src)
+        store.close()
+        print(f"[STATE] {src} → {dst}: {n} ペア")
+    elif argv[1] == "compact":
+        src = argv[2] if len(argv) > 2 else STATE_DB
+        store = StateStore(src)
+        evicted = store.evict()
+        before = store.size_bytes()
+        after = (store.vacuum(min_free_ratio=0) or (before, before))[1]
+        print(f"[STATE] {src}: 削除 {evicted['absent']} (消滅) + {evicted['inactive']} (無変化),"
+              f" 残り {store.count()} ペア, {before / 1024:.0f}KB → {after / 1024:.0f}KB"
+              + (f", 退避先 {STATE_ARCHIVE}" if STATE_ARCHIVE else ""))
+        store.close()
+    else:
+        src = argv[2] if len(argv) > 2 else STATE_DB
+        store = StateStore(src)
+        json.dump(store.load_all(), sys.stdout, indent=2)
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,30 +1,19 @@
-import requests
+import api_cache
+import http_engine
+from rules import load_rules
 
-URL = "https://api.dexscreener.com/latest/dex/search?q=doge"
+URL = f"{http_engine.DEXSCREENER_BASE}/latest/dex/search?q=doge"
 
-def is_dead(pair):
-    symbol = pair.get("baseToken", {}).get("symbol", "")
-    fdv = pair.get("fdv") or 0
-    liquidity = pair.get("liquidity", {}).get("usd") or 0
-
-    # 対象外
-    if symbol.upper() == "ETH":
-        return True
+# 対象外シンボル / 即死条件は rules.json の step0_alive
+ALIVE_RULES = load_rules()["step0_alive"]
 
-    # 即死条件
-    if fdv > 50_000_000:
-        return True
-    if fdv < 50_000:
-        return True
-    if liquidity < 20_000:
-        return True
 
-    return False
+def is_dead(pair):
+    return not ALIVE_RULES.check(pair)
 
 
 def main():
-    res = requests.get(URL, timeout=10)
-    pairs = res.json().get("pairs", [])
+    pairs = api_cache.get_json(URL, timeout=10).get("pairs", [])
 
     alive = []
     dead = []
@@ -37,7 +26,9 @@ def main():
 
     print(f"全体: {len(pairs)}")
     print(f"生存: {len(alive)}")
-    print(f"即死: {len(dead)}\n")
+    print(f"即死: {len(dead)}")
+    print(ALIVE_RULES.summary())
+    print()
 
     for p in alive:
         print(
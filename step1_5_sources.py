@@ -1,38 +1,103 @@
-import requests
+import os
+import sys
+from urllib.parse import quote
+import api_cache
+import http_engine
+import vector_filter
+from rules import load_rules
 
 KEYWORDS = [
     "pepe", "dog", "cat", "inu", "frog",
     "baby", "coin", "ai", "x"
 ]
+# 1行1キーワード（# 以降はコメント）。あれば KEYWORDS の代わりに使う
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE", "keywords.txt")
 
-all_pairs = []
+SEARCH_API = f"{http_engine.DEXSCREENER_BASE}/latest/dex/search?q="
 
-for kw in KEYWORDS:
-    url = f"https://api.dexscreener.com/latest/dex/search?q={kw}"
-    r = requests.get(url, timeout=10)
+# FDV / LP 比率などの条件は rules.json の step1_5_ratio
+RATIO_RULES = load_rules()["step1_5_ratio"]
 
-    if r.status_code != 200:
-        continue
 
-    data = r.json()
-    pairs = data.get("pairs", [])
+def load_keywords(path=KEYWORDS_FILE):
+    if not path or not os.path.exists(path):
+        return list(KEYWORDS)
+    keywords = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            kw = line.split("#", 1)[0].strip()
+            if kw:
+                keywords.append(kw)
+    return list(dict.fromkeys(keywords))
 
-    all_pairs.extend(pairs)
 
-print("総取得ペア数:", len(all_pairs))
+def passing_indices(pairs):
+    # RATIO_RULES を通ったペアの添字（numpy が使えるときは列演算でまとめて判定する）
+    if vector_filter.available() and pairs:
+        return vector_filter.np.flatnonzero(vector_filter.ruleset_mask(RATIO_RULES, pairs)).tolist()
+    return [i for i, p in enumerate(pairs) if RATIO_RULES.check(p)]
 
-survivors = []
 
-for p in all_pairs:
-    fdv = p.get("fdv")
-    lp = p.get("liquidity", {}).get("usd")
+def discover(keywords):
+    # キーワード検索を並行に投げ、届いた順に chain + pairAddress で重複を除く。
+    # 戻り値: (ユニークなペアのリスト, ペアを最初に見つけたキーワードのリスト, キーワード別統計)
+    unique = {}
+    found_by = {}
+    stats = {kw: {"pairs": 0, "new": 0, "survivors": 0, "error": False} for kw in keywords}
 
-    if not fdv or not lp:
-        continue
+    def on_result(i, data):
+        kw = keywords[i]
+        if isinstance(data, Exception):
+            stats[kw]["error"] = True
+            return
+        pairs = data.get("pairs") or []
+        stats[kw]["pairs"] = len(pairs)
+        for p in pairs:
+            key = (p.get("chainId"), p.get("pairAddress"))
+            if key in unique:
+                continue
+            unique[key] = p
+            found_by[key] = kw
+            stats[kw]["new"] += 1
 
-    ratio = fdv / lp
+    urls = [SEARCH_API + quote(kw) for kw in keywords]
+    api_cache.get_json_each(urls, on_result, timeout=10)
+    return list(unique.values()), list(found_by.values()), stats
 
-    if 1.5 <= ratio <= 5 and lp > 30000:
+
+def print_keyword_stats(stats):
+    # 1リクエストあたりの新規ペア数が多い順
+    print("キーワード別の収穫（取得 / 新規 / 生存）:")
+    ranked = sorted(stats.items(), key=lambda kv: (kv[1]["new"], kv[1]["survivors"]), reverse=True)
+    for kw, s in ranked:
+        mark = " (エラー)" if s["error"] else ""
+        print(f"  {kw:12s} {s['pairs']:4d} / {s['new']:4d} / {s['survivors']:3d}{mark}")
+
+    useless = [kw for kw, s in stats.items() if not s["error"] and s["new"] == 0]
+    if useless:
+        print("新規ペア0件のキーワード:", ", ".join(useless))
+
+
+def main(keywords_file=KEYWORDS_FILE):
+    keywords = load_keywords(keywords_file)
+    RATIO_RULES.reset_counters()
+    pairs, found_by, stats = discover(keywords)
+
+    total = sum(s["pairs"] for s in stats.values())
+    print(f"キーワード数: {len(keywords)}")
+    print("総取得ペア数:", total)
+    print("重複除去後:", len(pairs))
+
+    survivors = []
+
+    for i in passing_indices(pairs):
+        p = pairs[i]
+        kw = found_by[i]
+        fdv = p["fdv"]
+        lp = p["liquidity"]["usd"]
+        ratio = fdv / lp
+
+        stats[kw]["survivors"] += 1
         survivors.append({
             "symbol": p["baseToken"]["symbol"],
             "fdv": int(fdv),
@@ -40,8 +105,18 @@ for p in all_pairs:
             "ratio": round(ratio, 2)
         })
 
-print("STEP1.5 生存:", len(survivors))
-print()
+    print("STEP1.5 生存:", len(survivors))
+    print(RATIO_RULES.summary())
+    print()
+
+    for s in survivors[:10]:
+        print(f"{s['symbol']} FDV:{s['fdv']} LP:{s['lp']} 比率:{s['ratio']}")
+
+    print()
+    print_keyword_stats(stats)
+    return survivors
+
 
-for s in survivors[:10]:
-    print(f"{s['symbol']} FDV:{s['fdv']} LP:{s['lp']} 比率:{s['ratio']}")
+if __name__ == "__main__":
+    # python step1_5_sources.py [keywords.txt]
+    main(sys.argv[1] if len(sys.argv) > 1 else KEYWORDS_FILE)
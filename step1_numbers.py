@@ -1,41 +1,45 @@
-import requests
-
-URL = "https://api.dexscreener.com/latest/dex/search?q=ethereum"
-
-response = requests.get(URL, timeout=10)
-
-print("HTTP:", response.status_code)
-
-text = response.text.strip()
-
-if not text.startswith("{"):
-    print("JSONでないレスポンス")
-    print(text[:200])
+import api_cache
+import http_engine
+import vector_filter
+from rules import load_rules
+
+URL = f"{http_engine.DEXSCREENER_BASE}/latest/dex/search?q=ethereum"
+
+# 共有セッション・流量制限・再試行・キャッシュは api_cache / http_engine に任せる
+try:
+    data = api_cache.get_json(URL, timeout=10)
+except Exception as e:
+    # HTTP エラーや JSON でないレスポンス
+    print("取得エラー:", e)
     exit()
 
-data = response.json()
 pairs = data.get("pairs", [])
 
 print("取得ペア数:", len(pairs))
 
-survivors = []
+# FDV / LP 比率などの条件は rules.json の step1_ratio
+RATIO_RULES = load_rules()["step1_ratio"]
 
-for p in pairs:
-    fdv = p.get("fdv")
-    liquidity = p.get("liquidity", {}).get("usd")
+# numpy が使えるときは列演算でまとめて判定する（vector_filter.py）
+if vector_filter.available() and pairs:
+    mask = vector_filter.ruleset_mask(RATIO_RULES, pairs)
+    passed = [pairs[i] for i in vector_filter.np.flatnonzero(mask)]
+else:
+    passed = [p for p in pairs if RATIO_RULES.check(p)]
 
-    if not fdv or not liquidity:
-        continue
+survivors = []
 
+for p in passed:
+    fdv = p["fdv"]
+    liquidity = p["liquidity"]["usd"]
     ratio = fdv / liquidity
 
-    if 1.5 <= ratio <= 5:
-        survivors.append({
-            "symbol": p["baseToken"]["symbol"],
-            "fdv": int(fdv),
-            "lp": int(liquidity),
-            "ratio": round(ratio, 2)
-        })
+    survivors.append({
+        "symbol": p["baseToken"]["symbol"],
+        "fdv": int(fdv),
+        "lp": int(liquidity),
+        "ratio": round(ratio, 2)
+    })
 
 print("\nSTEP1 結果")
 print("生存:", len(survivors))
@@ -1,197 +1,407 @@
-import requests
-import json
 import os
-import copy
+import time
+import queue
+import signal
+import argparse
+import threading
+import multiprocessing
 from datetime import datetime
-from notify_mail import send_mail
+import notify_queue
+from notify_queue import MailQueue
+import api_cache
+import http_engine
+import state_store
+from state_store import open_store
+from event_log import EventLog
+from detection_store import DetectionStore
+import vector_filter
+import metrics
+import snapshot_diff
+import lp_history
+import check_scheduler
+import mint_alerts
+import chain_sources
+from chain_sources import (
+    CHAINS, fetch_raydium_pairs, fetch_filtered_raydium_pairs, pair_passes_filter, filter_pairs,
+    extract_non_wsol_token,
+)
+from records import PairState, DexDetails
 
-STATE_FILE = "state.json"
 LOG_FILE = "logs/debug_notifications.jsonl"
+# 送った通知の検知レコード（step3 が 10倍到達 / 期限切れまで追跡する。全チェーン共通の1ファイル）
+DETECTIONS_FILE = "logs/detections.jsonl"
 os.makedirs("logs", exist_ok=True)
 
-# --- フィルタ条件 ---
-MIN_LP_USD = 1000
-MAX_LP_USD = 500_000
-MIN_VOLUME_24H = 500
-MAX_VOLUME_24H = 1_000_000_000
-MIN_APY = 0
-MAX_APY = 10_000
+# --- 閾値とフィルタルールは rules.json で管理（起動時に1回だけコンパイル） ---
+# 一次フィルタ（Raydium / Dexscreener のペア）はチェーンごとのソース側（chain_sources）
+RULES = chain_sources.RULES
+PAIR_RULES = chain_sources.RAYDIUM_RULES
+SECONDARY_RULES = RULES["dex_secondary"]
+PARAMS = RULES.params
 
 # --- 成長率判定 ---
-WATCH_LP_GROWTH = 20
-IMMEDIATE_LP_GROWTH = 50
+WATCH_LP_GROWTH = PARAMS["WATCH_LP_GROWTH"]
+IMMEDIATE_LP_GROWTH = PARAMS["IMMEDIATE_LP_GROWTH"]
+MIN_LP_DELTA_USD = PARAMS["MIN_LP_DELTA_USD"]
 
-# --- 二次フィルタ（最小変更） ---
-MAX_PAIR_AGE_MS = 24 * 60 * 60 * 1000 * 365 * 5   # WSOLペアは古いので5年に緩和
-MIN_TXNS5M = 2                                     # あなたの指定
-MIN_PRICECHANGE5M = 0
-MIN_LP_DELTA_USD = 300
+DEXSCREENER_API = f"{http_engine.DEXSCREENER_BASE}/latest/dex/tokens/"
+DEXSCREENER_PAIRS_API = f"{http_engine.DEXSCREENER_BASE}/latest/dex/pairs/"
 
-DEX_API = "https://api.raydium.io/pairs"
-DEXSCREENER_API = "https://api.dexscreener.com/latest/dex/tokens/"
+
+# 複数アドレス指定 /tokens/{a,b,c} の1リクエストあたり上限
+DEX_BATCH_SIZE = 30
+# レスポンスのペア数がこれに達したら打ち切りの可能性があるとみなす
+DEX_RESPONSE_PAIR_CAP = 30
+# 二次判定に使う Dexscreener リクエストの1サイクルあたりの上限（0 で無制限）
+DEX_REQUEST_BUDGET = check_scheduler.DEX_REQUEST_BUDGET
 
 
 # -----------------------------
 # Dexscreener 詳細データ取得
 # -----------------------------
-def fetch_dexscreener_details(mint):
-    url = f"{DEXSCREENER_API}{mint}"
-    try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-
-        if not data or "pairs" not in data:
-            return None
-
-        pairs = data["pairs"]
-        if not isinstance(pairs, list) or len(pairs) == 0:
-            return None
-
-        best = None
-        best_liq = -1
-        for p in pairs:
-            liq = p.get("liquidity", {}).get("usd") or 0
-            try:
-                liq = float(liq)
-            except:
-                liq = 0
-            if liq > best_liq:
-                best_liq = liq
-                best = p
+def _best_liquidity_pair(pairs):
+    best = None
+    best_liq = -1
+    for p in pairs:
+        liq = p.get("liquidity", {}).get("usd") or 0
+        try:
+            liq = float(liq)
+        except:
+            liq = 0
+        if liq > best_liq:
+            best_liq = liq
+            best = p
+    return best
 
-        if not best:
-            return None
 
-        p = best
+def _extract_dex_details(p):
+    buys5m = p.get("txns", {}).get("m5", {}).get("buys")
+    sells5m = p.get("txns", {}).get("m5", {}).get("sells")
 
-        buys5m = p.get("txns", {}).get("m5", {}).get("buys")
-        sells5m = p.get("txns", {}).get("m5", {}).get("sells")
+    txns5m = None
+    if buys5m is not None and sells5m is not None:
+        txns5m = buys5m + sells5m
 
-        txns5m = None
-        if buys5m is not None and sells5m is not None:
-            txns5m = buys5m + sells5m
+    priceChange5m = p.get("priceChange", {}).get("m5")
 
-        priceChange5m = p.get("priceChange", {}).get("m5")
+    return DexDetails(
+        price=p.get("priceUsd"),
+        priceChange1m=p.get("priceChange", {}).get("m1"),
+        priceChange5m=priceChange5m,
+        priceChange1h=p.get("priceChange", {}).get("h1"),
 
-        return {
-            "price": p.get("priceUsd"),
-            "priceChange1m": p.get("priceChange", {}).get("m1"),
-            "priceChange5m": priceChange5m,
-            "priceChange1h": p.get("priceChange", {}).get("h1"),
+        txns5m=txns5m,
+        buys5m=buys5m,
+        sells5m=sells5m,
 
-            "txns5m": txns5m,
-            "buys5m": buys5m,
-            "sells5m": sells5m,
+        volume5m=p.get("volume", {}).get("m5"),
+        liquidity_usd=p.get("liquidity", {}).get("usd"),
+        fdv=p.get("fdv"),
+        marketcap=p.get("marketCap"),
+        contract_age_ms=p.get("pairCreatedAt"),
+        lp_mint=p.get("lpToken"),
+        pair_address=p.get("pairAddress"),
+    )
 
-            "volume5m": p.get("volume", {}).get("m5"),
-            "liquidity_usd": p.get("liquidity", {}).get("usd"),
-            "fdv": p.get("fdv"),
-            "marketcap": p.get("marketCap"),
-            "contract_age_ms": p.get("pairCreatedAt"),
-            "lp_mint": p.get("lpToken"),
-        }
 
+def fetch_dexscreener_details(mint, chain=None):
+    try:
+        return _fetch_dexscreener_details(mint, chain)
     except Exception as e:
         print("[Dexscreener 詳細取得エラー]", e)
         return None
 
 
-def load_logs():
-    if not os.path.exists(LOG_FILE):
-        return {}
-    try:
-        return json.load(open(LOG_FILE, "r", encoding="utf-8"))
-    except:
-        return {}
-
-
-def save_logs(log_dict):
-    json.dump(log_dict, open(LOG_FILE, "w", encoding="utf-8"),
-              ensure_ascii=False, indent=2)
-
-
-def fetch_price_usd(mint):
-    try:
-        url = f"{DEXSCREENER_API}{mint}"
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        if "pairs" in data and len(data["pairs"]) > 0:
-            return float(data["pairs"][0].get("priceUsd") or 0)
-    except:
-        pass
-    return 0.0
-
-
-def fetch_raydium_pairs():
-    try:
-        resp = requests.get(DEX_API, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        print(f"[API] ペア数: {len(data)}")
-        return data
-    except Exception as e:
-        print("[API] 取得エラー:", e)
-        return []
+def _fetch_dexscreener_details(mint, chain=None):
+    # Dexscreener にペアが無ければ None、取得に失敗したら例外
+    data = api_cache.get_json(f"{DEXSCREENER_API}{mint}", timeout=10, refresh=True)
 
+    if not data or "pairs" not in data:
+        return None
 
-def load_state():
-    if not os.path.exists(STATE_FILE):
-        return {}
-    return json.load(open(STATE_FILE, "r", encoding="utf-8"))
+    pairs = data["pairs"]
+    if not isinstance(pairs, list):
+        return None
+    if chain:
+        pairs = [p for p in pairs if p.get("chainId") == chain]
+    if len(pairs) == 0:
+        return None
 
+    best = _best_liquidity_pair(pairs)
+    if not best:
+        return None
 
-def save_state(state):
-    json.dump(state, open(STATE_FILE, "w", encoding="utf-8"), indent=2)
-    print(f"[STATE] 更新完了。ペア数: {len(state)}")
+    return _extract_dex_details(best)
 
 
-def filter_pairs(pairs):
-    filtered = []
+def _prime_cache(pairs, grouped, truncated):
+    # 一括レスポンスを単体 URL のキャッシュにも展開しておく
+    # （直後の fetch_price_usd(mint) や step3 の fetch_price() がヒットする）
+    if not truncated:
+        for m, ps in grouped.items():
+            if ps:
+                api_cache.put(f"{DEXSCREENER_API}{m}", {"pairs": ps})
     for p in pairs:
+        chain = p.get("chainId")
+        addr = p.get("pairAddress")
+        if chain and addr:
+            api_cache.put(f"{DEXSCREENER_PAIRS_API}{chain}/{addr}", {"pairs": [p]})
+
+
+def fetch_dexscreener_details_batch(mints, max_requests=None, chain=None):
+    # mint -> fetch_dexscreener_details(mint) と同じ DexDetails（取得できなければ None）
+    # chain（Dexscreener の chainId）を指定すると、そのチェーンのペアだけを見る
+    # max_requests を指定すると、分割し直し・個別取得の追加リクエストを残りの予算内に抑える
+    # （予算切れ・取得失敗で確認できなかった mint は結果に含めない。mints は優先度順に渡す）
+    mints = list(dict.fromkeys(m for m in mints if m))
+    batches = [mints[i:i + DEX_BATCH_SIZE] for i in range(0, len(mints), DEX_BATCH_SIZE)]
+    extra_left = [None if max_requests is None else max(max_requests - len(batches), 0)]
+    requests_made = [0]
+    results = {}
+
+    def spend():
+        # 追加リクエストを1つ使えるか（使えれば予算を減らす）
+        if extra_left[0] is None:
+            return True
+        if extra_left[0] <= 0:
+            return False
+        extra_left[0] -= 1
+        return True
+
+    def fetch_single(m):
+        if not spend():
+            return
+        requests_made[0] += 1
         try:
-            lp_usd = p.get("liquidity", 0)
-            volume_24h = p.get("volume_24h_quote") or 0
-            apy = p.get("apy") or 0
+            results[m] = _fetch_dexscreener_details(m, chain)
+        except Exception as e:
+            # 「Dexscreener に無い」と区別して次のサイクルに回す
+            print("[Dexscreener 詳細取得エラー]", e)
+
+    # 各段のバッチは並行取得（待ち時間は一番遅い1リクエスト分）
+    # 二次判定は今の取引状況を見るので、前回のサイクルのキャッシュは使わない（結果は価格取得用に残す）
+    while batches:
+        urls = [f"{DEXSCREENER_API}{','.join(batch)}" for batch in batches]
+        requests_made[0] += len(urls)
+        responses = api_cache.get_json_many(urls, timeout=10, refresh=True)
+        retry = []
+        for batch, data in zip(batches, responses):
+            if isinstance(data, Exception):
+                print("[Dexscreener 一括取得エラー]", data)
+                # 一括取得に失敗したバッチは個別取得にフォールバック
+                for m in batch:
+                    fetch_single(m)
+                continue
 
-            if (
-                MIN_LP_USD <= lp_usd <= MAX_LP_USD and
-                MIN_VOLUME_24H <= volume_24h <= MAX_VOLUME_24H and
-                MIN_APY <= apy <= MAX_APY
-            ):
-                if "WSOL" in p.get("name", ""):
-                    filtered.append(p)
+            pairs = (data or {}).get("pairs") or []
+            truncated = len(pairs) >= DEX_RESPONSE_PAIR_CAP
+            if truncated and len(batch) > 1:
+                # 上限で切られていると、どの mint のペアが欠けたか分からない（残った分から選んだ
+                # 最大 LP のペアが単体取得と違いうる）。半分に分けて上限に収まるまで取り直す
+                half = len(batch) // 2
+                for part in (batch[:half], batch[half:]):
+                    if spend():
+                        retry.append(part)
+                continue
+
+            wanted = set(batch)
+            grouped = {m: [] for m in batch}
+            # 単体取得と同様、base / quote のどちらに mint が入っているペアも対象にする
+            for p in pairs:
+                if chain and p.get("chainId") != chain:
+                    continue
+                seen = set()
+                for side in ("baseToken", "quoteToken"):
+                    addr = (p.get(side) or {}).get("address")
+                    if addr in wanted and addr not in seen:
+                        grouped[addr].append(p)
+                        seen.add(addr)
+
+            # 1 mint だけのレスポンスは単体取得と同じもの（上限で切られていても同じく切られる）
+            _prime_cache(pairs, grouped, truncated)
+            for m in batch:
+                results[m] = _extract_dex_details(_best_liquidity_pair(grouped[m])) if grouped[m] else None
+        batches = retry
+
+    skipped = len(mints) - len(results)
+    print(f"[DEXCHK] 一括取得: {len(mints)} mint / {requests_made[0]} リクエスト"
+          + (f"（予算切れ・取得失敗で未確認 {skipped} mint）" if skipped else ""))
+    return results
+
+
+def prefetch_token_responses(mints):
+    # fetch_price_usd(mint) が使う単体 URL をまとめて並行取得し、キャッシュを温めておく
+    urls = [f"{DEXSCREENER_API}{m}" for m in dict.fromkeys(mints) if m]
+    if urls:
+        api_cache.get_json_many(urls, timeout=10)
 
-        except:
-            continue
 
-    print(f"[FILTER] フィルタ後ヒット件数: {len(filtered)}")
-    return filtered
+def fetch_price_usd(mint):
+    # 取得に失敗したら None（0.0 を initial_price として保存しないように）
+    try:
+        url = f"{DEXSCREENER_API}{mint}"
+        data = api_cache.get_json(url, timeout=10)
+        if "pairs" in data and len(data["pairs"]) > 0:
+            return float(data["pairs"][0].get("priceUsd") or 0)
+    except Exception as e:
+        print("[Dexscreener 価格取得エラー]", e)
+        return None
+    return 0.0
 
 
-def extract_non_wsol_token(name, pair_id):
-    parts_name = name.split("/")
-    parts_id = pair_id.split("-")
-    if len(parts_name) != 2 or len(parts_id) != 2:
-        return parts_id[0]
-    return parts_id[1] if parts_name[0] == "WSOL" else parts_id[0]
+def classify_growth(lp_usd, prev_lp, last_notified_lp, params=None):
+    # 1ペア分の成長率と一次判定（numpy が無いときの経路）。params はバックテストで閾値を差し替える用
+    if params is None:
+        watch, immediate, min_delta = WATCH_LP_GROWTH, IMMEDIATE_LP_GROWTH, MIN_LP_DELTA_USD
+    else:
+        watch = params["WATCH_LP_GROWTH"]
+        immediate = params["IMMEDIATE_LP_GROWTH"]
+        min_delta = params["MIN_LP_DELTA_USD"]
+
+    growth = (lp_usd - prev_lp) / max(prev_lp, 1) * 100
+    growth_since_last_mail = (lp_usd - last_notified_lp) / max(last_notified_lp, 1) * 100
+    lp_delta = lp_usd - last_notified_lp
+
+    decision = None
+    if growth_since_last_mail >= immediate and lp_delta >= min_delta:
+        decision = "IMMEDIATE"
+    elif growth_since_last_mail >= watch and lp_delta >= min_delta:
+        decision = "WATCH"
+    return growth, growth_since_last_mail, lp_delta, decision
+
+
+def classify_rows(rows):
+    # rows の lp_usd / prev_lp / last_notified_lp から growth 系と decision を埋める
+    if vector_filter.available() and rows:
+        growth, since, delta, decision = vector_filter.classify_growth(
+            [r["lp_usd"] for r in rows],
+            [r["prev_lp"] for r in rows],
+            [r["last_notified_lp"] for r in rows],
+            WATCH_LP_GROWTH, IMMEDIATE_LP_GROWTH, MIN_LP_DELTA_USD,
+        )
+        names = vector_filter.DECISION_NAMES
+        for i, r in enumerate(rows):
+            r["growth"] = float(growth[i])
+            r["growth_since_last_mail"] = float(since[i])
+            r["lp_delta"] = float(delta[i])
+            r["decision"] = names[int(decision[i])]
+        return
+
+    for r in rows:
+        r["growth"], r["growth_since_last_mail"], r["lp_delta"], r["decision"] = classify_growth(
+            r["lp_usd"], r["prev_lp"], r["last_notified_lp"]
+        )
+
+
+def secondary_check(dex_details, now_ms, rules=None):
+    # Dexscreener の詳細データによる二次判定。(通過したか, 不合格理由のリスト) を返す
+    rules = rules or SECONDARY_RULES
+    if not dex_details:
+        rules.rejections["NO_DEX"] += 1
+        return False, ["NO_DEX"]
+
+    failed = rules.first_failure(dex_details, {"now_ms": now_ms})
+    if failed:
+        return False, [failed]
+    return True, []
+
+
+def update_pair_state(current_state, pair_id, lp_usd):
+    # state（pair_id -> PairState）を今回の LP で更新し、(前回 LP, 前回通知時の LP) を返す
+    # 前回値は state を更新する前に読んでおく（deepcopy 不要）
+    entry = current_state.get(pair_id)
+
+    # --- state 初期化 ---
+    if entry is None:
+        current_state[pair_id] = PairState(lp=lp_usd, max_lp=lp_usd, last_notified_lp=lp_usd)
+        return lp_usd, lp_usd
+
+    prev_lp = lp_usd if entry.lp is None else entry.lp
+    if entry.max_lp is None:
+        entry.max_lp = lp_usd
+
+    entry.lp = lp_usd
+    if lp_usd > entry.max_lp:
+        entry.max_lp = lp_usd
+
+    return prev_lp, prev_lp if entry.last_notified_lp is None else entry.last_notified_lp
 
 
 # -----------------------------
 # main()
 # -----------------------------
-def main():
-    prev_state = load_state()
-    current_state = copy.deepcopy(prev_state)
-    logs = load_logs()
+def record_detection(detections, source, r, dex_details, price_usd, decision):
+    # 送った通知を step3 の追跡対象にする。追跡するのは価格を見た Dexscreener のペア
+    # 同じペアを追跡中なら追記しない（基準価格は最初の通知の時点のまま）
+    pair = (dex_details.pair_address if dex_details else None) or r["pair_id"]
+    if detections.open_for(source.dex_chain, pair) is not None:
+        print(f"[DETECT] {r['name']} | 追跡中のため検知レコードは追加しない")
+        return None
 
-    all_pairs = fetch_raydium_pairs()
-    filtered_pairs = filter_pairs(all_pairs)
+    try:
+        base_price = float(dex_details.price) if dex_details else None
+    except (TypeError, ValueError):
+        base_price = None
+    base_price = base_price or price_usd
+    record = {
+        "detected_at": datetime.utcnow().isoformat(),
+        "chain": source.dex_chain,
+        "pair": pair,
+        "pair_id": r["pair_id"],
+        "mint": r["mint"],
+        "name": r["name"],
+        "decision": decision,
+        "lp": r["lp_usd"],
+        "base_price": base_price,
+    }
+    if base_price:
+        # step3 はここからの最高値で倍率を測る（無ければ最初に取れた価格から）
+        record["tracking"] = {"base_price": base_price, "max_price": base_price}
+    return detections.add(record)
+
+
+def run_cycle(source, store, logs, mailer, detections=None, deliveries=None):
+    # 1チェーン分・1サイクル分の検知。変化したペアは store に dirty として積み、判定は logs に追記する
+    # （ディスクへの書き込みは呼び出し側）。メールは mailer に積むだけで送信を待たない
+    # 送った通知は detections（DetectionStore）に検知レコードとして追記する
+    # 通知済みにするのはメールが届いてから（deliveries。前のサイクルまでの送信結果をここで反映する）
+    deliveries = mint_alerts.Deliveries() if deliveries is None else deliveries
+    settle_deliveries(deliveries, mailer.take_results(), store)
+    source.rules.reset_counters()
+    SECONDARY_RULES.reset_counters()
+    metrics.reset_stages()
+    cycle_started = time.perf_counter()
+
+    previous = store.fingerprints(snapshot_diff.rules_key(PARAMS))
+    filtered_pairs = source.fetch_pairs(previous.keys())
+    if filtered_pairs is None:
+        # 取得に失敗した（前回値も無い）: 全ペアを消滅扱いにしないよう、state・指紋には触らない
+        print(f"[SUMMARY] {source.name} のペアを取得できなかったため、このサイクルは判定しません")
+        metrics.inc("cycle_fetch_failures_total")
+        return 0
 
     notification_count = 0
 
-    for p in filtered_pairs:
+    # 前回判定時から動いたペア（と保留中のペア）だけを判定する
+    t = time.perf_counter()
+    evaluate, removed, diff_counts = snapshot_diff.diff(filtered_pairs, previous)
+    if source.unknown:
+        removed = [pid for pid in removed if pid not in source.unknown]
+        diff_counts["removed"] = len(removed)
+    print(snapshot_diff.summary(diff_counts))
+    store.touch(p.pair_id for p in filtered_pairs if p.get("pair_id"))
+    t = metrics.lap("snapshot_diff", t)
+
+    # 判定するペアの前回 state だけを読む（全履歴は読まない）
+    current_state = store.get_many(p.get("pair_id") for p in evaluate if p.get("pair_id"))
+
+    t = metrics.lap("state_load", t)
+
+    # -----------------------------
+    # 一次判定（API 呼び出しなし）
+    # -----------------------------
+    rows = []
+    for p in evaluate:
         try:
             pair_id = p.get("pair_id")
             if not pair_id:
@@ -200,154 +410,206 @@ def main():
             name = p.get("name")
             lp_usd = p.get("liquidity", 0)
             fdv = p.get("fdv") or 0
-            mint = extract_non_wsol_token(name, pair_id)
-
-            # --- state 初期化 ---
-            if pair_id not in current_state:
-                current_state[pair_id] = {
-                    "lp": lp_usd,
-                    "max_lp": lp_usd,
-                    "last_notified_lp": lp_usd,
-                    "initial_price": None
-                }
-            else:
-                if "max_lp" not in current_state[pair_id]:
-                    current_state[pair_id]["max_lp"] = lp_usd
-                if "initial_price" not in current_state[pair_id]:
-                    current_state[pair_id]["initial_price"] = None
-
-                current_state[pair_id]["lp"] = lp_usd
-                if lp_usd > current_state[pair_id]["max_lp"]:
-                    current_state[pair_id]["max_lp"] = lp_usd
-
-            prev_lp = prev_state.get(pair_id, {}).get("lp", lp_usd)
-            last_notified_lp = current_state[pair_id].get("last_notified_lp", prev_lp)
-            initial_price = current_state[pair_id]["initial_price"]
-
-            growth = (lp_usd - prev_lp) / max(prev_lp, 1) * 100
-            growth_since_last_mail = (lp_usd - last_notified_lp) / max(last_notified_lp, 1) * 100
-            lp_delta = lp_usd - last_notified_lp
-
-            # --- 一次判定 ---
-            decision = None
-            if growth_since_last_mail >= IMMEDIATE_LP_GROWTH and lp_delta >= MIN_LP_DELTA_USD:
-                decision = "IMMEDIATE"
-            elif growth_since_last_mail >= WATCH_LP_GROWTH and lp_delta >= MIN_LP_DELTA_USD:
-                decision = "WATCH"
+            mint = source.token_of(p)
+
+            prev_lp, last_notified_lp = update_pair_state(current_state, pair_id, lp_usd)
+
+            rows.append({
+                "pair_id": pair_id,
+                "name": name,
+                "lp_usd": lp_usd,
+                "fdv": fdv,
+                "mint": mint,
+                "prev_lp": prev_lp,
+                "last_notified_lp": last_notified_lp,
+                "fingerprint": snapshot_diff.fingerprint(p),
+                "price": p.get("price"),
+                "volume": p.get("volume_24h_quote"),
+            })
+
+        except Exception as e:
+            print("Error:", e)
+            continue
+
+    # --- 成長率・一次判定（numpy があれば全ペアまとめて計算） ---
+    classify_rows(rows)
+    t = metrics.lap("classify", t)
+
+    # --- 複数窓（10m / 30m / 1h / 6h）の成長率・速度・ドローダウン ---
+    now_ts = time.time()
+    histories = store.get_history(r["pair_id"] for r in rows)
+    for r in rows:
+        ring = histories[r["pair_id"]]
+        ring.update(now_ts, r["lp_usd"], r["price"], r["volume"])
+        r["windows"] = ring.signals()
+    store.put_history(histories)
+    t = metrics.lap("history", t)
+
+    # --- mint ごとのクールダウン（最近通知した mint は、判定が上がらない限り確認もしない） ---
+    last_alerts = store.mint_alerts(r["mint"] for r in rows if r["decision"])
+    suppressed_count = mint_alerts.apply_cooldown(rows, last_alerts, now_ts, in_flight=deliveries.in_flight())
+
+    # -----------------------------
+    # 二次判定用の Dexscreener データを一括取得
+    # -----------------------------
+    # 候補を優先度順に並べ、リクエスト予算に入る分だけ確認する（残りは次のサイクルへ）
+    selected, deferred = check_scheduler.schedule(
+        [r for r in rows if not r.get("suppressed")], DEX_REQUEST_BUDGET, DEX_BATCH_SIZE
+    )
+    candidate_mints = [r["mint"] for r in selected]
+    dex_by_mint = (
+        fetch_dexscreener_details_batch(candidate_mints, DEX_REQUEST_BUDGET or None, source.dex_chain)
+        if candidate_mints else {}
+    )
+    # 個別取得が予算で打ち切られた・取得に失敗した mint も繰り越す
+    for r in selected:
+        if r["mint"] not in dex_by_mint:
+            deferred.append(r)
+    for r in deferred:
+        r["deferred"] = True
+    if selected or deferred:
+        print(check_scheduler.summary(selected, deferred, DEX_REQUEST_BUDGET))
+    metrics.inc("secondary_deferred_total", len(deferred))
+    now_ms = int(datetime.utcnow().timestamp() * 1000)
+    check_by_mint = {m: secondary_check(d, now_ms) for m, d in dex_by_mint.items()}
+    t = metrics.lap("dex_check", t)
+    prefetch_token_responses(m for m, (ok, _) in check_by_mint.items() if ok)
+    t = metrics.lap("price_prefetch", t)
+
+    # 確認した候補を優先度順に先に処理する（メールもこの順でキューに入る）
+    ordered = [r for r in selected if not r.get("deferred")]
+    ordered += [r for r in rows if not r["decision"] or r.get("deferred") or r.get("suppressed")]
+
+    # 二次判定を通った候補を mint ごとにまとめる（先頭のペアの名前で1通だけ送る）
+    alert_groups = mint_alerts.group_by_mint(
+        r for r in ordered
+        if r["decision"] and not r.get("deferred") and not r.get("suppressed")
+        and check_by_mint.get(r["mint"], (False,))[0]
+    )
+    price_by_mint = {}
+    alerted = {}
+    coalesced_count = 0
+    if detections is not None and alert_groups:
+        detections.refresh()   # step3 が前回以降に閉じた追跡を反映する
+    for r in ordered:
+        try:
+            pair_id = r["pair_id"]
+            name = r["name"]
+            lp_usd = r["lp_usd"]
+            fdv = r["fdv"]
+            mint = r["mint"]
+            prev_lp = r["prev_lp"]
+            last_notified_lp = r["last_notified_lp"]
+            growth = r["growth"]
+            growth_since_last_mail = r["growth_since_last_mail"]
+            lp_delta = r["lp_delta"]
+            decision = r["decision"]
+            entry = current_state[pair_id]
+            initial_price = entry.initial_price
 
             sent_mail = False
             price_usd = None
             hundred_x = False
             dex_details = None
+            coalesced_into = None
 
             # --- 二次判定 ---
-            if decision:
-                dex_details = fetch_dexscreener_details(mint)
+            if decision and r.get("suppressed"):
+                print(f"[ALERT] {name} | {mint} はクールダウン中のため確認しない ({decision}, +{growth_since_last_mail:.1f}%)")
+
+            elif decision and r.get("deferred"):
+                print(f"[SCHED] {name} | 予算切れ・取得失敗のため次のサイクルで確認 ({decision}, +{growth_since_last_mail:.1f}%)")
 
-                extra_ok = True
-                fail_reasons = []
+            elif decision:
+                dex_details = dex_by_mint.get(mint)
 
-                tx5 = None
-                pc5 = None
-                age = None
+                extra_ok, fail_reasons = check_by_mint.get(mint, (False, ["NO_DEX"]))
 
+                # --- デバッグ出力 ---
                 if dex_details:
-                    age = dex_details.get("contract_age_ms")
-                    tx5 = dex_details.get("txns5m")
-                    pc5 = dex_details.get("priceChange5m")
-
-                    now_ms = int(datetime.utcnow().timestamp() * 1000)
-
-                    # 年齢
-                    try:
-                        age_ms = now_ms - int(age)
-                        if age_ms > MAX_PAIR_AGE_MS:
-                            extra_ok = False
-                            fail_reasons.append("AGE")
-                    except:
-                        extra_ok = False
-                        fail_reasons.append("AGE_ERR")
-
-                    # txns5m（あなたの指定で2に変更）
-                    try:
-                        if tx5 is None or int(tx5) < MIN_TXNS5M:
-                            extra_ok = False
-                            fail_reasons.append("TX5")
-                    except:
-                        extra_ok = False
-                        fail_reasons.append("TX5_ERR")
-
-                    # priceChange5m（Noneは許容）
-                    try:
-                        if pc5 is not None and float(pc5) < MIN_PRICECHANGE5M:
-                            extra_ok = False
-                            fail_reasons.append("PC5")
-                    except:
-                        extra_ok = False
-                        fail_reasons.append("PC5_ERR")
-
-                    # --- デバッグ出力 ---
                     print(
-                        f"[DEXCHK] {name} | tx5={tx5}, pc5={pc5}, age={age}, lpΔ={lp_delta}, fail={fail_reasons}"
+                        f"[DEXCHK] {name} | tx5={dex_details.txns5m}, "
+                        f"pc5={dex_details.priceChange5m}, age={dex_details.contract_age_ms}, "
+                        f"lpΔ={lp_delta}, fail={fail_reasons}"
                     )
-
                 else:
-                    extra_ok = False
                     print(f"[DEXCHK] {name} | dex_details=None")
 
                 if not extra_ok:
                     decision = None
 
                 else:
-                    price_usd = fetch_price_usd(mint)
+                    if mint not in price_by_mint:
+                        price_by_mint[mint] = fetch_price_usd(mint)
+                    price_usd = price_by_mint[mint]
 
                     if initial_price is None:
-                        current_state[pair_id]["initial_price"] = price_usd
+                        entry.initial_price = price_usd
                         initial_price = price_usd
 
                     if initial_price and initial_price > 0 and price_usd and price_usd / initial_price >= 100:
                         hundred_x = True
 
-                    send_mail(
-                        symbol=name,
-                        score=0,
-                        growth=growth_since_last_mail,
-                        fdv=fdv,
-                        lp=lp_usd,
-                        urgency="高" if decision == "IMMEDIATE" else "中",
-                        reason=f"{decision} 判定（LP成長 + Dex条件）",
-                        chain="Solana",
-                        token=mint,
-                        mint=mint,
-                        pair_id=pair_id,
-
-                        price=dex_details.get("price") if dex_details else None,
-                        priceChange1m=dex_details.get("priceChange1m") if dex_details else None,
-                        priceChange5m=dex_details.get("priceChange5m") if dex_details else None,
-                        priceChange1h=dex_details.get("priceChange1h") if dex_details else None,
-                        txns5m=dex_details.get("txns5m") if dex_details else None,
-                        buys5m=dex_details.get("buys5m") if dex_details else None,
-                        sells5m=dex_details.get("sells5m") if dex_details else None,
-                        volume5m=dex_details.get("volume5m") if dex_details else None,
-                        liquidity_usd=dex_details.get("liquidity_usd") if dex_details else None,
-                        fdv_dex=dex_details.get("fdv") if dex_details else None,
-                        marketcap=dex_details.get("marketcap") if dex_details else None,
-                        contract_age_ms=dex_details.get("contract_age_ms") if dex_details else None,
-                        lp_mint=dex_details.get("lp_mint") if dex_details else None
-                    )
-
-                    current_state[pair_id]["last_notified_lp"] = lp_usd
-                    notification_count += 1
-                    sent_mail = True
+                    group = alert_groups[mint]
+                    if group[0] is not r:
+                        # 同じ mint の代表ペアのメールに併記済み
+                        coalesced_into = group[0]["pair_id"]
+                        coalesced_count += 1
+                        print(f"[ALERT] {name} | {group[0]['name']} の通知にまとめた")
+                    else:
+                        ticket = deliveries.add(
+                            mint, decision, now_ts, [(g["pair_id"], g["lp_usd"]) for g in alert_groups[mint]]
+                        )
+                        mailer.submit(
+                            ticket=ticket,
+                            symbol=name,
+                            score=0,
+                            growth=growth_since_last_mail,
+                            fdv=fdv,
+                            lp=lp_usd,
+                            urgency="高" if decision == "IMMEDIATE" else "中",
+                            reason=f"{decision} 判定（LP成長 + Dex条件）"
+                                   + (f" [{lp_history.describe(r['windows'])}]" if r["windows"] else "")
+                                   + (f" [{mint_alerts.describe(group)}]" if len(group) > 1 else ""),
+                            chain=source.chain,
+                            dex_chain=source.dex_chain,
+                            token=mint,
+                            mint=mint,
+                            pair_id=pair_id,
+
+                            price=dex_details.price if dex_details else None,
+                            priceChange1m=dex_details.priceChange1m if dex_details else None,
+                            priceChange5m=dex_details.priceChange5m if dex_details else None,
+                            priceChange1h=dex_details.priceChange1h if dex_details else None,
+                            txns5m=dex_details.txns5m if dex_details else None,
+                            buys5m=dex_details.buys5m if dex_details else None,
+                            sells5m=dex_details.sells5m if dex_details else None,
+                            volume5m=dex_details.volume5m if dex_details else None,
+                            liquidity_usd=dex_details.liquidity_usd if dex_details else None,
+                            fdv_dex=dex_details.fdv if dex_details else None,
+                            marketcap=dex_details.marketcap if dex_details else None,
+                            contract_age_ms=dex_details.contract_age_ms if dex_details else None,
+                            lp_mint=dex_details.lp_mint if dex_details else None
+                        )
+                        notification_count += 1
+                        sent_mail = True
+                        alerted[mint] = (decision, now_ts)
+                        if detections is not None:
+                            r["detection_id"] = record_detection(
+                                detections, source, r, dex_details, price_usd, decision
+                            )
+
+                    # 代表と一緒に通知したペアも含め、通知済みにするのはメールが届いてから（settle_deliveries）
 
             # --- ログ保存 ---
-            logs[pair_id] = {
+            logs.append({
                 "time": datetime.utcnow().isoformat(),
+                "chain": source.name,
                 "name": name,
                 "pair_id": pair_id,
                 "mint": mint,
                 "lp": lp_usd,
-                "max_lp": current_state[pair_id]["max_lp"],
+                "max_lp": entry.max_lp,
                 "prev_lp": prev_lp,
                 "last_notified_lp": last_notified_lp,
                 "price_usd": price_usd,
@@ -356,21 +618,381 @@ def main():
                 "growth": growth,
                 "growth_since_last_mail": growth_since_last_mail,
                 "lp_delta": lp_delta,
+                "windows": r["windows"],
                 "decision": decision,
                 "sent_mail": sent_mail,
-                "dex_details": dex_details
-            }
+                "coalesced_into": coalesced_into,
+                "detection_id": r.get("detection_id"),
+                "deferred": bool(r.get("deferred")),
+                "suppressed": bool(r.get("suppressed")),
+                "dex_details": dex_details.to_dict() if dex_details else None
+            })
 
         except Exception as e:
             print("Error:", e)
             continue
 
-    save_state(current_state)
-    save_logs(logs)
-    print(f"[SUMMARY] 通知対象件数: {notification_count}, 監視中ペア: {len(current_state)}")
+    mailer.end_cycle()
+    if alerted or coalesced_count or suppressed_count:
+        print(mint_alerts.summary(len(alerted), coalesced_count, suppressed_count))
+    metrics.inc("alerts_coalesced_total", coalesced_count)
+    metrics.inc("alerts_suppressed_total", suppressed_count)
+    t = metrics.lap("notify_log", t)
+    changed = store.put_many(current_state)
+    # 一次判定を通ったペアは保留にして次回も判定する（通知が届いていれば次回は判定なしで落ち着く。
+    # 届かなかった通知はそこでもう一度送る）
+    store.put_fingerprints(
+        {r["pair_id"]: (*r["fingerprint"], bool(r["decision"])) for r in rows},
+        removed,
+    )
+    metrics.lap("state_put", t)
+
+    watched = store.count()
+    print(f"[SUMMARY] 通知対象件数: {notification_count}, 変化ペア: {changed}, 監視中ペア: {watched}")
+    print(source.rules.summary())
+    print(SECONDARY_RULES.summary())
+    print(api_cache.summary())
+    print(http_engine.summary())
+    record_cycle_metrics(source, time.perf_counter() - cycle_started, len(filtered_pairs), notification_count,
+                         watched, diff_counts)
+    return notification_count
+
+
+def settle_deliveries(deliveries, results, store):
+    delivered, failed = deliveries.settle(results, store)
+    metrics.inc("alerts_delivered_total", delivered)
+    if failed:
+        metrics.inc("alerts_undelivered_total", failed)
+        print(f"[MAIL] 届かなかった通知 {failed} 件は次のサイクルで判定し直します")
+
+
+def record_cycle_metrics(source, seconds, filtered, notifications, watched, diff_counts):
+    metrics.observe("cycle_seconds", seconds)
+    metrics.inc("cycles_total")
+    metrics.inc("notifications_total", notifications)
+    metrics.set_gauge("pairs_filtered", filtered)
+    metrics.set_gauge("pairs_watched", watched)
+    for kind in ("new", "changed", "pending", "unchanged", "removed"):
+        metrics.set_gauge("snapshot_pairs", diff_counts[kind], kind=kind)
+    for rules in (source.rules, SECONDARY_RULES):
+        metrics.inc("rule_evaluated_total", rules.evaluated, ruleset=rules.name)
+        for reason, n in rules.rejections.items():
+            metrics.inc("rule_rejections_total", n, ruleset=rules.name, reason=reason)
+    for k, v in api_cache.stats.items():
+        metrics.set_gauge(f"api_cache_{k}", v)
+
+
+def maintain_state(store):
+    # 期限切れのペアを削除し、空きが多ければ state.db を詰める
+    with metrics.timer("state_evict"):
+        evicted = store.evict()
+        vacuumed = store.vacuum()
+    for reason, n in evicted.items():
+        metrics.inc("state_evicted_total", n, reason=reason)
+    metrics.set_gauge("state_db_bytes", store.size_bytes())
+    if evicted["absent"] or evicted["inactive"]:
+        print(f"[STATE] 期限切れ削除: 消滅 {evicted['absent']} / 無変化 {evicted['inactive']}")
+    if vacuumed:
+        print(f"[STATE] VACUUM {vacuumed[0] / 1024:.0f}KB → {vacuumed[1] / 1024:.0f}KB")
+
+
+# -----------------------------
+# シャード（チェーンごとに state / ログ / 計測ファイルを分ける）
+# -----------------------------
+def shard_file(path, shard, primary="solana"):
+    # primary のシャードは従来どおりのファイル名、それ以外は <名前>_<シャード>.<拡張子>
+    if shard == primary:
+        return path
+    d, base = os.path.split(path)
+    stem, dot, ext = base.partition(".")
+    return os.path.join(d, f"{stem}_{shard}{dot}{ext}")
+
+
+def open_shard(name):
+    source = chain_sources.make_source(name)
+    legacy = state_store.LEGACY_STATE_FILE if name == "solana" else ""
+    store = open_store(shard_file(state_store.STATE_DB, name), legacy)
+    logs = EventLog(shard_file(LOG_FILE, name))
+    detections = DetectionStore(DETECTIONS_FILE)
+    return source, store, logs, detections, mint_alerts.Deliveries()
+
+
+def run_once(name, mailer):
+    source, store, logs, detections, deliveries = open_shard(name)
+    run_cycle(source, store, logs, mailer, detections, deliveries)
+    # 送信結果を待ってから通知済みを反映し、state を書く
+    with metrics.timer("mail_drain"):
+        settle_deliveries(deliveries, mailer.wait_results(), store)
+    detections.commit()
+    with metrics.timer("state_flush"):
+        n = store.flush()
+    print(f"[STATE] 更新完了。書き込みペア数: {n}")
+    maintain_state(store)
+    store.close()
+    with metrics.timer("log_flush"):
+        logs.close()
+
+
+def main(chains=CHAINS):
+    if len(chains) > 1:
+        run_shards(chains)
+        return
+    mailer = MailQueue()
+    run_once(chains[0], mailer)
+    # プロセス終了前にキューに残ったメールを送り切る
+    with metrics.timer("mail_drain"):
+        mailer.close()
+    print(mailer.summary())
+    print(metrics.stage_summary())
+    metrics.write()
+
+
+# -----------------------------
+# 常駐モード
+# -----------------------------
+class Checkpointer:
+    # state の dirty 行と logs のバッファを別スレッドで書き出す
+    def __init__(self):
+        self.thread = None
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def save(self, store, logs, background=True):
+        # 前回の書き出しが終わっていなければ待つ（同じファイルへの並行書き込みを避ける）
+        self.wait()
+        # ループ側が更新を続けても壊れないよう、dirty 行はここで切り離してから渡す
+        dirty = store.take_dirty()
+
+        def write():
+            try:
+                with metrics.timer("checkpoint"):
+                    n = store.write(dirty)
+                    logs.flush()
+                print(f"[STATE] 更新完了。書き込みペア数: {n}")
+            except Exception as e:
+                print("[CHECKPOINT] 保存エラー:", e)
+
+        if background:
+            self.thread = threading.Thread(target=write, name="checkpoint", daemon=False)
+            self.thread.start()
+        else:
+            write()
+
+
+def handle_stop_signals(stop):
+    def handle_signal(signum, frame):
+        print(f"[DAEMON] シグナル {signum} を受信。終了します")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+
+def daemon_loop(name, interval, checkpoint_interval, mailer, stop, metrics_file=metrics.METRICS_FILE):
+    source, store, logs, detections, deliveries = open_shard(name)
+    checkpointer = Checkpointer()
+    last_checkpoint = time.monotonic()
+    print(f"[DAEMON] {name} 開始 interval={interval}s checkpoint={checkpoint_interval}s 監視中ペア: {store.count()}")
+
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            run_cycle(source, store, logs, mailer, detections, deliveries)
+        except Exception as e:
+            print("[DAEMON] サイクルエラー:", e)
+            metrics.inc("cycle_errors_total")
+        print(metrics.stage_summary())
+        metrics.write(metrics_file)
+
+        if time.monotonic() - last_checkpoint >= checkpoint_interval:
+            # 書き出し中の VACUUM を避けるため、前回の書き出しを待ってから
+            checkpointer.wait()
+            try:
+                maintain_state(store)
+            except Exception as e:
+                print("[STATE] 期限切れ削除エラー:", e)
+            # 検知レコードの索引はループと同じスレッドで書く（小さいので待たない）
+            detections.commit()
+            checkpointer.save(store, logs)
+            last_checkpoint = time.monotonic()
+
+        elapsed = time.monotonic() - started
+        stop.wait(max(interval - elapsed, 0))
+
+    settle_deliveries(deliveries, mailer.wait_results(), store)
+    detections.commit()
+    checkpointer.save(store, logs, background=False)
+    store.close()
+    logs.close()
+
+
+def run_daemon(interval, checkpoint_interval, chains=CHAINS):
+    if len(chains) > 1:
+        run_shards(chains, daemon=True, interval=interval, checkpoint_interval=checkpoint_interval)
+        return
+
+    stop = threading.Event()
+    handle_stop_signals(stop)
+    mailer = MailQueue()
+    metrics_server = metrics.serve()
+
+    daemon_loop(chains[0], interval, checkpoint_interval, mailer, stop)
+
+    mailer.close()
+    print(mailer.summary())
+    metrics.write()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    print("[DAEMON] 停止")
+
+
+# -----------------------------
+# 複数チェーン：チェーンごとのワーカープロセス
+# -----------------------------
+# 各チェーンは別プロセスで自分の間隔で回り（遅いチェーンが他を待たせない）、state / ログ / 計測は
+# シャードごとのファイルに書く。通知だけは親プロセスのキューに送り、親が1本の MailQueue で送信する。
+class AlertForwarder:
+    # ワーカー側の mailer（MailQueue と同じ submit / end_cycle / take_results / wait_results）
+    # 送信結果は親が results（シャードごとのキュー）に返す
+    def __init__(self, shard, alerts, results):
+        self.shard = shard
+        self.alerts = alerts
+        self.results = results
+        self.unresolved = 0
+
+    def submit(self, ticket=None, **kwargs):
+        self.alerts.put(("alert", self.shard, (ticket, kwargs)))
+        if ticket is not None:
+            self.unresolved += 1
+        return True
+
+    def end_cycle(self):
+        self.alerts.put(("cycle", self.shard, None))
+
+    def take_results(self, timeout=None):
+        # timeout を渡すと、結果が1件も無いときはその秒数だけ待つ
+        results = []
+        try:
+            if timeout is not None:
+                results.append(self.results.get(timeout=timeout))
+            while True:
+                results.append(self.results.get_nowait())
+        except queue.Empty:
+            pass
+        self.unresolved -= len(results)
+        return results
+
+    def wait_results(self, timeout=notify_queue.MAIL_RESULT_TIMEOUT):
+        self.end_cycle()
+        deadline = time.monotonic() + timeout
+        results = []
+        while self.unresolved > 0 and time.monotonic() < deadline:
+            results += self.take_results(timeout=min(1.0, max(deadline - time.monotonic(), 0)))
+        if self.unresolved > 0:
+            print(f"[MAIL] {self.unresolved} 件の送信結果を待ちきれませんでした")
+        return results
+
+
+def shard_worker(name, alerts, results, stop, daemon, interval, checkpoint_interval, metrics_port):
+    # 停止は親から stop で伝える（端末の Ctrl-C はプロセスグループ全体に届くので無視する）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    metrics_file = shard_file(metrics.METRICS_FILE, name, primary=None)
+    mailer = AlertForwarder(name, alerts, results)
+    try:
+        if daemon:
+            server = metrics.serve(metrics_port)
+            daemon_loop(name, interval, checkpoint_interval, mailer, stop, metrics_file)
+            if server is not None:
+                server.shutdown()
+        else:
+            run_once(name, mailer)
+            print(metrics.stage_summary())
+        metrics.write(metrics_file)
+    finally:
+        alerts.put(("done", name, None))
+
+
+def run_shards(chains, daemon=False, interval=None, checkpoint_interval=None):
+    ctx = multiprocessing.get_context("spawn")
+    alerts = ctx.Queue()
+    results = {name: ctx.Queue() for name in chains}
+    stop = ctx.Event()
+    workers = {}
+    for i, name in enumerate(chains):
+        # 常駐時の /metrics はシャードごとに METRICS_PORT+1, +2, ...（親は METRICS_PORT）
+        port = metrics.METRICS_PORT + 1 + i if daemon and metrics.METRICS_PORT else 0
+        workers[name] = ctx.Process(
+            target=shard_worker, name=f"shard-{name}",
+            args=(name, alerts, results[name], stop, daemon, interval, checkpoint_interval, port),
+        )
+        workers[name].start()
+    print(f"[SHARD] {len(chains)} チェーンを別プロセスで実行: {', '.join(chains)}")
+
+    if daemon:
+        handle_stop_signals(stop)
+    mailer = MailQueue()
+    metrics_server = metrics.serve() if daemon else None
+
+    # 全ワーカーの通知を届いた順に1本のキューへ
+    running = set(chains)
+    while running:
+        # 送信結果を送り元のシャードに返す
+        for (shard, ticket), delivered in mailer.take_results():
+            results[shard].put((ticket, delivered))
+        try:
+            kind, shard, payload = alerts.get(timeout=1)
+        except queue.Empty:
+            for name in list(running):
+                if not workers[name].is_alive():
+                    print(f"[SHARD] {name} が異常終了しました (exitcode={workers[name].exitcode})")
+                    metrics.inc("shard_crashes_total", shard=name)
+                    running.discard(name)
+            continue
+        if kind == "alert":
+            ticket, kwargs = payload
+            mailer.submit(ticket=None if ticket is None else (shard, ticket), **kwargs)
+            metrics.inc("shard_alerts_total", shard=shard)
+        elif kind == "cycle":
+            mailer.end_cycle()
+        elif kind == "done":
+            running.discard(shard)
+
+    for w in workers.values():
+        w.join()
+    with metrics.timer("mail_drain"):
+        mailer.close()
+    print(mailer.summary())
+    metrics.write()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    if daemon:
+        print("[DAEMON] 停止")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="LP 成長検知（Raydium / Dexscreener）")
+    ap.add_argument("--daemon", action="store_true",
+                    help="常駐して一定間隔で検知を繰り返す")
+    ap.add_argument("--interval", type=float,
+                    default=float(os.getenv("DAEMON_INTERVAL", "60")),
+                    help="常駐モードの検知間隔（秒）")
+    ap.add_argument("--checkpoint-interval", type=float,
+                    default=float(os.getenv("DAEMON_CHECKPOINT_INTERVAL", "300")),
+                    help="常駐モードで state / logs をディスクに書き出す間隔（秒）")
+    ap.add_argument("--chains", default=",".join(CHAINS),
+                    help="監視するチェーン（カンマ区切り。solana 以外は Dexscreener 検索から）")
+    return ap.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    chains = [c.strip().lower() for c in args.chains.split(",") if c.strip()]
     print("========== START ==========")
-    main()
-    print("=========== END ===========")
\ No newline at end of file
+    if args.daemon:
+        run_daemon(args.interval, args.checkpoint_interval, chains)
+    else:
+        main(chains)
@@ -1,82 +1,111 @@
-import requests, json, os
+from collections import defaultdict
 from datetime import datetime
+import api_cache
+import http_engine
+from detection_store import DetectionStore
 
 LOG_FILE = "logs/detections.jsonl"
 TRACK_HOURS_LIMIT = 72
 TEN_X = 10.0
 
 
-def fetch_price(chain, pair):
-    url = f"https://api.dexscreener.com/latest/dex/pairs/{chain}/{pair}"
-    r = requests.get(url, timeout=20)
-    data = r.json()
-    if not data.get("pairs"):
+PAIRS_API = f"{http_engine.DEXSCREENER_BASE}/latest/dex/pairs/"
+# 複数アドレス指定 /pairs/{chain}/{a,b,c} の1リクエストあたり上限
+PAIRS_BATCH_SIZE = 30
+
+
+def _price_of(p):
+    try:
+        return float(p["priceUsd"])
+    except (KeyError, TypeError, ValueError):
         return None
-    return float(data["pairs"][0]["priceUsd"])
 
 
-def load_logs():
-    if not os.path.exists(LOG_FILE):
-        return []
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
+def fetch_prices(chain, pairs):
+    # {pair: price}。キャッシュ済みの単体 URL を先に使い、残りを30件ずつまとめて並行取得する
+    prices = {}
+    missing = []
+    for pair in dict.fromkeys(pairs):
+        data = api_cache.get(f"{PAIRS_API}{chain}/{pair}")
+        if data is not None and data.get("pairs"):
+            prices[pair] = _price_of(data["pairs"][0])
+        else:
+            missing.append(pair)
+
+    batches = [missing[i:i + PAIRS_BATCH_SIZE] for i in range(0, len(missing), PAIRS_BATCH_SIZE)]
+    urls = [f"{PAIRS_API}{chain}/{','.join(b)}" for b in batches]
 
+    for batch, data in zip(batches, api_cache.get_json_many(urls, timeout=20)):
+        if isinstance(data, Exception):
+            print("[TRACK] 取得エラー:", data)
+            continue
+        # アドレスの大文字小文字はチェーンによって揺れるので小文字で突き合わせる
+        wanted = {b.lower(): b for b in batch}
+        for p in data.get("pairs") or []:
+            pair = wanted.get((p.get("pairAddress") or "").lower())
+            if pair is not None and pair not in prices:
+                prices[pair] = _price_of(p)
 
-def save_logs(logs):
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        for log in logs:
-            f.write(json.dumps(log, ensure_ascii=False) + "\n")
+    return prices
 
 
 def main():
-    logs = load_logs()
+    store = DetectionStore(LOG_FILE)
+    open_records = store.open_records()
     now = datetime.utcnow()
 
-    updated = False
-
-    for log in logs:
-        if "auto_result" in log:
-            continue
-
+    # --- 期限切れは API を呼ばずに閉じる ---
+    active = {}
+    for rid, log in open_records.items():
         detected_at = datetime.fromisoformat(log["detected_at"])
         hours_passed = (now - detected_at).total_seconds() / 3600
 
         if hours_passed > TRACK_HOURS_LIMIT:
-            log["auto_result"] = {
+            store.update(rid, auto_result={
                 "status": "expired",
                 "hours_tracked": round(hours_passed, 1)
-            }
-            updated = True
+            })
             continue
-
-        price = fetch_price(log["chain"], log["pair"])
+        active[rid] = (log, detected_at)
+
+    # --- チェーンごとにまとめて価格取得 ---
+    by_chain = defaultdict(list)
+    for log, _ in active.values():
+        by_chain[log["chain"]].append(log["pair"])
+    prices = {
+        (chain, pair): price
+        for chain, pairs in by_chain.items()
+        for pair, price in fetch_prices(chain, pairs).items()
+    }
+
+    for rid, (log, detected_at) in active.items():
+        price = prices.get((log["chain"], log["pair"]))
         if price is None:
             continue
 
-        if "tracking" not in log:
-            log["tracking"] = {
-                "base_price": price,
-                "max_price": price
-            }
+        tracking = dict(log.get("tracking") or {"base_price": price, "max_price": price})
+        tracking["max_price"] = max(tracking["max_price"], price)
 
-        log["tracking"]["max_price"] = max(
-            log["tracking"]["max_price"], price
-        )
+        max_x = tracking["max_price"] / tracking["base_price"]
 
-        max_x = log["tracking"]["max_price"] / log["tracking"]["base_price"]
+        fields = {}
+        if tracking != log.get("tracking"):
+            fields["tracking"] = tracking
 
         if max_x >= TEN_X:
-            log["auto_result"] = {
+            fields["auto_result"] = {
                 "hit_10x": True,
                 "max_x": round(max_x, 2),
                 "time_to_10x_min": int(
                     (now - detected_at).total_seconds() / 60
                 )
             }
-            updated = True
 
-    if updated:
-        save_logs(logs)
+        if fields:
+            store.update(rid, **fields)
+
+    store.commit()
+    print(f"[TRACK] 追跡中: {len(store.open)} / 価格取得: {len(prices)} / 対象チェーン: {len(by_chain)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+import os
+
+from rules import compile_path
+
+try:
+    import numpy as np
+except ImportError:   # numpy が無い環境では呼び出し側が従来の1行ずつの経路を使う
+    np = None
+
+# -----------------------------
+# NumPy による列指向のフィルタ / 成長率計算
+# -----------------------------
+# ペアの dict から必要な列だけを配列に取り出し、rules.json のルール判定・成長率・判定クラスを
+# マスク演算でまとめて計算する。
+#
+# 入力が dict のリストである限り、列への取り出し（1件ずつの Python 処理）が支配的で、
+# 短絡評価する従来ループより速くならないことが多い（bench/bench_vector_filter.py 参照）。
+# そのため既定では無効にしておき、VECTOR_FILTER=1 のときだけ使う。
+
+ENABLED = os.getenv("VECTOR_FILTER", "0") == "1"
+
+NONE = 0
+WATCH = 1
+IMMEDIATE = 2
+DECISION_NAMES = {NONE: None, WATCH: "WATCH", IMMEDIATE: "IMMEDIATE"}
+
+_NAN = float("nan")
+
+
+def available():
+    return ENABLED and np is not None
+
+
+def _num(v, none_value=_NAN):
+    # 従来コードで例外になっていた値（文字列など）は NaN にして比較で落とす
+    if v is None:
+        return none_value
+    if isinstance(v, bool):
+        return float(v)
+    if isinstance(v, (int, float)):
+        return float(v)
+    return _NAN
+
+
+def column(rows, get, none_value=_NAN):
+    # まずは素直に変換し、None や文字列が混じっていたら1件ずつ検査する経路に落とす
+    try:
+        return np.fromiter(map(get, rows), dtype=np.float64, count=len(rows))
+    except (TypeError, ValueError):
+        return np.fromiter((_num(get(r), none_value) for r in rows), dtype=np.float64, count=len(rows))
+
+
+def range_mask(values, lo, hi):
+    # NaN は比較がすべて False になるので自動的に除外される
+    return (values >= lo) & (values <= hi)
+
+
+# -----------------------------
+# ルールセット（rules.json）の列演算版
+# -----------------------------
+# 数値の比較ルール（between / gte / ... / ratio_between）は列にしてマスク演算で判定する。
+# 値が None や数値でない行（列では NaN）と、それ以外の op のルールは、ルールの関数で1行ずつ判定する。
+# どちらもルールの評価順に、まだ残っている行だけを見るので、却下件数は RuleSet.check と同じになる。
+_COMPARE = {
+    "between": lambda v, r: range_mask(v, r["min"], r["max"]),
+    "gte": lambda v, r: v >= r["value"],
+    "gt": lambda v, r: v > r["value"],
+    "lte": lambda v, r: v <= r["value"],
+    "lt": lambda v, r: v < r["value"],
+    "eq": lambda v, r: v == r["value"],
+    "ne": lambda v, r: v != r["value"],
+}
+
+
+def _getter(spec):
+    get = compile_path(spec["field"])
+    default = spec.get("default")
+    if "or" in spec:
+        fallback = spec["or"]
+        return lambda o: get(o, default) or fallback
+    return lambda o: get(o, default)
+
+
+def _rule_mask(spec, rows):
+    # 列で判定できたらマスク（判定できなかった行は NaN の位置で返す）、できないルールなら None
+    op = spec["op"]
+    if op == "ratio_between":
+        num = column(rows, _getter(spec))
+        den = column(rows, compile_path(spec["divisor"]))
+        unknown = np.isnan(num) | np.isnan(den)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = num / np.where(den == 0, 1, den)
+        return (num != 0) & (den != 0) & range_mask(ratio, spec["min"], spec["max"]), unknown
+    if op not in _COMPARE or spec.get("cast") not in (None, "int", "float"):
+        return None
+    values = column(rows, _getter(spec))
+    unknown = np.isnan(values)
+    if spec.get("cast") == "int":
+        values = np.trunc(values)
+    with np.errstate(invalid="ignore"):
+        return _COMPARE[op](values, spec), unknown
+
+
+def ruleset_mask(ruleset, rows):
+    # ruleset.check(row) を全行に適用した結果のマスク（却下件数も ruleset に加える）
+    alive = np.ones(len(rows), dtype=bool)
+    rejections = {}
+    for (name, check), spec in zip(ruleset.rules, ruleset.specs):
+        result = _rule_mask(spec, rows)
+        if result is None:
+            ok = np.zeros(len(rows), dtype=bool)
+            scalar = np.flatnonzero(alive)
+        else:
+            ok, unknown = result
+            scalar = np.flatnonzero(alive & unknown)
+        errors = 0
+        for i in scalar:
+            try:
+                ok[i] = check(rows[i], None)
+            except Exception:
+                ok[i] = False
+                errors += 1
+        rejections[name] = int((alive & ~ok).sum()) - errors
+        rejections[f"{name}_ERR"] = errors
+        alive &= ok
+    ruleset.add_counts(len(rows), int(alive.sum()), rejections)
+    return alive
+
+
+# -----------------------------
+# step2: LP 成長率と一次判定
+# -----------------------------
+def classify_growth(lp, prev_lp, last_notified_lp, watch_growth, immediate_growth, min_lp_delta):
+    lp = np.asarray(lp, dtype=np.float64)
+    prev_lp = np.asarray(prev_lp, dtype=np.float64)
+    last_notified_lp = np.asarray(last_notified_lp, dtype=np.float64)
+
+    growth = (lp - prev_lp) / np.maximum(prev_lp, 1) * 100
+    growth_since_last_mail = (lp - last_notified_lp) / np.maximum(last_notified_lp, 1) * 100
+    lp_delta = lp - last_notified_lp
+
+    delta_ok = lp_delta >= min_lp_delta
+    decision = np.full(len(lp), NONE, dtype=np.int8)
+    decision[delta_ok & (growth_since_last_mail >= watch_growth)] = WATCH
+    decision[delta_ok & (growth_since_last_mail >= immediate_growth)] = IMMEDIATE
+    return growth, growth_since_last_mail, lp_delta, decision